@@ -0,0 +1,83 @@
+# benchmarks/bench_async_client.py
+"""Concurrent task submissions from one process: TaskClient in a thread pool vs AsyncTaskClient.
+
+The server runs in its own process so that it does not share a GIL with the
+client.
+
+Run with: python -m benchmarks.bench_async_client [tasks]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet
+
+TASKS = 10_000
+THREADS = 64
+POOL_SIZES = (1, 4)
+TASK = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+
+
+def bench_threads(TaskClient, tasks):
+    client = TaskClient()
+    client.connect()
+    client.login('admin', 'admin123')
+    with ThreadPoolExecutor(THREADS) as pool:
+        start = time.perf_counter()
+        task_ids = list(pool.map(lambda _: client.submit_task(TASK), range(tasks)))
+        elapsed = time.perf_counter() - start
+    client.close()
+    assert None not in task_ids
+    return elapsed
+
+
+async def bench_async(AsyncTaskClient, tasks, pool_size):
+    async with AsyncTaskClient(pool_size=pool_size) as client:
+        await client.login('admin', 'admin123')
+        start = time.perf_counter()
+        task_ids = await asyncio.gather(*(client.submit_task(TASK) for _ in range(tasks)))
+        elapsed = time.perf_counter() - start
+    assert None not in task_ids
+    return elapsed
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        port = probe.getsockname()[1]
+    os.environ.update(SERVER_PORT=str(port),
+                      ENCRYPTION_KEY=Fernet.generate_key().decode())
+    server = subprocess.Popen([sys.executable, '-m', 'src.server.main'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Imported after ENCRYPTION_KEY is set so both processes share the key
+    from src.client.client import TaskClient
+    from src.client.async_client import AsyncTaskClient
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('localhost', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        runs = [(f'TaskClient, {THREADS} threads', lambda: bench_threads(TaskClient, tasks))]
+        for pool_size in POOL_SIZES:
+            runs.append((f'AsyncTaskClient, pool {pool_size}',
+                         lambda size=pool_size: asyncio.run(bench_async(AsyncTaskClient, tasks, size))))
+        for name, run in runs:
+            elapsed = run()
+            print(f"{name:>26}: {tasks / elapsed:8,.0f} submits/s ({tasks:,} concurrent)")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
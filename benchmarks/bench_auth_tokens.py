@@ -0,0 +1,78 @@
+# benchmarks/bench_auth_tokens.py
+"""Token checks and memory with 1M issued tokens: a set of tokens + jwt.decode vs AuthManager.
+
+Issuing a million tokens under tracemalloc takes several minutes.
+
+Run with: python -m benchmarks.bench_auth_tokens [tokens]
+"""
+
+import sys
+import time
+import tracemalloc
+import uuid
+
+from src.server.auth import AuthManager, TOKEN_LIFETIME
+from src.utils.crypto import generate_token, verify_token
+
+TOKENS = 1_000_000
+SAMPLE = 10_000
+
+
+def issue(add, tokens):
+    """Issue tokens, returning the first SAMPLE and the memory still held afterwards"""
+    sample = []
+    tracemalloc.start()
+    for i in range(tokens):
+        token = add()
+        if i < SAMPLE:
+            sample.append(token)
+    held = tracemalloc.get_traced_memory()[0] - sum(sys.getsizeof(token) for token in sample)
+    tracemalloc.stop()
+    return sample, held
+
+
+def per_check(verify, sample):
+    start = time.perf_counter()
+    for token in sample:
+        assert verify(token)
+    return (time.perf_counter() - start) / len(sample)
+
+
+def main():
+    tokens = int(sys.argv[1]) if len(sys.argv) > 1 else TOKENS
+
+    active = set()
+
+    def add_old():
+        token = generate_token({'username': 'admin', 'role': 'admin',
+                                'exp': int(time.time() + TOKEN_LIFETIME),
+                                'jti': uuid.uuid4().hex})
+        active.add(token)
+        return token
+
+    def verify_old(token):
+        return token in active and verify_token(token)
+
+    sample, held = issue(add_old, tokens)
+    print(f"{'set + jwt.decode':>26}: {per_check(verify_old, sample) * 1e6:6.2f} us/check, "
+          f"{held / 2**20:7.1f} MiB for {tokens:,} tokens")
+    active.clear()
+
+    auth = AuthManager()
+    sample, held = issue(lambda: auth.generate_auth_token('admin'), tokens)
+    # The sample was issued first, so it has been pushed out of the cache
+    miss = per_check(auth.verify_auth_token, sample)
+    hit = per_check(auth.verify_auth_token, sample)
+    print(f"{'AuthManager, cache miss':>26}: {miss * 1e6:6.2f} us/check, "
+          f"{held / 2**20:7.1f} MiB for {tokens:,} tokens")
+    print(f"{'AuthManager, cache hit':>26}: {hit * 1e6:6.2f} us/check")
+
+    start = time.perf_counter()
+    purged = auth.purge_expired(time.time() + TOKEN_LIFETIME + auth.sweep_tick)
+    print(f"{'sweep after expiry':>26}: {purged:,} tokens dropped in "
+          f"{time.perf_counter() - start:.2f}s, {len(auth.active_tokens)} left")
+    auth.stop()
+
+
+if __name__ == '__main__':
+    main()
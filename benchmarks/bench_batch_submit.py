@@ -0,0 +1,80 @@
+# benchmarks/bench_batch_submit.py
+"""Client task submission over TLS with the WAL store: task_submit per task vs task_submit_batch.
+
+Run with: python -m benchmarks.bench_batch_submit [tasks] [batch_size]
+"""
+
+import os
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+
+from src.server.main import DistributedServer
+from src.utils.codec import encode_message, decode_message
+from src.utils.crypto import encrypt_message, decrypt_message
+from src.utils.framing import iter_frames, send_frame
+
+TASKS = 20_000
+BATCH_SIZE = 5_000
+TASK = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+
+
+class ClientConnection:
+    """Bare client protocol over one TLS connection"""
+
+    def __init__(self, port):
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        sock = socket.create_connection(('localhost', port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = context.wrap_socket(sock)
+        self.frames = iter_frames(self.sock)
+        self.call({'username': 'admin', 'password': 'admin123', 'codecs': ['binary']})
+
+    def call(self, message):
+        send_frame(self.sock, encrypt_message(encode_message(message, 'binary')))
+        return decode_message(decrypt_message(next(self.frames)))
+
+    def close(self):
+        self.sock.close()
+
+
+def submit_each(connection, tasks, batch_size):
+    for task in tasks:
+        connection.call({'type': 'task_submit', 'data': task})
+
+
+def submit_batches(connection, tasks, batch_size):
+    for start in range(0, len(tasks), batch_size):
+        response = connection.call({'type': 'task_submit_batch', 'tasks': tasks[start:start + batch_size]})
+        assert not response['errors']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else BATCH_SIZE
+    tasks = [dict(TASK, data=dict(TASK['data'], numbers=[i, i + 1])) for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as path:
+        os.environ.update(SERVER_PORT='0', TASK_STORE='wal', TASK_STORE_PATH=path)
+        server = DistributedServer()
+        port = server.server_socket.getsockname()[1]
+        threading.Thread(target=server.serve, daemon=True).start()
+        try:
+            for name, run in (('one by one', submit_each), ('batched', submit_batches)):
+                connection = ClientConnection(port)
+                start = time.perf_counter()
+                run(connection, tasks, batch_size)
+                elapsed = time.perf_counter() - start
+                connection.close()
+                print(f"{name:>10}: {count / elapsed:10,.0f} tasks/s ({elapsed:5.2f}s for {count:,})")
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
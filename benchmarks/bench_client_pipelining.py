@@ -0,0 +1,73 @@
+# benchmarks/bench_client_pipelining.py
+"""Requests/s from one TaskClient connection: one request at a time vs many in flight.
+
+The server runs in its own process so that it does not share a GIL with the
+client.
+
+Run with: python -m benchmarks.bench_client_pipelining [requests] [in_flight]
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+from cryptography.fernet import Fernet
+
+REQUESTS = 20_000
+IN_FLIGHT = 256
+
+
+def sequential(client, message, requests, in_flight):
+    for _ in range(requests):
+        client.request(message)
+
+
+def pipelined(client, message, requests, in_flight):
+    window = deque()
+    for _ in range(requests):
+        if len(window) == in_flight:
+            window.popleft().result()
+        window.append(client.send_request(message))
+    for future in window:
+        future.result()
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    in_flight = int(sys.argv[2]) if len(sys.argv) > 2 else IN_FLIGHT
+
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        port = probe.getsockname()[1]
+    os.environ.update(SERVER_PORT=str(port), ENCRYPTION_KEY=Fernet.generate_key().decode())
+    server = subprocess.Popen([sys.executable, '-m', 'src.server.main'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Imported after ENCRYPTION_KEY is set so both processes share the key
+    from src.client.client import TaskClient
+    client = TaskClient()
+    try:
+        for _ in range(100):
+            if client.connect():
+                break
+            time.sleep(0.1)
+        client.login('admin', 'admin123')
+        task_id = client.submit_task({'type': 'io_operation', 'data': {'operation': 'read'}}).task_id
+        message = {'type': 'task_status', 'token': client.auth_token, 'task_id': task_id}
+
+        for name, run in (('sequential', sequential), (f'{in_flight} in flight', pipelined)):
+            start = time.perf_counter()
+            run(client, message, requests, in_flight)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>14}: {requests / elapsed:10,.0f} requests/s "
+                  f"({elapsed * 1e6 / requests:6.1f} us/request)")
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
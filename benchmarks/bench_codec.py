@@ -0,0 +1,45 @@
+# benchmarks/bench_codec.py
+"""Bytes on the wire and encode/decode time, JSON vs binary codec.
+
+Run with: python -m benchmarks.bench_codec [matrix_size]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from src.utils.codec import encode_message, decode_message, JSON, BINARY
+from src.utils.crypto import encrypt_message, decrypt_message
+
+MATRIX_SIZE = 2000
+
+
+def timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else MATRIX_SIZE
+    matrix = np.random.rand(size, size)
+    message = {'type': 'task_complete', 'task_id': 'bench', 'result': {'result': matrix}}
+    print(f"{size}x{size} float64 matrix ({matrix.nbytes / 2**20:.1f} MiB raw)")
+
+    for codec in (JSON, BINARY):
+        payload, encode_time = timed(lambda: encode_message(message, codec))
+        _, decode_time = timed(lambda: decode_message(payload))
+        envelope, seal_time = timed(lambda: encrypt_message(payload), repeat=1)
+        _, open_time = timed(lambda: decrypt_message(envelope), repeat=1)
+        print(f"{codec:>7}: payload {len(payload) / 2**20:7.1f} MiB, "
+              f"on wire {len(envelope) / 2**20:7.1f} MiB | "
+              f"encode {encode_time * 1000:7.1f} ms, decode {decode_time * 1000:7.1f} ms, "
+              f"fernet {(seal_time + open_time) * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
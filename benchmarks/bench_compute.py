@@ -0,0 +1,71 @@
+# benchmarks/bench_compute.py
+"""Reduction throughput over 10^8 elements, plain Python vs the compute engine
+(in memory and memory-mapped), and blocked vs in-memory matrix multiply.
+
+The plain-Python baseline runs over 10^7 elements: a list of 10^8 floats
+would not fit in memory next to everything else.
+
+Run with: python -m benchmarks.bench_compute [elements]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.worker import compute
+
+ELEMENTS = 10 ** 8
+PYTHON_ELEMENTS = 10 ** 7
+MATRIX_SIZE = 2048
+OPERATIONS = ('sum', 'mean', 'min', 'max', 'std', 'histogram')
+
+
+def rate(run, elements):
+    start = time.perf_counter()
+    run()
+    return elements / (time.perf_counter() - start)
+
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else ELEMENTS
+    rng = np.random.default_rng(0)
+
+    numbers = rng.random(PYTHON_ELEMENTS).tolist()
+    print(f"{'python sum()':>28}: {rate(lambda: sum(numbers), len(numbers)) / 1e6:9,.0f} M elements/s")
+    print(f"{'python sum() / len()':>28}: "
+          f"{rate(lambda: sum(numbers) / len(numbers), len(numbers)) / 1e6:9,.0f} M elements/s")
+    print(f"{'list -> array (once)':>28}: "
+          f"{rate(lambda: compute.as_array(numbers), len(numbers)) / 1e6:9,.0f} M elements/s")
+    del numbers
+
+    values = rng.random(elements)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'values.npy')
+        np.save(path, values)
+        for source_name, source in (('in memory', values), ('memory-mapped', {'path': path})):
+            for operation in OPERATIONS:
+                throughput = rate(lambda: compute.reduce(source, operation), elements)
+                print(f"{operation + ', ' + source_name:>28}: {throughput / 1e6:9,.0f} M elements/s")
+        del values
+
+        a = rng.random((MATRIX_SIZE, MATRIX_SIZE))
+        b = rng.random((MATRIX_SIZE, MATRIX_SIZE))
+        np.save(os.path.join(directory, 'a.npy'), a)
+        np.save(os.path.join(directory, 'b.npy'), b)
+        flops = 2 * MATRIX_SIZE ** 3
+        runs = (
+            ('matmul, in memory', lambda: compute.matmul(a, b)),
+            ('matmul, blocked 64 MiB', lambda: compute.matmul(
+                {'path': os.path.join(directory, 'a.npy')}, {'path': os.path.join(directory, 'b.npy')},
+                out={'path': os.path.join(directory, 'c.npy')}, block_bytes=64 * 1024 * 1024
+            )),
+        )
+        for name, run in runs:
+            print(f"{name:>28}: {rate(run, flops) / 1e9:9,.1f} GFLOP/s ({MATRIX_SIZE}x{MATRIX_SIZE})")
+
+
+if __name__ == '__main__':
+    main()
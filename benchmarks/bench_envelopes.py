@@ -0,0 +1,56 @@
+# benchmarks/bench_envelopes.py
+"""Seal + open throughput of the message envelopes for 1 KB / 1 MB / 100 MB messages.
+
+"fernet (per call)" is the old behaviour of building a Fernet object for
+every message; "none" is what a verified TLS connection now uses.
+
+Run with: python -m benchmarks.bench_envelopes
+"""
+
+import os
+import time
+
+from cryptography.fernet import Fernet
+
+from src.utils.crypto import (
+    crypto_manager, encrypt_message, decrypt_message,
+    NO_ENVELOPE, AESGCM_ENVELOPE, FERNET_ENVELOPE
+)
+
+SIZES = (('1 KB', 1024, 5_000), ('1 MB', 1024 * 1024, 50), ('100 MB', 100 * 1024 * 1024, 2))
+
+
+def per_call_fernet(payload):
+    token = Fernet(crypto_manager.key).encrypt(payload)
+    return token, Fernet(crypto_manager.key).decrypt(token)
+
+
+def envelope(name):
+    def run(payload):
+        sealed = encrypt_message(payload, name)
+        return sealed, decrypt_message(sealed, name)
+    return run
+
+
+def main():
+    runs = (
+        ('fernet (per call)', per_call_fernet),
+        ('fernet', envelope(FERNET_ENVELOPE)),
+        ('aesgcm', envelope(AESGCM_ENVELOPE)),
+        ('none', envelope(NO_ENVELOPE)),
+    )
+    for label, size, repeat in SIZES:
+        payload = os.urandom(size)
+        print(f"{label} messages:")
+        for name, run in runs:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                sealed, opened = run(payload)
+            elapsed = (time.perf_counter() - start) / repeat
+            assert opened == payload
+            print(f"  {name:>18}: {size / elapsed / 1e6:9,.1f} MB/s round trip, "
+                  f"{elapsed * 1e6:10,.1f} us/message, {len(sealed) / size - 1:+6.1%} on the wire")
+
+
+if __name__ == '__main__':
+    main()
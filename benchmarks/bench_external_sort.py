@@ -0,0 +1,77 @@
+# benchmarks/bench_external_sort.py
+"""Sorting a JSON Lines file on disk: read everything and sorted() (the old
+path, given the data inline) vs the external merge sort at two memory
+budgets. Each run is a fresh process, so its max RSS is its own.
+
+Run with: python -m benchmarks.bench_external_sort [records]
+"""
+
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from src.worker import external_sort
+
+RECORDS = 4_000_000
+KEY = 'score'
+BUDGETS = (64 * 1024 * 1024, 256 * 1024 * 1024)
+
+
+def in_memory(source, output, memory):
+    with open(source, 'rb') as f:
+        records = [json.loads(line) for line in f]
+    records = sorted(records, key=lambda x: x.get(KEY))
+    with open(output, 'w') as f:
+        f.writelines(json.dumps(record) + '\n' for record in records)
+
+
+def external(source, output, memory):
+    for _ in external_sort.sort_file(source, output, KEY, memory=memory):
+        pass
+
+
+def measure(run, source, output, memory, results):
+    start = time.perf_counter()
+    run(source, output, memory)
+    results.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else RECORDS
+    context = multiprocessing.get_context('spawn')
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'in.jsonl')
+        with open(source, 'w') as f:
+            for start in range(0, records, 100_000):
+                f.writelines(
+                    json.dumps({'id': i, 'name': f'user-{rng.randrange(10 ** 6)}', KEY: rng.random()}) + '\n'
+                    for i in range(start, min(records, start + 100_000))
+                )
+        print(f"{records:,} records, {os.path.getsize(source) / 2**20:,.0f} MiB of JSON Lines")
+
+        outputs = []
+        for name, run, memory in (
+            ('sorted() in memory', in_memory, None),
+            *((f'external, {memory >> 20} MiB budget', external, memory) for memory in BUDGETS)
+        ):
+            output = os.path.join(directory, f'out-{len(outputs)}.jsonl')
+            results = context.Queue()
+            process = context.Process(target=measure, args=(run, source, output, memory, results))
+            process.start()
+            elapsed, max_rss = results.get()
+            process.join()
+            outputs.append(output)
+            print(f"{name:>26}: {elapsed:8.1f} s, max RSS {max_rss / 1024:8,.0f} MiB")
+
+        with open(outputs[0], 'rb') as expected, open(outputs[1], 'rb') as actual:
+            assert all(a == b for a, b in zip(expected, actual))
+
+
+if __name__ == '__main__':
+    main()
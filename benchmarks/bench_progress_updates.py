@@ -0,0 +1,76 @@
+# benchmarks/bench_progress_updates.py
+"""Socket.IO progress traffic: broadcasting every update vs coalesced per-room batches.
+
+Run with: python -m benchmarks.bench_progress_updates [tasks] [dashboards]
+"""
+
+import random
+import sys
+import time
+
+from src.server.update_emitter import UpdateEmitter
+
+TASKS = 500
+DASHBOARDS = 50
+UPDATES_PER_SECOND = 2  # _simulate_progress reports every 0.5 s
+SIMULATED_SECONDS = 10
+FLUSH_INTERVAL = 0.25
+
+
+class CountingSocketIO:
+    """Counts the messages each emit would deliver to connected clients"""
+
+    def __init__(self, members):
+        self.members = members
+        self.delivered = 0
+
+    def emit(self, event, data, to=None, broadcast=False):
+        self.delivered += self.members.get(to, 0) if to else self.members['*']
+
+    def start_background_task(self, target):
+        return None
+
+    def sleep(self, seconds):
+        pass
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+    dashboards = int(sys.argv[2]) if len(sys.argv) > 2 else DASHBOARDS
+    random.seed(1)
+    # Each dashboard belongs to one of ten users and watches the tasks it submitted
+    owners = {task_id: f'user{random.randrange(10)}' for task_id in range(tasks)}
+    members = {'*': dashboards}
+    for dashboard in range(dashboards):
+        room = f'user:user{dashboard % 10}'
+        members[room] = members.get(room, 0) + 1
+
+    updates = [(task_id, {'status': 'running', 'progress': step})
+               for step in range(SIMULATED_SECONDS * UPDATES_PER_SECOND)
+               for task_id in range(tasks)]
+
+    broadcast = CountingSocketIO(members)
+    start = time.perf_counter()
+    for task_id, update in updates:
+        broadcast.emit('task_update', dict(update, task_id=task_id), broadcast=True)
+    broadcast_time = time.perf_counter() - start
+
+    rooms = CountingSocketIO(members)
+    emitter = UpdateEmitter(rooms, interval=FLUSH_INTERVAL)
+    per_flush = len(updates) // int(SIMULATED_SECONDS / FLUSH_INTERVAL)
+    start = time.perf_counter()
+    for i, (task_id, update) in enumerate(updates, 1):
+        emitter.publish(task_id, update, owners[task_id])
+        if i % per_flush == 0:
+            emitter.flush()
+    emitter.stop()
+    rooms_time = time.perf_counter() - start
+
+    for name, socketio, elapsed in (('broadcast', broadcast, broadcast_time),
+                                    ('rooms', rooms, rooms_time)):
+        print(f"{name:>9}: {socketio.delivered / SIMULATED_SECONDS:10,.0f} messages/s delivered, "
+              f"{elapsed * 1e6 / len(updates):5.2f} us/update on the server")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_result_cache.py
+"""Repeated deterministic tasks: submit, lease, execute and ack again vs a cache hit at submit.
+
+Run with: python -m benchmarks.bench_result_cache [repeats]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from src.server.result_cache import ResultCache
+from src.server.task_manager import TaskManager
+from src.worker.task_executor import TaskExecutor
+
+REPEATS = 50
+SIZES = (100, 800)
+
+
+def tasks():
+    rng = np.random.default_rng(0)
+    for size in SIZES:
+        matrix = rng.random((size, size))
+        yield f'matmul {size}x{size}', {'type': 'computation', 'data': {
+            'operation': 'matrix_multiply', 'matrix1': matrix, 'matrix2': matrix
+        }}
+    yield 'sort', {'type': 'data_processing', 'data': {
+        'operation': 'sort', 'key': 'id',
+        'data': [{'id': int(i)} for i in rng.permutation(10_000)]
+    }}
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else REPEATS
+    executor = TaskExecutor()
+    handlers = {
+        'computation': executor.handle_computation,
+        'data_processing': executor.handle_data_processing
+    }
+
+    for name, task in tasks():
+        handler = handlers[task['type']]
+        manager = TaskManager(dispatch_threads=0)
+        manager.register_worker({'id': 'bench', 'capabilities': [task['type']]})
+        start = time.perf_counter()
+        for _ in range(repeats):
+            manager.submit_task(task)
+            [leased] = manager.lease_tasks('bench', 1)
+            result = handler(leased['data'])
+            manager.ack_tasks('bench', [{'task_id': leased['id'], 'result': result}])
+        executed = (time.perf_counter() - start) / repeats
+        manager.stop()
+
+        manager = TaskManager(dispatch_threads=0, result_cache=ResultCache())
+        first = manager.submit_task(task)
+        manager.next_task()
+        manager.complete_task(first, result)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            manager.submit_task(task)
+        cached = (time.perf_counter() - start) / repeats
+        stats = manager.get_cache_stats()
+        manager.stop()
+
+        print(f"{name:>15}: run again {executed * 1e3:7.2f} ms, cache hit {cached * 1e3:7.2f} ms "
+              f"({stats['hits']} hits, {stats['bytes'] / 1024:,.0f} KiB cached)")
+
+
+if __name__ == '__main__':
+    main()
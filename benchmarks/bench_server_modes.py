@@ -0,0 +1,142 @@
+# benchmarks/bench_server_modes.py
+"""Connection count and messages/s for the threaded and asyncio server modes.
+
+Run with: python -m benchmarks.bench_server_modes [connections] [messages]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import time
+
+from cryptography.fernet import Fernet
+
+# Server and load generator must share a key; set it before importing crypto
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+
+from src.utils.crypto import encrypt_message, decrypt_message
+from src.utils.framing import FrameDecoder, encode_frame
+
+CONNECTIONS = 200
+MESSAGES_PER_CONNECTION = 50
+
+
+SERVER_SCRIPT = """
+import threading, time
+from src.server.main import DistributedServer
+server = DistributedServer()
+threading.Thread(target=server.serve, daemon=True).start()
+while True:
+    time.sleep(0.5)
+    print(threading.active_count(), flush=True)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port):
+    """Run the server in its own process so it does not share our GIL"""
+    env = dict(os.environ, SERVER_MODE=mode, SERVER_PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_SCRIPT],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    time.sleep(1.5)
+    return process
+
+
+def server_thread_count(process):
+    """Read the most recent thread count the server process reported"""
+    os.set_blocking(process.stdout.fileno(), False)
+    count = None
+    for line in process.stdout.read().splitlines():
+        if line.strip().isdigit():
+            count = int(line)
+    return count
+
+
+async def read_frame(reader, decoder):
+    frames = []
+    while not frames:
+        frames = decoder.feed(await reader.read(4096))
+    return frames[0]
+
+
+async def run_connection(port, ssl_context, messages, ready, go):
+    reader, writer = await asyncio.open_connection('localhost', port, ssl=ssl_context)
+    decoder = FrameDecoder()
+    writer.write(encode_frame(encrypt_message(
+        json.dumps({'username': 'admin', 'password': 'admin123'})
+    )))
+    await writer.drain()
+    json.loads(decrypt_message(await read_frame(reader, decoder)))
+    ready()
+    await go.wait()
+
+    request = encode_frame(encrypt_message(
+        json.dumps({'type': 'task_status', 'task_id': 'missing'})
+    ))
+    for _ in range(messages):
+        writer.write(request)
+        await writer.drain()
+        await read_frame(reader, decoder)
+    writer.close()
+
+
+async def run_load(process, port, connections, messages):
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+
+    go = asyncio.Event()
+    connected = []
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(run_connection(
+            port, ssl_context, messages, lambda: connected.append(1), go
+        ))
+        for _ in range(connections)
+    ]
+    while len(connected) < connections:
+        await asyncio.sleep(0.01)
+    connect_time = time.perf_counter() - start
+    await asyncio.sleep(1.0)  # let the server report its thread count
+    threads = server_thread_count(process)
+
+    start = time.perf_counter()
+    go.set()
+    await asyncio.gather(*tasks)
+    message_time = time.perf_counter() - start
+    return connect_time, message_time, threads
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else CONNECTIONS
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else MESSAGES_PER_CONNECTION
+
+    for mode in ('threaded', 'asyncio'):
+        port = free_port()
+        process = start_server(mode, port)
+        try:
+            connect_time, message_time, threads = asyncio.run(
+                run_load(process, port, connections, messages)
+            )
+        finally:
+            process.kill()
+            process.wait()
+        total = connections * messages
+        print(f"{mode:>8}: {connections} connections in {connect_time:6.2f}s, "
+              f"{total / message_time:10,.0f} msg/s, "
+              f"server threads={threads}")
+
+
+if __name__ == '__main__':
+    main()
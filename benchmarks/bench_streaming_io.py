@@ -0,0 +1,117 @@
+# benchmarks/bench_streaming_io.py
+"""io_operation reads of a 1 GiB file: the old whole-file read vs streamed
+chunks (plain and memory-mapped), random 4 KiB range reads, and a streamed
+read end to end from a worker through the server to a client.
+
+Run with: python -m benchmarks.bench_streaming_io [MiB]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from src.client.client import TaskClient
+from src.server.main import DistributedServer
+from src.worker import file_io
+from src.worker.main import WorkerNode
+from src.worker.task_executor import TaskExecutor
+
+FILE_MIB = 1024
+END_TO_END_MIB = 256
+RANGE_READS = 20_000
+RANGE_SIZE = 4096
+
+
+def traced(run):
+    """Run run() and return (seconds, peak bytes allocated while it ran)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def whole_file(path):
+    with open(path, 'r') as f:  # handle_io_operation as it was
+        return {'content': f.read()}
+
+
+def streamed(path, use_mmap, binary):
+    executor = TaskExecutor()
+    executor.chunk_callback = lambda task_id, offset, data: None
+    return executor.execute_task({'id': 't', 'type': 'io_operation', 'data': {
+        'operation': 'read', 'filename': path, 'stream': True, 'mmap': use_mmap, 'binary': binary
+    }})
+
+
+def end_to_end(path, size):
+    os.environ['SERVER_PORT'] = '0'
+    server = DistributedServer()
+    os.environ['SERVER_PORT'] = str(server.server_socket.getsockname()[1])
+    threading.Thread(target=server.serve, daemon=True).start()
+    worker = WorkerNode()
+    worker.use_ssl = True  # the server only accepts TLS
+    threading.Thread(target=worker.start, daemon=True).start()
+    client = TaskClient()
+    received = [0]
+    try:
+        client.connect()
+        client.login('admin', 'admin123')
+        start = time.perf_counter()
+        future = client.submit_task(
+            {'type': 'io_operation', 'data': {'operation': 'read', 'filename': path,
+                                             'stream': True, 'binary': True, 'length': size}},
+            on_chunk=lambda message: received.__setitem__(
+                0, (0 if message.get('restart') else received[0]) + len(message['data']))
+        )
+        result = future.result(timeout=600)
+        elapsed = time.perf_counter() - start
+        assert received[0] == result['length'] == size
+        return elapsed
+    finally:
+        client.close()
+        worker.stop()
+        server.stop()
+
+
+def main():
+    mib = int(sys.argv[1]) if len(sys.argv) > 1 else FILE_MIB
+    size = mib * 2**20
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'data.txt')
+        line = b'x' * 63 + b'\n'
+        with open(path, 'wb') as f:
+            for _ in range(mib):
+                f.write(line * (2**20 // len(line)))
+
+        for name, run in (
+            ('whole-file read', lambda: whole_file(path)),
+            ('streamed, text', lambda: streamed(path, False, False)),
+            ('streamed, binary', lambda: streamed(path, False, True)),
+            ('streamed, mmap', lambda: streamed(path, True, True)),
+        ):
+            elapsed, peak = traced(run)
+            print(f"{name:>22}: {mib / elapsed:8,.0f} MiB/s, peak {peak / 2**20:8.1f} MiB ({mib:,} MiB file)")
+
+        rng = random.Random(0)
+        offsets = [rng.randrange(size - RANGE_SIZE) for _ in range(RANGE_READS)]
+        for name, use_mmap in (('range reads, seek', False), ('range reads, mmap', True)):
+            start = time.perf_counter()
+            for offset in offsets:
+                file_io.read(path, offset, RANGE_SIZE, binary=True, use_mmap=use_mmap)
+            rate = RANGE_READS / (time.perf_counter() - start)
+            print(f"{name:>22}: {rate:8,.0f} reads/s ({RANGE_SIZE // 1024} KiB each)")
+
+        e2e = min(mib, END_TO_END_MIB)
+        elapsed = end_to_end(path, e2e * 2**20)
+        print(f"{'worker -> client':>22}: {e2e / elapsed:8,.0f} MiB/s ({e2e:,} MiB over TLS, 1 MiB chunks)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_task_futures.py
+"""Time from a task finishing to the client seeing its result: 1 s status polling vs pushed futures.
+
+Run with: python -m benchmarks.bench_task_futures [tasks]
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+from src.client.client import TaskClient
+from src.client.futures import as_completed
+from src.server.main import DistributedServer
+
+TASKS = 200
+SPREAD = 3.0  # seconds over which the tasks finish
+POLL_INTERVAL = 1.0
+TASK = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+
+
+def finish_later(manager, task_ids, finished_at):
+    """Complete the tasks at random times, recording when each one finished"""
+    random.seed(1)
+    schedule = sorted((random.uniform(0, SPREAD), task_id) for task_id in task_ids)
+    start = time.perf_counter()
+    for delay, task_id in schedule:
+        time.sleep(max(0.0, start + delay - time.perf_counter()))
+        finished_at[task_id] = time.perf_counter()
+        manager.complete_task(task_id, 6)
+
+
+def polling(client, manager, tasks):
+    task_ids = [client.submit_task(TASK).task_id for _ in range(tasks)]
+    finished_at, seen_at = {}, {}
+    threading.Thread(target=finish_later, args=(manager, task_ids, finished_at)).start()
+    requests = 0
+    waiting = set(task_ids)
+    while waiting:
+        for task_id in list(waiting):
+            requests += 1
+            if client.get_task_status(task_id)['status'] == 'completed':
+                seen_at[task_id] = time.perf_counter()
+                waiting.discard(task_id)
+        if waiting:
+            time.sleep(POLL_INTERVAL)
+    return finished_at, seen_at, requests
+
+
+def pushed(client, manager, tasks):
+    futures = [client.submit_task(TASK) for _ in range(tasks)]
+    finished_at, seen_at = {}, {}
+    threading.Thread(target=finish_later, args=(manager, [f.task_id for f in futures], finished_at)).start()
+    for future in as_completed(futures):
+        seen_at[future.task_id] = time.perf_counter()
+    return finished_at, seen_at, 0
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+
+    os.environ['SERVER_PORT'] = '0'
+    server = DistributedServer()
+    os.environ['SERVER_PORT'] = str(server.server_socket.getsockname()[1])
+    threading.Thread(target=server.serve, daemon=True).start()
+    client = TaskClient()
+    try:
+        client.connect()
+        client.login('admin', 'admin123')
+        for name, run in (('polling', polling), ('futures', pushed)):
+            finished_at, seen_at, requests = run(client, server.task_manager, tasks)
+            delays = sorted(seen_at[task_id] - finished_at[task_id] for task_id in finished_at)
+            print(f"{name:>8}: mean {sum(delays) / len(delays) * 1e3:7.1f} ms, "
+                  f"max {delays[-1] * 1e3:7.1f} ms after finishing, {requests:,} status requests")
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_task_leasing.py
+"""Tiny computation tasks/s for one worker: request_task per task vs batched leases.
+
+Run with: python -m benchmarks.bench_task_leasing [tasks] [prefetch]
+"""
+
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+
+from src.server.main import DistributedServer
+from src.utils.codec import encode_message, decode_message
+from src.utils.crypto import encrypt_message, decrypt_message
+from src.utils.framing import iter_frames, send_frame
+from src.worker.task_executor import TaskExecutor
+
+TASKS = 5_000
+PREFETCH = 64
+TASK = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+
+
+class WorkerConnection:
+    """Bare worker protocol over one TLS connection"""
+
+    def __init__(self, port, worker_id):
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        sock = socket.create_connection(('localhost', port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = context.wrap_socket(sock)
+        self.frames = iter_frames(self.sock)
+        self.worker_id = worker_id
+        self.pushed = []  # assignments the server pushed unasked
+        self.call({'username': 'worker', 'password': 'worker123', 'codecs': ['binary']})
+        self.call({
+            'type': 'register_worker',
+            'worker_info': {'id': worker_id, 'capabilities': ['computation']}
+        })
+
+    def call(self, message):
+        send_frame(self.sock, encrypt_message(encode_message(message, 'binary')))
+        while True:
+            response = decode_message(decrypt_message(next(self.frames)))
+            if 'status' in response:
+                return response
+            self.pushed.append(response['task'])
+
+    def take_pushed(self):
+        pushed, self.pushed = self.pushed, []
+        return pushed
+
+    def close(self):
+        self.sock.close()
+
+
+def run_polling(connection, handler, tasks):
+    """One request_task and one task_complete round trip per task"""
+    done = 0
+    while done < tasks:
+        response = connection.call({'type': 'request_task', 'worker_id': connection.worker_id})
+        for task in connection.take_pushed() + [response.get('task')]:
+            if task is not None:
+                result = handler(task['data'])
+                connection.call({'type': 'task_complete', 'task_id': task['id'], 'result': result})
+                done += 1
+
+
+def run_leasing(connection, handler, tasks, prefetch):
+    """Lease up to prefetch tasks per request and ack them in one message"""
+    done = 0
+    while done < tasks:
+        response = connection.call({
+            'type': 'lease_tasks', 'worker_id': connection.worker_id, 'count': prefetch
+        })
+        results = [
+            {'task_id': task['id'], 'result': handler(task['data'])}
+            for task in connection.take_pushed() + response['tasks']
+        ]
+        if results:
+            connection.call({
+                'type': 'ack_tasks', 'worker_id': connection.worker_id, 'results': results
+            })
+        done += len(results)
+
+
+def bench(server, port, name, run, tasks, *args):
+    for _ in range(tasks):
+        server.task_manager.submit_task(TASK)
+    connection = WorkerConnection(port, f'bench-{name}')
+    handler = TaskExecutor().handle_computation
+
+    start = time.perf_counter()
+    run(connection, handler, tasks, *args)
+    elapsed = time.perf_counter() - start
+    connection.close()
+    print(f"{name:>8}: {tasks / elapsed:10,.0f} tasks/s ({elapsed * 1e6 / tasks:6.1f} us/task)")
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+    prefetch = int(sys.argv[2]) if len(sys.argv) > 2 else PREFETCH
+
+    os.environ['SERVER_PORT'] = '0'
+    server = DistributedServer()
+    port = server.server_socket.getsockname()[1]
+    threading.Thread(target=server.serve, daemon=True).start()
+    try:
+        bench(server, port, 'polling', run_polling, tasks)
+        bench(server, port, 'leasing', run_leasing, tasks, prefetch)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_task_queries.py
+"""Listing and counting tasks in a large table: secondary indexes vs scanning every task.
+
+Run with: python -m benchmarks.bench_task_queries [tasks]
+"""
+
+import random
+import sys
+import time
+
+from src.server.task_index import TaskIndex
+
+TASKS = 1_000_000
+TYPES = ('computation', 'data_processing', 'file_operation')
+OWNERS = tuple(f'user{i}' for i in range(20))
+QUERIES = (
+    ('50 newest running', {'status': 'running'}),
+    ('50 newest running computation', {'status': 'running', 'type': 'computation'}),
+    ('50 newest failed of one user', {'status': 'failed', 'owner': 'user7'}),
+)
+
+
+def build(count):
+    random.seed(1)
+    tasks = {}
+    for i in range(count):
+        status = random.choices(('completed', 'failed', 'pending', 'running'), (90, 2, 6, 2))[0]
+        task = {'status': status, 'priority': random.randint(1, 3),
+                'type': random.choice(TYPES), 'owner': random.choice(OWNERS),
+                'submitted_at': float(i)}
+        if status == 'running':
+            task['worker'] = f'worker{i % 100}'
+        tasks[f'task-{i}'] = task
+    return tasks
+
+
+def scan(tasks, filters, limit=50):
+    matches = [(task['submitted_at'], task_id) for task_id, task in tasks.items()
+               if all(task.get(field) == value for field, value in filters.items())]
+    matches.sort(reverse=True)
+    return [task_id for _, task_id in matches[:limit]], len(matches)
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+    tasks = build(count)
+    index = TaskIndex()
+    build_time, _ = timed(lambda: index.rebuild(tasks), repeat=1)
+    print(f"{count:,} tasks, index built in {build_time:.2f}s")
+
+    for name, filters in QUERIES:
+        indexed, (page, _) = timed(lambda: index.query(filters))
+        counted, total = timed(lambda: index.count(filters))
+        scanned, (expected, expected_total) = timed(lambda: scan(tasks, filters), repeat=1)
+        assert page == expected and total == expected_total
+        print(f"{name:>30}: index {indexed * 1e3:7.3f} ms + count {counted * 1e3:7.3f} ms, "
+              f"scan {scanned * 1e3:7.1f} ms ({total:,} matches)")
+
+    # Status changes keep the indexes current
+    running = [task_id for task_id, task in tasks.items() if task['status'] == 'running'][:10_000]
+    start = time.perf_counter()
+    for task_id in running:
+        index.update(task_id, {'status': 'completed', 'worker': None})
+        tasks[task_id].update(status='completed', worker=None)
+    print(f"{'index update':>30}: {(time.perf_counter() - start) * 1e6 / len(running):.1f} us/change")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_task_queue.py
+"""Ready-queue throughput and memory at 100k pending tasks.
+
+Run with: python -m benchmarks.bench_task_queue
+"""
+
+import random
+import threading
+import time
+import tracemalloc
+
+from src.server.task_manager import TaskManager
+from src.server.task_queue import TaskQueue
+
+PENDING_TASKS = 100_000
+
+
+def bench_queue_ops(n):
+    queue = TaskQueue()
+    ids = [f'task-{i}' for i in range(n)]
+
+    start = time.perf_counter()
+    for i, task_id in enumerate(ids):
+        queue.push(task_id, random.randint(1, 3), submitted_at=i * 0.001)
+    push_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for task_id in random.sample(ids, n // 10):
+        queue.reprioritize(task_id, random.randint(1, 3))
+    reprioritize_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    while queue.pop() is not None:
+        pass
+    pop_time = time.perf_counter() - start
+
+    print(f"push:         {n / push_time:12,.0f} ops/s")
+    print(f"reprioritize: {n // 10 / reprioritize_time:12,.0f} ops/s")
+    print(f"pop:          {n / pop_time:12,.0f} ops/s")
+
+
+def bench_manager_memory(n):
+    task_data = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+    threads_before = threading.active_count()
+
+    tracemalloc.start()
+    manager = TaskManager(dispatch_threads=4)
+    checkpoints = {n // 10, n // 2, n}
+    for i in range(1, n + 1):
+        manager.submit_task(task_data, priority=random.randint(1, 3))
+        if i in checkpoints:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{i:>8,} pending: {current / 2**20:8.1f} MiB "
+                  f"({current / i:5.0f} B/task), "
+                  f"threads={threading.active_count() - threads_before}")
+    tracemalloc.stop()
+    manager.stop()
+
+
+def main():
+    print(f"TaskQueue operations ({PENDING_TASKS:,} tasks)")
+    bench_queue_ops(PENDING_TASKS)
+    print()
+    print("TaskManager memory and thread count while tasks are pending")
+    bench_manager_memory(PENDING_TASKS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_timing_wheel.py
+"""Heartbeat bookkeeping for many workers: timing wheel vs scanning every deadline.
+
+Run with: python -m benchmarks.bench_timing_wheel [workers]
+"""
+
+import random
+import sys
+import time
+
+from src.server.timing_wheel import TimingWheel
+
+WORKERS = 50_000
+TIMEOUT = 30.0
+TICK = 1.0
+SIMULATED_SECONDS = 120
+
+
+def bench_wheel(workers):
+    now = [0.0]
+    wheel = TimingWheel(tick=TICK, clock=lambda: now[0])
+    for worker_id in range(workers):
+        wheel.schedule(worker_id, TIMEOUT)
+
+    touches = advance = 0.0
+    expired = 0
+    for second in range(1, SIMULATED_SECONDS + 1):
+        now[0] = second
+        # Every worker is heard from about every 10 s; 1% have gone silent
+        heard = random.sample(range(workers), workers // 10)
+        start = time.perf_counter()
+        for worker_id in heard:
+            if worker_id % 100 and worker_id in wheel:
+                wheel.schedule(worker_id, TIMEOUT)
+        touches += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expired += len(wheel.advance())
+        advance += time.perf_counter() - start
+    return touches, advance, expired
+
+
+def bench_scan(workers):
+    deadlines = {worker_id: TIMEOUT for worker_id in range(workers)}
+    touches = advance = 0.0
+    expired = 0
+    for second in range(1, SIMULATED_SECONDS + 1):
+        heard = random.sample(range(workers), workers // 10)
+        start = time.perf_counter()
+        for worker_id in heard:
+            if worker_id % 100 and worker_id in deadlines:
+                deadlines[worker_id] = second + TIMEOUT
+        touches += time.perf_counter() - start
+
+        start = time.perf_counter()
+        dead = [worker_id for worker_id, deadline in deadlines.items() if deadline <= second]
+        for worker_id in dead:
+            del deadlines[worker_id]
+        expired += len(dead)
+        advance += time.perf_counter() - start
+    return touches, advance, expired
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS
+    touches_per_run = SIMULATED_SECONDS * (workers // 10)
+    for name, bench in (('wheel', bench_wheel), ('scan', bench_scan)):
+        random.seed(1)
+        touches, advance, expired = bench(workers)
+        print(f"{name:>5}: {touches * 1e9 / touches_per_run:6.0f} ns/touch, "
+              f"{advance * 1e6 / SIMULATED_SECONDS:8.1f} us/tick, {expired:,} expired")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_worker_slots.py
+"""CPU-bound tasks/s of one worker's TaskExecutor as slots are added: every
+task on threads (GIL-bound) vs CPU-bound types on the process pool.
+
+Scaling is bounded by the number of cores of the machine it runs on.
+
+Run with: python -m benchmarks.bench_worker_slots [tasks]
+"""
+
+import os
+import sys
+import time
+
+from src.worker.task_executor import TaskExecutor, CPU_BOUND_TYPES
+
+TASKS = 200
+ITEMS = 20_000
+TASK = {'type': 'data_processing', 'data': {
+    'operation': 'transform',
+    'data': [{'name': f'item-{i}', 'group': 'a'} for i in range(ITEMS)],
+    'transformation': {'name': 'uppercase', 'group': 'uppercase'}
+}}
+
+
+def tasks_per_second(slots, processes, tasks):
+    executor = TaskExecutor(slots)
+    executor.cpu_bound = set(CPU_BOUND_TYPES) if processes else set()
+    try:
+        # Warm up: start every pool process before timing
+        for future in [executor.submit(dict(TASK, id='warmup')) for _ in range(slots)]:
+            future.result()
+        start = time.perf_counter()
+        futures = [executor.submit(dict(TASK, id=str(i))) for i in range(tasks)]
+        for future in futures:
+            assert len(future.result()['result']) == ITEMS
+        return tasks / (time.perf_counter() - start)
+    finally:
+        executor.shutdown()
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+    cores = os.cpu_count() or 1
+    slot_counts = sorted({1, 2, 4, cores})
+    print(f"{cores} cores, {tasks} transform tasks of {ITEMS:,} items")
+    for slots in slot_counts:
+        threads = tasks_per_second(slots, False, tasks)
+        processes = tasks_per_second(slots, True, tasks)
+        print(f"{slots:>3} slots: threads {threads:7.1f} tasks/s, processes {processes:7.1f} tasks/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_worker_throughput.py
+"""Task latency and tasks/s through one worker: the old fixed 10 x 0.5 s
+simulated progress loop vs handlers that report their own progress.
+
+Run with: python -m benchmarks.bench_worker_throughput [tasks]
+"""
+
+import os
+import sys
+import threading
+import time
+
+from src.client.client import TaskClient
+from src.client.futures import wait_all
+from src.server.main import DistributedServer
+from src.worker.main import WorkerNode
+from src.worker.task_executor import TaskExecutor
+
+TASKS = 2_000
+LEGACY_TASKS = 3
+LATENCY_SAMPLES = 50
+LEGACY_LATENCY_SAMPLES = 2
+TASK = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+
+
+class LegacyExecutor(TaskExecutor):
+    """execute_task as it was: ten 0.5 s steps around the real handler"""
+
+    def execute_task(self, task_data):
+        handler = self.task_handlers[task_data['type']]
+        for step in range(10):
+            if step == 9:
+                result = handler(task_data['data'])
+            if self.update_callback:
+                self.update_callback(task_data['id'], 'running', (step + 1) * 10)
+            time.sleep(0.5)
+        return result
+
+
+def run(client, executor, samples, tasks):
+    worker = WorkerNode()
+    worker.task_executor = executor
+    worker.use_ssl = True  # the server only accepts TLS
+    threading.Thread(target=worker.start, daemon=True).start()
+    try:
+        client.submit_task(TASK).result(timeout=60)  # wait for the worker to connect
+
+        # Tasks one at a time for latency, then a batch for throughput
+        start = time.perf_counter()
+        for _ in range(samples):
+            client.submit_task(TASK).result(timeout=60)
+        latency = (time.perf_counter() - start) / samples
+
+        start = time.perf_counter()
+        futures = [client.submit_task(TASK) for _ in range(tasks)]
+        done, not_done = wait_all(futures, timeout=600)
+        assert not not_done
+        return latency, tasks / (time.perf_counter() - start)
+    finally:
+        worker.stop()
+
+
+def main():
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else TASKS
+
+    os.environ['SERVER_PORT'] = '0'
+    server = DistributedServer()
+    os.environ['SERVER_PORT'] = str(server.server_socket.getsockname()[1])
+    threading.Thread(target=server.serve, daemon=True).start()
+    client = TaskClient()
+    try:
+        client.connect()
+        client.login('admin', 'admin123')
+        for name, executor, samples, count in (
+            ('simulated progress', LegacyExecutor(), LEGACY_LATENCY_SAMPLES, LEGACY_TASKS),
+            ('reported progress', TaskExecutor(), LATENCY_SAMPLES, tasks)
+        ):
+            latency, rate = run(client, executor, samples, count)
+            print(f"{name:>20}: {latency * 1e3:8.1f} ms latency, {rate:8,.1f} tasks/s "
+                  f"({count:,} tasks, one worker)")
+    finally:
+        client.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
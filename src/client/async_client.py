@@ -0,0 +1,266 @@
+# src/client/async_client.py
+
+import os
+import asyncio
+import itertools
+from collections import deque
+from dotenv import load_dotenv
+from ..utils.crypto import (
+    encrypt_message, decrypt_message, client_ssl_context, offered_envelopes, FERNET_ENVELOPE
+)
+from ..utils.framing import FrameDecoder, encode_frame, RECV_BUFFER_SIZE
+from ..utils.codec import encode_message, decode_message, OFFERED_CODECS, JSON
+from .client import DEFAULT_BATCH_SIZE, DEFAULT_REQUEST_TIMEOUT
+
+load_dotenv()
+
+DEFAULT_POOL_SIZE = int(os.getenv('CLIENT_POOL_SIZE', 4))
+# Updates kept while no updates() iterator is open; the oldest go first
+DEFAULT_UPDATE_BACKLOG = int(os.getenv('CLIENT_UPDATE_BACKLOG', 1000))
+
+class AsyncTaskClient:
+    """asyncio client for the task server.
+
+    Requests are spread over a small pool of connections, each of which
+    multiplexes any number of in-flight requests by request_id, so one
+    event loop can drive many thousands of concurrent tasks. Updates for
+    watched tasks are pushed by the server and delivered to every
+    ``updates()`` iterator.
+
+        async with AsyncTaskClient() as client:
+            await client.login('admin', 'admin123')
+            task_id = await client.submit_task(task_data)
+            await client.watch([task_id])
+            async for update in client.updates():  # nothing pushed meanwhile is lost
+                ...
+    """
+
+    def __init__(self, host=None, port=None, pool_size=DEFAULT_POOL_SIZE):
+        self.host = host or os.getenv('SERVER_HOST', 'localhost')
+        self.port = int(port or os.getenv('SERVER_PORT', 5000))
+        self.pool_size = pool_size
+        self.request_timeout = DEFAULT_REQUEST_TIMEOUT
+        self.auth_token = None
+        self.connections = []
+        self.subscribers = set()  # queues of the open updates() iterators
+        # Updates pushed while no updates() iterator was open, the latest ones
+        self.backlog = deque(maxlen=DEFAULT_UPDATE_BACKLOG)
+
+        self.ssl_context, self.tls_verified = client_ssl_context()
+
+    async def login(self, username, password):
+        """Open the connection pool, authenticating each connection"""
+        connections = await asyncio.gather(*(
+            _Connection.open(self, username, password) for _ in range(self.pool_size)
+        ), return_exceptions=True)
+        self.connections = [c for c in connections if isinstance(c, _Connection)]
+        for connection in connections:
+            if not isinstance(connection, _Connection):
+                print(f"Connection failed: {connection}")
+        if not self.connections:
+            return False
+        self.auth_token = self.connections[0].token
+        return True
+
+    async def submit_task(self, task_data, timeout=None):
+        response = await self.request({'type': 'task_submit', 'data': task_data}, timeout)
+        if response and response.get('status') == 'success':
+            return response.get('task_id')
+        return None
+
+    async def submit_many(self, tasks, batch_size=DEFAULT_BATCH_SIZE, timeout=None):
+        """Submit tasks in batches spread over the pool; returns (task_ids, errors) like TaskClient"""
+        starts = range(0, len(tasks), batch_size)
+        responses = await asyncio.gather(*(
+            self.request({'type': 'task_submit_batch', 'tasks': tasks[start:start + batch_size]}, timeout)
+            for start in starts
+        ))
+        task_ids = []
+        errors = []
+        for start, response in zip(starts, responses):
+            if not response or response.get('status') != 'success':
+                task_ids.extend([None] * min(batch_size, len(tasks) - start))
+                errors.append({'index': start, 'error': 'Batch submission failed'})
+                continue
+            task_ids.extend(response['task_ids'])
+            errors.extend(dict(error, index=error['index'] + start) for error in response['errors'])
+        return task_ids, errors
+
+    async def submit_dag(self, tasks, timeout=None):
+        response = await self.request({'type': 'task_submit_dag', 'tasks': tasks}, timeout)
+        if response and response.get('status') == 'success':
+            return response.get('task_ids')
+        return None
+
+    async def get_task_status(self, task_id, timeout=None):
+        response = await self.request({'type': 'task_status', 'task_id': task_id}, timeout)
+        if response and response.get('status') == 'success':
+            return response.get('task_status')
+        return None
+
+    async def watch(self, task_ids, timeout=None):
+        """Ask the server to push updates for task_ids; returns their current state.
+
+        The state of tasks that already finished is returned here only,
+        since no further updates will be pushed for them.
+        """
+        response = await self.request({'type': 'watch_tasks', 'task_ids': list(task_ids)}, timeout)
+        if response and response.get('status') == 'success':
+            return response.get('tasks')
+        return None
+
+    def updates(self):
+        """Async iterator over pushed task_update messages for watched tasks.
+
+        It is subscribed as soon as this returns, not on first iteration.
+        Updates pushed while no iterator was open, e.g. a completion that
+        arrived together with the reply to watch(), are kept and delivered
+        to the next iterator, so none are lost between watch() and the
+        ``async for``. Only the last CLIENT_UPDATE_BACKLOG of them are kept,
+        so a client that watches but never iterates does not grow without
+        bound. Close the iterator (``aclose()``) to unsubscribe.
+        """
+        queue = asyncio.Queue()
+        while self.backlog:
+            queue.put_nowait(self.backlog.popleft())
+        self.subscribers.add(queue)
+        return _Updates(self, queue)
+
+    async def request(self, message, timeout=None):
+        """Send a request on the least busy connection; None on timeout or disconnect"""
+        connections = [c for c in self.connections if not c.closed]
+        if not connections:
+            raise ConnectionError("Not connected to server")
+        connection = min(connections, key=lambda c: len(c.pending))
+        message = dict(message, token=self.auth_token)
+        try:
+            return await asyncio.wait_for(
+                connection.request(message),
+                self.request_timeout if timeout is None else timeout
+            )
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _publish(self, message):
+        if not self.subscribers:
+            self.backlog.append(message)
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+class _Updates:
+    """The async iterator returned by AsyncTaskClient.updates()"""
+
+    def __init__(self, client, queue):
+        self.client = client
+        self.queue = queue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.queue not in self.client.subscribers:
+            raise StopAsyncIteration
+        return await self.queue.get()
+
+    async def aclose(self):
+        self.client.subscribers.discard(self.queue)
+
+class _Connection:
+    """One pooled connection; replies are matched to requests by request_id"""
+
+    def __init__(self, client, reader, writer):
+        self.client = client
+        self.reader = reader
+        self.writer = writer
+        self.codec = JSON  # Switched to the server's choice after login
+        self.envelope = FERNET_ENVELOPE
+        self.token = None
+        self.pending = {}  # request_id -> Future for the reply
+        self.request_ids = itertools.count(1)
+        self.closed = False
+        self.listener = asyncio.get_running_loop().create_task(self._listen())
+
+    @classmethod
+    async def open(cls, client, username, password):
+        reader, writer = await asyncio.open_connection(
+            client.host, client.port, ssl=client.ssl_context
+        )
+        connection = cls(client, reader, writer)
+        try:
+            response = await asyncio.wait_for(connection.request({
+                'type': 'auth',
+                'username': username,
+                'password': password,
+                'codecs': list(OFFERED_CODECS),
+                'envelopes': offered_envelopes(client.tls_verified)
+            }), client.request_timeout)
+        except BaseException:
+            await connection.close()  # timed out or dropped: don't leak the socket
+            raise
+        if response.get('status') != 'success':
+            await connection.close()
+            raise PermissionError("Authentication failed")
+        connection.codec = response.get('codec', JSON)
+        connection.envelope = response.get('envelope', FERNET_ENVELOPE)
+        connection.token = response.get('token')
+        return connection
+
+    async def request(self, message):
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            message = dict(message, request_id=request_id)
+            payload = encrypt_message(encode_message(message, self.codec), self.envelope)
+            self.writer.write(encode_frame(payload))
+            await self.writer.drain()
+            return await future
+        finally:
+            # Also drops the entry when the caller gave up waiting
+            self.pending.pop(request_id, None)
+
+    async def close(self):
+        self.closed = True
+        self.listener.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+    async def _listen(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await self.reader.read(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    message = decode_message(decrypt_message(frame, self.envelope))
+                    future = self.pending.pop(message.get('request_id'), None)
+                    if future is not None:
+                        if not future.done():
+                            future.set_result(message)
+                    elif message.get('type') == 'task_update':
+                        self.client._publish(message)
+        except Exception as e:
+            if not self.closed:
+                print(f"Error in listener: {e}")
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
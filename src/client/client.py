@@ -1,16 +1,24 @@
 #src/client.client.py
 
 import os
-import ssl
 import socket
-import json
+import itertools
 import threading
 import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from ..utils.crypto import encrypt_message, decrypt_message
+from ..utils.crypto import (
+    encrypt_message, decrypt_message, client_ssl_context, offered_envelopes, FERNET_ENVELOPE
+)
+from ..utils.framing import FrameDecoder, send_frame
+from ..utils.codec import encode_message, decode_message, OFFERED_CODECS, JSON
+from .futures import TaskFuture, TaskFailedError, as_completed, wait_all
 
 load_dotenv()
 
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv('CLIENT_REQUEST_TIMEOUT', 30.0))
+
 class TaskClient:
     def __init__(self):
         self.host = os.getenv('SERVER_HOST', 'localhost')
@@ -18,70 +26,172 @@ class TaskClient:
         self.auth_token = None
         self.connected = False
         self.task_callbacks = {}
+        self.chunk_callbacks = {}  # task_id -> on_chunk for tasks that stream their result
+        self.task_futures = {}  # task_id -> TaskFuture still waiting for its result
+        # Pushes that arrive before the reply to the submit that asked for
+        # them, held until request_timeout after the first one (a submit
+        # that takes longer was abandoned, so nothing will claim them)
+        self.unclaimed = {}  # task_id -> (first held at, latest task_update)
+        self.unclaimed_chunks = {}  # task_id -> (first held at, task_chunk messages)
+        self.unclaimed_pruned_at = time.monotonic()
+        self.futures_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.codec = JSON  # Switched to the server's choice after login
+        self.envelope = FERNET_ENVELOPE
+        self.request_timeout = DEFAULT_REQUEST_TIMEOUT
+        self.pending = {}  # request_id -> Future for the reply
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
         
-        # Setup SSL context
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
+        # Setup SSL context; TLS_CA_FILE turns on server verification
+        self.ssl_context, self.tls_verified = client_ssl_context()
         
     def connect(self):
         """Connect to the task server"""
         try:
             # Create socket and wrap with SSL
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.ssl_socket = self.ssl_context.wrap_socket(self.socket)
             self.ssl_socket.connect((self.host, self.port))
             
-            # Start listener thread
+            # The listener runs only while connected, so set that first
+            self.connected = True
             self.listener_thread = threading.Thread(target=self._listen)
             self.listener_thread.daemon = True
             self.listener_thread.start()
-            
-            self.connected = True
             return True
             
         except Exception as e:
             print(f"Connection failed: {e}")
             return False
             
-    def login(self, username, password):
+    def login(self, username, password, timeout=None):
         """Authenticate with the server"""
         auth_data = {
             'type': 'auth',
             'username': username,
-            'password': password
+            'password': password,
+            'codecs': list(OFFERED_CODECS),
+            'envelopes': offered_envelopes(self.tls_verified)
         }
         
-        self.send_message(auth_data)
-        response = self._wait_for_response('auth')
+        response = self.request(auth_data, timeout)
         
         if response and response.get('status') == 'success':
+            self.codec = response.get('codec', JSON)
+            self.envelope = response.get('envelope', FERNET_ENVELOPE)
             self.auth_token = response.get('token')
             return True
         return False
         
-    def submit_task(self, task_data, callback=None):
-        """Submit a task to the server"""
+    def submit_task(self, task_data, callback=None, timeout=None, on_chunk=None):
+        """Submit a task to the server and return a TaskFuture for its result.
+        
+        The server pushes the task's updates to this connection: callback,
+        if given, is called with each one, and the future completes when
+        the task does. A task that streams its result (e.g. a read with
+        ``stream``) sends task_chunk messages, each with an ``offset`` and
+        ``data``, to on_chunk in order before the future completes. If the
+        task is run again, e.g. because its worker was lost, its stream
+        starts over: the first chunk of the new run has ``restart`` set,
+        and the chunks received before it should be discarded.
+        Returns None if the submission failed.
+        """
         if not self.auth_token:
             raise Exception("Not authenticated")
             
         message = {
             'type': 'task_submit',
             'token': self.auth_token,
-            'data': task_data
+            'data': task_data,
+            'watch': True
+        }
+        
+        response = self.request(message, timeout)
+        
+        if response and response.get('status') == 'success':
+            return self._track(response.get('task_id'), callback, response.get('task'), on_chunk)
+        return None
+        
+    def watch(self, task_ids, timeout=None):
+        """Return {task_id: TaskFuture} for tasks submitted earlier, e.g. with submit_many.
+        
+        Unknown task ids map to None.
+        """
+        if not self.auth_token:
+            raise Exception("Not authenticated")
+            
+        message = {
+            'type': 'watch_tasks',
+            'token': self.auth_token,
+            'task_ids': list(task_ids)
+        }
+        
+        response = self.request(message, timeout)
+        
+        if not response or response.get('status') != 'success':
+            return None
+        return {
+            task_id: self._track(task_id, None, state) if state else None
+            for task_id, state in response['tasks'].items()
+        }
+        
+    def submit_many(self, tasks, batch_size=DEFAULT_BATCH_SIZE, timeout=None):
+        """Submit many independent tasks, batch_size per message.
+        
+        All batches are sent before waiting for the first reply. Returns
+        (task_ids, errors): task_ids is in the order of tasks, with None for
+        each task the server rejected, and errors holds {'index', 'error'}
+        for those.
+        """
+        if not self.auth_token:
+            raise Exception("Not authenticated")
+            
+        futures = []
+        for start in range(0, len(tasks), batch_size):
+            message = {
+                'type': 'task_submit_batch',
+                'token': self.auth_token,
+                'tasks': tasks[start:start + batch_size]
+            }
+            futures.append((start, self.send_request(message)))
+            
+        task_ids = []
+        errors = []
+        for start, future in futures:
+            response = self._result(future, timeout)
+            count = min(batch_size, len(tasks) - start)
+            if not response or response.get('status') != 'success':
+                task_ids.extend([None] * count)
+                errors.append({'index': start, 'error': 'Batch submission failed'})
+                continue
+            task_ids.extend(response['task_ids'])
+            errors.extend(dict(error, index=error['index'] + start) for error in response['errors'])
+        return task_ids, errors
+        
+    def submit_dag(self, tasks, timeout=None):
+        """Submit tasks that depend on each other in one call.
+        
+        Each task has a 'key'; 'depends_on' and {'$ref': key} placeholders in
+        'data' name other keys (or existing task ids). Returns {key: task_id}.
+        """
+        if not self.auth_token:
+            raise Exception("Not authenticated")
+            
+        message = {
+            'type': 'task_submit_dag',
+            'token': self.auth_token,
+            'tasks': tasks
         }
         
-        self.send_message(message)
-        response = self._wait_for_response('task_submit')
+        response = self.request(message, timeout)
         
         if response and response.get('status') == 'success':
-            task_id = response.get('task_id')
-            if callback:
-                self.task_callbacks[task_id] = callback
-            return task_id
+            return response.get('task_ids')
         return None
         
-    def get_task_status(self, task_id):
+    def get_task_status(self, task_id, timeout=None):
         """Get the status of a task"""
         if not self.auth_token:
             raise Exception("Not authenticated")
@@ -92,14 +202,13 @@ class TaskClient:
             'task_id': task_id
         }
         
-        self.send_message(message)
-        response = self._wait_for_response('task_status')
+        response = self.request(message, timeout)
         
         if response and response.get('status') == 'success':
             return response.get('task_status')
         return None
         
-    def cancel_task(self, task_id):
+    def cancel_task(self, task_id, timeout=None):
         """Cancel a running task"""
         if not self.auth_token:
             raise Exception("Not authenticated")
@@ -110,54 +219,164 @@ class TaskClient:
             'task_id': task_id
         }
         
-        self.send_message(message)
-        response = self._wait_for_response('cancel_task')
+        response = self.request(message, timeout)
         
         return response and response.get('status') == 'success'
         
+    def request(self, message, timeout=None):
+        """Send a request and wait for its reply; returns None on timeout"""
+        return self._result(self.send_request(message), timeout)
+        
+    def send_request(self, message):
+        """Send a request without waiting and return a Future for its reply.
+        
+        Each request carries a request_id that the server echoes back, so
+        any number of requests can be in flight on the connection at once.
+        """
+        request_id = next(self.request_ids)
+        future = Future()
+        future.request_id = request_id
+        with self.pending_lock:
+            self.pending[request_id] = future
+        try:
+            self.send_message(dict(message, request_id=request_id))
+        except Exception:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+            raise
+        return future
+        
     def send_message(self, message):
         """Send an encrypted message to the server"""
         if not self.connected:
             raise Exception("Not connected to server")
             
-        encrypted_message = encrypt_message(json.dumps(message))
-        self.ssl_socket.send(encrypted_message)
+        encrypted_message = encrypt_message(encode_message(message, self.codec), self.envelope)
+        with self.send_lock:
+            send_frame(self.ssl_socket, encrypted_message)
         
     def _listen(self):
         """Listen for server messages"""
+        decoder = FrameDecoder()
         while self.connected:
             try:
-                data = self.ssl_socket.recv(4096)
-                if not data:
+                frames = decoder.read_from(self.ssl_socket)
+                if frames is None:
                     self.connected = False
                     break
                     
-                message = json.loads(decrypt_message(data).decode())
-                self._handle_message(message)
+                for data in frames:
+                    message = decode_message(decrypt_message(data, self.envelope))
+                    with self.pending_lock:
+                        future = self.pending.pop(message.get('request_id'), None)
+                    if future is not None:
+                        future.set_result(message)
+                    else:
+                        self._handle_message(message)
                 
             except Exception as e:
+                if not self.connected:
+                    break
                 print(f"Error in listener: {e}")
                 time.sleep(1)
                 
+        # Nothing more will arrive for requests and tasks still waiting
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        with self.futures_lock:
+            pending.update(self.task_futures)
+            self.task_futures = {}
+        for future in pending.values():
+            future.set_exception(ConnectionError("Connection closed"))
+                
     def _handle_message(self, message):
         """Handle incoming messages from the server"""
         message_type = message.get('type')
         
         if message_type == 'task_update':
             task_id = message.get('task_id')
-            if task_id in self.task_callbacks:
-                self.task_callbacks[task_id](message)
+            with self.futures_lock:
+                if task_id not in self.task_futures:
+                    # A push can overtake the reply to the submit that asked for it
+                    now = self._prune_unclaimed()
+                    self.unclaimed[task_id] = (self.unclaimed.get(task_id, (now,))[0], message)
+                    return
+            self._deliver(message)
+                
+        elif message_type == 'task_chunk':
+            task_id = message.get('task_id')
+            with self.futures_lock:
+                if task_id not in self.task_futures:
+                    now = self._prune_unclaimed()
+                    self.unclaimed_chunks.setdefault(task_id, (now, []))[1].append(message)
+                    return
+                on_chunk = self.chunk_callbacks.get(task_id)
+            if on_chunk:
+                on_chunk(message)
                 
         elif message_type == 'error':
             print(f"Server error: {message.get('message')}")
             
-    def _wait_for_response(self, message_type, timeout=5):
-        """Wait for a specific response from the server"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            # Implementation of waiting for specific response
-            time.sleep(0.1)
-        return None
+    def _track(self, task_id, callback=None, state=None, on_chunk=None):
+        """Create the future for a watched task and apply what is already known about it"""
+        future = TaskFuture(task_id)
+        while True:
+            with self.futures_lock:
+                # Chunks that came early go first; the listener buffers more until we register
+                chunks = self.unclaimed_chunks.pop(task_id, (None, ()))[1]
+                if not chunks:
+                    self.task_futures[task_id] = future
+                    if callback:
+                        self.task_callbacks[task_id] = callback
+                    if on_chunk:
+                        self.chunk_callbacks[task_id] = on_chunk
+                    early = self.unclaimed.pop(task_id, (None, None))[1]
+                    break
+            for message in chunks if on_chunk else ():
+                on_chunk(message)
+        for message in (state, early):
+            if message:
+                self._deliver(message)
+        return future
+        
+    def _prune_unclaimed(self):
+        """Drop held pushes no submit will claim any more; returns the time now.
+
+        Caller holds futures_lock. Runs at most once per request_timeout.
+        """
+        now = time.monotonic()
+        if now - self.unclaimed_pruned_at >= self.request_timeout:
+            for held in (self.unclaimed, self.unclaimed_chunks):
+                for stale in [t for t, (since, _) in held.items() if now - since > self.request_timeout]:
+                    del held[stale]
+            self.unclaimed_pruned_at = now
+        return now
+
+    def _deliver(self, message):
+        """Feed a task_update to the task's callback and future"""
+        task_id = message['task_id']
+        with self.futures_lock:
+            future = self.task_futures.get(task_id)
+            callback = self.task_callbacks.get(task_id)
+        if callback:
+            callback(message)
+        if future is not None and future._update(message):
+            with self.futures_lock:
+                self.task_futures.pop(task_id, None)
+                self.task_callbacks.pop(task_id, None)
+                self.chunk_callbacks.pop(task_id, None)
+        
+    def _result(self, future, timeout=None):
+        """Wait for a request's reply; None if it times out or the connection drops"""
+        try:
+            return future.result(self.request_timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # A late reply is dropped by the listener
+            with self.pending_lock:
+                self.pending.pop(future.request_id, None)
+            return None
+        except ConnectionError:
+            return None
         
     def close(self):
         """Close the connection"""
@@ -189,17 +408,15 @@ def main():
         }
     }
     
-    task_id = client.submit_task(task_data, task_callback)
-    if task_id:
-        print(f"Task submitted with ID: {task_id}")
+    future = client.submit_task(task_data, task_callback)
+    if future:
+        print(f"Task submitted with ID: {future.task_id}")
         
-        # Wait for result
-        while True:
-            status = client.get_task_status(task_id)
-            if status['status'] in ['completed', 'failed']:
-                print(f"Task finished with status: {status}")
-                break
-            time.sleep(1)
+        # The server pushes the result; nothing polls for it
+        try:
+            print(f"Task finished with result: {future.result()}")
+        except TaskFailedError as e:
+            print(e)
     
     client.close()
 
@@ -0,0 +1,47 @@
+# src/client/futures.py
+
+from concurrent import futures
+
+class TaskFailedError(Exception):
+    """Raised by TaskFuture.result() when the task failed on the server"""
+
+    def __init__(self, task_id, error):
+        super().__init__(f"Task {task_id} failed: {error}")
+        self.task_id = task_id
+        self.error = error
+
+class TaskFuture(futures.Future):
+    """The eventual result of a submitted task.
+
+    Completed by task_update messages the server pushes to the connection
+    that submitted the task, so waiting on it never polls. ``status`` and
+    ``progress`` follow the latest update.
+    """
+
+    def __init__(self, task_id):
+        super().__init__()
+        self.task_id = task_id
+        self.status = 'pending'
+        self.progress = 0
+
+    def _update(self, message):
+        """Apply a task_update message; returns True once the task has finished"""
+        self.status = message.get('status', self.status)
+        self.progress = message.get('progress', self.progress)
+        if self.done():
+            return True
+        if self.status == 'completed':
+            self.set_result(message.get('result'))
+        elif self.status == 'failed':
+            self.set_exception(TaskFailedError(self.task_id, message.get('error')))
+        else:
+            return False
+        return True
+
+def as_completed(task_futures, timeout=None):
+    """Yield task futures as their tasks finish"""
+    return futures.as_completed(task_futures, timeout)
+
+def wait_all(task_futures, timeout=None):
+    """Wait until every task finishes or timeout passes; returns (done, not_done) sets"""
+    return futures.wait(task_futures, timeout, return_when=futures.ALL_COMPLETED)
@@ -1,10 +1,31 @@
+# src/server/auth.py
 import os
-import jwt
-import datetime
+import hashlib
+import math
+import uuid
+import threading
+import time
+from collections import OrderedDict, deque
 from ..utils.crypto import generate_token, verify_token
 
+TOKEN_LIFETIME = 24 * 3600.0
+DEFAULT_TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10_000))
+DEFAULT_TOKEN_SWEEP_TICK = 60.0
+
 class AuthManager:
-    def __init__(self):
+    """Users and the JWT session tokens issued to them.
+
+    Issued tokens are tracked by a digest of the token rather than the token
+    itself. Every token lives for TOKEN_LIFETIME, so they expire in the order
+    they were issued: digests are queued in one batch per sweep tick, and a
+    background sweeper drops each batch once it is due, so tokens nobody
+    presents again no longer pile up. Verified payloads are kept in a
+    bounded LRU keyed by the same digest, so repeat checks of a live token
+    skip the HMAC and JSON decoding of ``jwt.decode``. Logging out or
+    expiring evicts the cached payload too.
+    """
+
+    def __init__(self, cache_size=DEFAULT_TOKEN_CACHE_SIZE, sweep_tick=DEFAULT_TOKEN_SWEEP_TICK):
         self.secret_key = os.getenv('SECRET_KEY', 'your-secret-key')
         # In a real application, these would be stored in a database
         self.users = {
@@ -17,7 +38,20 @@ class AuthManager:
                 'role': 'worker'
             }
         }
-        self.active_tokens = set()
+        self.active_tokens = {}  # token digest -> expiry deadline
+        self.expiry = deque()  # [deadline, digests] batches in issue order
+        self.sweep_tick = sweep_tick
+        self.verified = OrderedDict()  # token digest -> payload, least recently used first
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+
+        self.stopped = threading.Event()
+        self.sweeper = threading.Thread(
+            target=self._sweep_loop,
+            name='token-sweeper',
+            daemon=True
+        )
+        self.sweeper.start()
 
     def authenticate(self, username, password):
         """Authenticate a user with username and password"""
@@ -33,33 +67,70 @@ class AuthManager:
         payload = {
             'username': username,
             'role': self.users[username]['role'],
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
+            'exp': int(time.time() + TOKEN_LIFETIME),
+            'jti': uuid.uuid4().hex  # logins in the same second still get distinct tokens
         }
         
         token = generate_token(payload)
-        self.active_tokens.add(token)
+        key = _digest(token)
+        deadline = math.ceil(payload['exp'] / self.sweep_tick) * self.sweep_tick
+        with self.lock:
+            if not self.expiry or self.expiry[-1][0] != deadline:
+                self.expiry.append([deadline, []])
+            self.expiry[-1][1].append(key)
+            self.active_tokens[key] = self.expiry[-1][0]
+        self._remember(key, payload)
         return token
 
     def verify_auth_token(self, token):
         """Verify a JWT token"""
-        if token not in self.active_tokens:
+        if not token:
             return None
-            
-        try:
+        key = _digest(token)
+        with self.lock:
+            payload = self.verified.get(key)
+            if payload is not None:
+                self.verified.move_to_end(key)
+
+        if payload is None:
+            if key not in self.active_tokens:
+                return None
             payload = verify_token(token)
-            if payload and payload['username'] in self.users:
-                return payload
-        except jwt.ExpiredSignatureError:
-            self.active_tokens.remove(token)
-            
-        return None
+            if payload is None:
+                # Expired (or signed with an old secret): drop it now, not at the next sweep
+                self.invalidate_token(token)
+                return None
+            self._remember(key, payload)
+
+        if payload['exp'] <= time.time():
+            self.invalidate_token(token)
+            return None
+        if payload['username'] not in self.users:
+            return None
+        return payload
 
     def invalidate_token(self, token):
         """Invalidate a token (logout)"""
-        if token in self.active_tokens:
-            self.active_tokens.remove(token)
-            return True
-        return False
+        key = _digest(token)
+        with self.lock:
+            self.verified.pop(key, None)
+            # The digest stays in its expiry batch until that is swept
+            return self.active_tokens.pop(key, None) is not None
+
+    def purge_expired(self, now=None):
+        """Forget tokens whose expiry has passed; returns how many were dropped"""
+        now = time.time() if now is None else now
+        expired = 0
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now:
+                for key in self.expiry.popleft()[1]:
+                    if self.active_tokens.pop(key, None) is not None:
+                        expired += 1
+                    self.verified.pop(key, None)
+        return expired
+
+    def stop(self):
+        self.stopped.set()
 
     def check_permission(self, token, required_role):
         """Check if the user has the required role"""
@@ -92,4 +163,23 @@ class AuthManager:
         if self.authenticate(username, old_password):
             self.users[username]['password'] = new_password
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def _remember(self, key, payload):
+        with self.lock:
+            if key not in self.active_tokens:
+                return  # Logged out while it was being verified
+            self.verified[key] = payload
+            self.verified.move_to_end(key)
+            if len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+
+    def _sweep_loop(self):
+        while not self.stopped.wait(self.sweep_tick):
+            self.purge_expired()
+
+def _digest(token):
+    """Fixed-size key for a token, so issued tokens are not kept around in full"""
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.blake2b(token, digest_size=16).digest()
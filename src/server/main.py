@@ -4,23 +4,100 @@ import os
 import ssl
 import socket
 import threading
-import json
+import asyncio
+import functools
+import concurrent.futures
 from flask import Flask
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
-from ..utils.crypto import encrypt_message, decrypt_message
-from .task_manager import TaskManager
+from ..utils.crypto import encrypt_message, decrypt_message, negotiate_envelope, FERNET_ENVELOPE
+from ..utils.codec import encode_message, decode_message, negotiate_codec
+from ..utils.framing import (
+    FrameDecoder, encode_frame, send_frame, iter_frames,
+    DEFAULT_MAX_FRAME_SIZE, RECV_BUFFER_SIZE
+)
+from .task_manager import (
+    TaskManager, DEFAULT_LEASE_TIME, DEFAULT_HEARTBEAT_TIMEOUT, DEFAULT_HEARTBEAT_TICK
+)
+from .task_store import create_task_store
+from .result_cache import create_result_cache
 from .auth import AuthManager
 
 load_dotenv()
 
+SERVER_MODES = ('threaded', 'asyncio')
+SSL_HANDSHAKE_TIMEOUT = 10.0
+# How long a push may wait for a peer that is not reading before it is dropped
+SEND_TIMEOUT = float(os.getenv('SERVER_SEND_TIMEOUT', 10))
+
+class ThreadedConnection:
+    """Send side of a blocking connection, shared by its handler and task dispatch"""
+
+    def __init__(self, sock, codec, username=None, envelope=FERNET_ENVELOPE):
+        self.sock = sock
+        self.codec = codec
+        self.username = username
+        self.envelope = envelope
+        self.worker_info = None
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        self.write(encrypt_message(encode_message(message, self.codec), self.envelope))
+
+    def write(self, payload):
+        with self.lock:
+            send_frame(self.sock, payload)
+
+class AsyncConnection:
+    """Send side of an asyncio connection; send() may be called from any thread"""
+
+    def __init__(self, loop, writer, codec, username=None, envelope=FERNET_ENVELOPE):
+        self.loop = loop
+        self.writer = writer
+        self.codec = codec
+        self.username = username
+        self.envelope = envelope
+        self.worker_info = None
+
+    def send(self, message):
+        if self.writer.is_closing():
+            raise ConnectionError("Connection is closed")
+        frame = encode_frame(encrypt_message(encode_message(message, self.codec), self.envelope))
+        if _running_loop() is self.loop:
+            self.writer.write(frame)  # can't wait here; the handler drains after its reply
+            return
+        # Wait until the frame is drained, like a blocking socket would, so a
+        # slow reader holds up whoever pushes to it instead of growing the
+        # buffer; one that stops reading is dropped instead of holding the
+        # sender (often an executor thread serving someone else) forever
+        future = asyncio.run_coroutine_threadsafe(self._write(frame), self.loop)
+        try:
+            future.result(SEND_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+            raise ConnectionError(f"Peer read nothing for {SEND_TIMEOUT}s, dropped it")
+
+    async def _write(self, frame):
+        self.writer.write(frame)
+        await self.writer.drain()
+
 class DistributedServer:
     def __init__(self):
         self.host = os.getenv('SERVER_HOST', 'localhost')
         self.port = int(os.getenv('SERVER_PORT', 5000))
-        self.task_manager = TaskManager()
+        self.mode = os.getenv('SERVER_MODE', 'threaded')
+        self.max_frame_size = DEFAULT_MAX_FRAME_SIZE
+        if self.mode not in SERVER_MODES:
+            raise ValueError(f"Unsupported SERVER_MODE: {self.mode}")
+        self.task_manager = TaskManager(
+            dispatch_threads=0,  # Workers pull from the ready queue
+            store=create_task_store(),
+            heartbeat_timeout=float(os.getenv('HEARTBEAT_TIMEOUT', DEFAULT_HEARTBEAT_TIMEOUT)),
+            heartbeat_tick=float(os.getenv('HEARTBEAT_TICK', DEFAULT_HEARTBEAT_TICK)),
+            result_cache=create_result_cache()
+        )
         self.auth_manager = AuthManager()
-        self.workers = []
         self.clients = []
         self.running = True
 
@@ -40,7 +117,9 @@ class DistributedServer:
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.loop = None
+        self.async_server = None
 
     def setup_routes(self):
         @self.socketio.on('connect')
@@ -70,80 +149,292 @@ class DistributedServer:
         )
         flask_thread.start()
 
-        # Start accepting connections
-        print(f"Server listening on {self.host}:{self.port}")
+        self.serve()
+
+    def serve(self):
+        """Accept worker and client connections until stopped"""
+        print(f"Server listening on {self.host}:{self.port} ({self.mode} mode)")
+        if self.mode == 'asyncio':
+            asyncio.run(self._serve_async())
+        else:
+            self._serve_threaded()
+
+    def _serve_threaded(self):
         while self.running:
             try:
                 client_socket, address = self.server_socket.accept()
-                ssl_socket = self.ssl_context.wrap_socket(
-                    client_socket,
-                    server_side=True
-                )
                 print(f"New connection from {address}")
 
+                # The TLS handshake runs on the connection's own thread so a
+                # slow client cannot stall the accept loop
                 client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(ssl_socket, address)
+                    target=self.handle_connection,
+                    args=(client_socket, address)
                 )
                 client_thread.start()
 
             except Exception as e:
-                print(f"Error accepting connection: {e}")
+                if self.running:
+                    print(f"Error accepting connection: {e}")
+
+    def handle_connection(self, client_socket, address):
+        try:
+            # Replies and pushed assignments are small back-to-back writes;
+            # don't let Nagle hold the second one for the peer's delayed ACK
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_socket.settimeout(SSL_HANDSHAKE_TIMEOUT)
+            ssl_socket = self.ssl_context.wrap_socket(
+                client_socket,
+                server_side=True
+            )
+            ssl_socket.settimeout(None)
+        except Exception as e:
+            print(f"TLS handshake with {address} failed: {e}")
+            client_socket.close()
+            return
+
+        self.handle_client(ssl_socket, address)
 
     def handle_client(self, client_socket, address):
+        frames = iter_frames(client_socket, self.max_frame_size)
+        connection = None
         try:
             # Perform authentication
-            auth_data = json.loads(decrypt_message(
-                client_socket.recv(1024)
-            ).decode())
-            
-            if not self.auth_manager.authenticate(
-                auth_data.get('username'),
-                auth_data.get('password')
-            ):
-                client_socket.send(
-                    encrypt_message(
-                        json.dumps({'status': 'error', 'message': 'Authentication failed'})
-                    )
-                )
-                client_socket.close()
+            response, session = self.authenticate_client(next(frames))
+            send_frame(client_socket, response)
+            if not session:
                 return
+            connection = ThreadedConnection(client_socket, **session)
 
             # Handle client messages
-            while self.running:
-                try:
-                    data = decrypt_message(client_socket.recv(1024))
-                    if not data:
-                        break
-
-                    message = json.loads(data.decode())
-                    response = self.process_message(message)
-                    
-                    client_socket.send(encrypt_message(
-                        json.dumps(response)
-                    ))
-
-                except Exception as e:
-                    print(f"Error handling client {address}: {e}")
+            for data in frames:
+                if not self.running:
                     break
+                connection.write(self.handle_data(data, connection))
+
+        except StopIteration:
+            pass
+
+        except Exception as e:
+            print(f"Error handling client {address}: {e}")
 
         finally:
+            self.disconnect(connection)
             client_socket.close()
 
-    def process_message(self, message):
+    async def _serve_async(self):
+        self.loop = asyncio.get_running_loop()
+        self.async_server = await asyncio.start_server(
+            self.handle_client_async,
+            sock=self.server_socket,
+            ssl=self.ssl_context,
+            ssl_handshake_timeout=SSL_HANDSHAKE_TIMEOUT
+        )
+        try:
+            async with self.async_server:
+                await self.async_server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    async def handle_client_async(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        print(f"New connection from {address}")
+        decoder = FrameDecoder(self.max_frame_size)
+        connection = None
+
+        async def frames():
+            while True:
+                data = await reader.read(RECV_BUFFER_SIZE)
+                if not data:
+                    return
+                for frame in decoder.feed(data):
+                    yield frame
+
+        # Authentication and TaskManager calls block (password hashing,
+        # lock waits, fsync with TASK_STORE_FSYNC=always), so they run on the
+        # default executor and the loop keeps serving other connections
+        run = functools.partial(self.loop.run_in_executor, None)
         try:
+            messages = frames()
+
+            # Perform authentication
+            response, session = await run(self.authenticate_client, await messages.__anext__())
+            writer.write(encode_frame(response))
+            await writer.drain()
+            if not session:
+                return
+            connection = AsyncConnection(self.loop, writer, **session)
+
+            # Handle client messages
+            async for data in messages:
+                if not self.running:
+                    break
+                writer.write(encode_frame(await run(self.handle_data, data, connection)))
+                await writer.drain()
+
+        except StopAsyncIteration:
+            pass
+
+        except Exception as e:
+            print(f"Error handling client {address}: {e}")
+
+        finally:
+            # Re-queueing a lost worker's tasks dispatches them to others
+            await run(self.disconnect, connection)
+            writer.close()
+
+    def authenticate_client(self, data):
+        """Check a connection's first message.
+
+        Returns the encrypted reply and the connection's session settings
+        (codec, envelope and user name negotiated for the rest of the
+        connection), or None as the session if authentication failed. The
+        exchange itself is always Fernet-wrapped JSON, since both sides
+        can read that before anything has been negotiated.
+        """
+        auth_data = decode_message(decrypt_message(data))
+        username = auth_data.get('username')
+
+        if not self.auth_manager.authenticate(username, auth_data.get('password')):
+            return encrypt_message(encode_message(_reply(
+                auth_data, {'status': 'error', 'message': 'Authentication failed'}
+            ))), None
+
+        session = {
+            'codec': negotiate_codec(auth_data.get('codecs')),
+            'envelope': negotiate_envelope(auth_data.get('envelopes')),
+            'username': username
+        }
+        return encrypt_message(encode_message(_reply(auth_data, {
+            'type': 'auth',
+            'status': 'success',
+            'token': self.auth_manager.generate_auth_token(username),
+            'codec': session['codec'],
+            'envelope': session['envelope']
+        }))), session
+
+    def handle_data(self, data, connection):
+        """Decrypt one message, process it and return the encrypted response"""
+        message = decode_message(decrypt_message(data, connection.envelope))
+        response = _reply(message, self.process_message(message, connection))
+        return encrypt_message(encode_message(response, connection.codec), connection.envelope)
+
+    def disconnect(self, connection):
+        """Forget a closed connection's watches and worker, re-queueing the worker's tasks"""
+        if connection is None:
+            return
+        self.task_manager.unwatch_tasks(connection.send)
+        if connection.worker_info:
+            worker_id = connection.worker_info['id']
+            self.task_manager.unregister_worker(worker_id)
+            print(f"Worker {worker_id} disconnected")
+
+    def touch(self, connection):
+        """Treat traffic from a worker connection as a heartbeat"""
+        worker_info = connection.worker_info if connection else None
+        if worker_info and not self.task_manager.touch_worker(worker_info['id']):
+            # Declared dead after a stall, but it is still talking to us
+            print(f"Worker {worker_info['id']} is back, registering it again")
+            self.task_manager.register_worker(worker_info, connection.send)
+
+    def process_message(self, message, connection=None):
+        try:
+            if message['type'] != 'register_worker':
+                self.touch(connection)
+
             if message['type'] == 'task_submit':
-                task_id = self.task_manager.submit_task(message['data'])
-                return {'status': 'success', 'task_id': task_id}
+                task_id = self.task_manager.submit_task(
+                    message['data'], owner=connection.username if connection else None
+                )
+                response = {'status': 'success', 'task_id': task_id}
+                if message.get('watch') and connection:
+                    # Push the task's updates back to the submitter
+                    response['task'] = self.task_manager.watch_tasks(
+                        [task_id], connection.send
+                    )[task_id]
+                return response
+
+            elif message['type'] == 'task_submit_batch':
+                task_ids, errors = self.task_manager.submit_tasks(
+                    message['tasks'], owner=connection.username if connection else None
+                )
+                return {'status': 'success', 'task_ids': task_ids, 'errors': errors}
+
+            elif message['type'] == 'task_submit_dag':
+                task_ids = self.task_manager.submit_dag(
+                    message['tasks'], owner=connection.username if connection else None
+                )
+                return {'status': 'success', 'task_ids': task_ids}
+
+            elif message['type'] == 'watch_tasks':
+                tasks = self.task_manager.watch_tasks(message['task_ids'], connection.send)
+                return {'status': 'success', 'tasks': tasks}
 
             elif message['type'] == 'task_status':
                 status = self.task_manager.get_task_status(message['task_id'])
                 return {'status': 'success', 'task_status': status}
 
+            elif message['type'] == 'cache_stats':
+                return {'status': 'success', 'cache_stats': self.task_manager.get_cache_stats()}
+
             elif message['type'] == 'register_worker':
-                self.workers.append(message['worker_info'])
+                worker_info = message['worker_info']
+                send = connection.send if connection else None
+                if connection:
+                    connection.worker_info = worker_info
+                self.task_manager.register_worker(worker_info, send)
                 return {'status': 'success', 'message': 'Worker registered'}
 
+            elif message['type'] == 'heartbeat':
+                if 'free_slots' in message and message.get('worker_id'):
+                    self.task_manager.report_load(message['worker_id'], message['free_slots'])
+                return {'type': 'heartbeat', 'status': 'success'}
+
+            elif message['type'] == 'request_task':
+                task = self.task_manager.request_task(message['worker_id'])
+                if task is None:
+                    return {'type': 'no_task', 'status': 'success'}
+                return {'type': 'task_assignment', 'status': 'success', 'task': task}
+
+            elif message['type'] == 'lease_tasks':
+                tasks = self.task_manager.lease_tasks(
+                    message['worker_id'],
+                    int(message.get('count', 1)),
+                    float(message.get('lease_time', DEFAULT_LEASE_TIME))
+                )
+                return {'type': 'task_lease', 'status': 'success', 'tasks': tasks}
+
+            elif message['type'] == 'renew_leases':
+                renewed = self.task_manager.renew_leases(
+                    message['worker_id'],
+                    message['task_ids'],
+                    float(message.get('lease_time', DEFAULT_LEASE_TIME))
+                )
+                return {'type': 'lease_renewal', 'status': 'success', 'renewed': renewed}
+
+            elif message['type'] == 'ack_tasks':
+                accepted = self.task_manager.ack_tasks(message['worker_id'], message['results'])
+                return {'type': 'ack', 'status': 'success', 'accepted': accepted}
+
+            elif message['type'] == 'status_update':
+                if message.get('progress') is not None:
+                    self.task_manager.update_progress(message['task_id'], message['progress'])
+                return {'status': 'success'}
+
+            elif message['type'] == 'task_chunk':
+                forwarded = self.task_manager.push_chunk(
+                    message['task_id'], message.get('offset'), message['data'], message.get('worker_id')
+                )
+                return {'status': 'success', 'forwarded': forwarded}
+
+            elif message['type'] == 'task_complete':
+                self.task_manager.complete_task(message['task_id'], message.get('result'))
+                return {'status': 'success'}
+
+            elif message['type'] == 'task_failed':
+                self.task_manager.fail_task(message['task_id'], message.get('error'))
+                return {'status': 'success'}
+
             return {'status': 'error', 'message': 'Unknown message type'}
 
         except Exception as e:
@@ -151,7 +442,25 @@ class DistributedServer:
 
     def stop(self):
         self.running = False
-        self.server_socket.close()
+        self.task_manager.stop()
+        self.auth_manager.stop()
+        if self.loop and self.async_server:
+            # The event loop owns the listening socket in asyncio mode
+            self.loop.call_soon_threadsafe(self.async_server.close)
+        else:
+            self.server_socket.close()
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def _reply(message, response):
+    """Tag a response with the request_id of the message it answers, if any"""
+    if isinstance(message, dict) and 'request_id' in message:
+        response['request_id'] = message['request_id']
+    return response
 
 if __name__ == "__main__":
     server = DistributedServer()
@@ -0,0 +1,236 @@
+# src/server/result_cache.py
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from ..utils.codec import encode_message, decode_message, BINARY
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_TTL = 3600.0
+DEFAULT_TASK_TYPES = ('computation', 'data_processing')
+
+_EXPIRY = struct.Struct('!d')
+_NO_EXPIRY = float('inf')
+
+def create_result_cache():
+    """Build the result cache configured by RESULT_CACHE_* variables, or None when it is off"""
+    if os.getenv('RESULT_CACHE', 'off') == 'off':
+        return None
+    ttl = float(os.getenv('RESULT_CACHE_TTL', DEFAULT_TTL))
+    task_types = os.getenv('RESULT_CACHE_TYPES', ','.join(DEFAULT_TASK_TYPES))
+    return ResultCache(
+        max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        ttl=ttl or None,
+        spill_path=os.getenv('RESULT_CACHE_SPILL_PATH') or None,
+        max_disk_bytes=int(os.getenv('RESULT_CACHE_MAX_DISK_BYTES', DEFAULT_MAX_DISK_BYTES)),
+        task_types=[name.strip() for name in task_types.split(',') if name.strip()]
+    )
+
+def cache_key(task_type, data):
+    """Stable content hash of a task's type and data, or None if data can't be hashed.
+
+    Dict keys are hashed in sorted order, so the same inputs give the same key
+    whatever order the client built them in; arrays are hashed from their raw
+    buffer.
+    """
+    try:
+        text, arrays = _canonical([task_type, data])
+    except (TypeError, ValueError):
+        return None
+    digest = hashlib.sha256(text)
+    for array in arrays:
+        digest.update(array.dtype.str.encode() + repr(array.shape).encode())
+        digest.update(memoryview(array.reshape(-1).view(np.uint8)))
+    return digest.hexdigest()
+
+def references_files(data):
+    """True if task data names files on a worker: {'path': ...} inputs or an output to write.
+
+    Such a task's result depends on file contents the server cannot see,
+    and running it may be the point (writing the output), so it is never
+    served from the cache.
+    """
+    if isinstance(data, dict):
+        if 'path' in data or 'output' in data or 'filename' in data:
+            return True
+        return any(references_files(value) for value in data.values())
+    if isinstance(data, list):
+        return any(references_files(value) for value in data)
+    return False
+
+class ResultCache:
+    """Memory-bounded LRU of task results keyed by cache_key().
+
+    Results are kept as objects, so a hit costs no decoding; callers must
+    not mutate them. Their size is estimated from their canonical JSON form
+    with arrays counted by buffer size. Evicted entries are written to
+    ``spill_path`` with the binary codec and promoted back into memory on a
+    disk hit. Entries older than ``ttl`` seconds are treated as missing.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, spill_path=None,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, task_types=DEFAULT_TASK_TYPES,
+                 clock=time.time):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_path = spill_path
+        self.max_disk_bytes = max_disk_bytes
+        self.task_types = frozenset(task_types)
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (result, size, expires_at), oldest first
+        self._bytes = 0
+        self._disk = OrderedDict()  # key -> file size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ('hits', 'misses', 'disk_hits', 'evictions', 'spills', 'expirations'), 0
+        )
+        if spill_path:
+            os.makedirs(spill_path, exist_ok=True)
+            self._index_spilled()
+
+    def caches(self, task_type):
+        return task_type in self.task_types
+
+    def get(self, key):
+        """Return (True, result) on a hit and (False, None) on a miss"""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= now:
+                self._drop(key)
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            else:
+                entry = self._read_spilled(key, now)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            self._stats['hits'] += 1
+            return True, entry[0]
+
+    def put(self, key, result):
+        try:
+            text, arrays = _canonical(result)
+        except (TypeError, ValueError):
+            return False
+        size = len(text) + sum(array.nbytes for array in arrays)
+        expires_at = self.clock() + self.ttl if self.ttl else _NO_EXPIRY
+        with self._lock:
+            self._insert(key, result, size, expires_at)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_bytes
+            )
+
+    def _insert(self, key, result, size, expires_at):
+        # Caller holds self._lock
+        if key in self._entries:
+            self._drop(key)
+        if size > self.max_bytes:
+            self._spill(key, result, expires_at)
+            return
+        self._entries[key] = (result, size, expires_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, (old_result, old_size, old_expiry) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self._stats['evictions'] += 1
+            self._spill(old_key, old_result, old_expiry)
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _spill(self, key, result, expires_at):
+        if not self.spill_path or expires_at <= self.clock():
+            return
+        payload = encode_message(result, BINARY)
+        size = _EXPIRY.size + len(payload)
+        if size > self.max_disk_bytes:
+            return
+        with open(self._spill_file(key), 'wb') as f:
+            f.write(_EXPIRY.pack(expires_at))
+            f.write(payload)
+        if key in self._disk:
+            self._disk_bytes -= self._disk.pop(key)
+        self._disk[key] = size
+        self._disk_bytes += size
+        self._stats['spills'] += 1
+        while self._disk_bytes > self.max_disk_bytes:
+            self._remove_spilled(next(iter(self._disk)))
+
+    def _read_spilled(self, key, now):
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._spill_file(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+        self._remove_spilled(key)
+
+        (expires_at,) = _EXPIRY.unpack_from(data)
+        if expires_at <= now:
+            self._stats['expirations'] += 1
+            return None
+        result = decode_message(data[_EXPIRY.size:])
+        self._stats['disk_hits'] += 1
+        self._insert(key, result, len(data) - _EXPIRY.size, expires_at)
+        return result, None, expires_at
+
+    def _remove_spilled(self, key):
+        self._disk_bytes -= self._disk.pop(key)
+        try:
+            os.remove(self._spill_file(key))
+        except OSError:
+            pass
+
+    def _index_spilled(self):
+        """Pick up results spilled by an earlier run, oldest first"""
+        files = []
+        for name in os.listdir(self.spill_path):
+            if name.endswith('.bin'):
+                path = os.path.join(self.spill_path, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _spill_file(self, key):
+        return os.path.join(self.spill_path, f'{key}.bin')
+
+def _canonical(value):
+    """Sorted-key JSON text of a value, with arrays replaced by placeholders and returned separately"""
+    arrays = []
+
+    def default(item):
+        if isinstance(item, np.ndarray) and not item.dtype.hasobject:
+            arrays.append(np.ascontiguousarray(item))
+            return {'$ndarray': len(arrays) - 1}
+        if isinstance(item, np.generic):
+            return item.item()
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            return {'$bytes': bytes(item).hex()}
+        raise TypeError(f"Cannot hash value of type {type(item).__name__}")
+
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), default=default)
+    return text.encode(), arrays
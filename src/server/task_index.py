@@ -0,0 +1,207 @@
+# src/server/task_index.py
+
+from bisect import bisect_left, insort
+
+INDEXED_FIELDS = ('status', 'priority', 'type', 'owner', 'worker')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+class TaskIndex:
+    """Secondary indexes over the task table for filtered, paginated queries.
+
+    Every task gets a sequence number in submit order, and each value of an
+    indexed field keeps the sorted sequence numbers of the tasks that
+    currently have it. A query walks the smallest matching posting list
+    newest first and checks any other filters per task, so listing a page
+    touches about ``limit`` entries rather than the whole table. Counting
+    a single filter is O(1). The cursor is the sequence number of the last
+    task returned.
+
+    Not thread-safe: TaskManager calls it with its lock held.
+    """
+
+    def __init__(self, tasks=None):
+        self._tasks = {} if tasks is None else tasks  # the task table being indexed
+        self._seq = {}  # task_id -> sequence number
+        self._ids = []  # sequence number -> task_id
+        self._all = _SortedSeqs()
+        self._postings = {}  # (field, value) -> _SortedSeqs
+
+    def add(self, task_id, task):
+        seq = len(self._ids)
+        self._seq[task_id] = seq
+        self._ids.append(task_id)
+        self._all.add(seq)
+        for field in INDEXED_FIELDS:
+            value = task.get(field)
+            if value is not None:
+                self._posting(field, value).add(seq)
+
+    def update(self, task_id, fields):
+        """Move a task between posting lists; call before fields are applied to the task"""
+        seq = self._seq.get(task_id)
+        if seq is None:
+            return
+        task = self._tasks[task_id]
+        for field in INDEXED_FIELDS:
+            if field not in fields:
+                continue
+            old, new = task.get(field), fields[field]
+            if old == new:
+                continue
+            if old is not None:
+                self._unpost(field, old, seq)
+            if new is not None:
+                self._posting(field, new).add(seq)
+
+    def rebuild(self, tasks):
+        """Index a whole task table, numbering tasks by submit time"""
+        self.__init__(tasks)
+        ordered = sorted(tasks, key=lambda task_id: tasks[task_id].get('submitted_at', 0))
+        postings = {}
+        for seq, task_id in enumerate(ordered):
+            task = tasks[task_id]
+            self._seq[task_id] = seq
+            for field in INDEXED_FIELDS:
+                value = task.get(field)
+                if value is not None:
+                    postings.setdefault((field, value), []).append(seq)
+        self._ids = ordered
+        # Sequence numbers were handed out in order, so every list is already sorted
+        self._all = _SortedSeqs(range(len(ordered)))
+        self._postings = {key: _SortedSeqs(seqs) for key, seqs in postings.items()}
+
+    def query(self, filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Return (task_ids, next_cursor) for one page of matching tasks, newest first"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        bound = _parse_cursor(cursor)
+        task_ids = []
+        for seq in self._matches(filters, bound):
+            if len(task_ids) == limit:
+                return task_ids, str(self._seq[task_ids[-1]])
+            task_ids.append(self._ids[seq])
+        return task_ids, None
+
+    def count(self, filters=None):
+        filters = _clean(filters)
+        if len(filters) <= 1:
+            return len(self._candidates(filters))
+        return sum(1 for _ in self._matches(filters))
+
+    def _matches(self, filters, bound=None):
+        filters = _clean(filters)
+        candidates = self._candidates(filters)
+        for seq in candidates.descending(bound):
+            task = self._tasks[self._ids[seq]]
+            if all(task.get(field) == value for field, value in filters.items()):
+                yield seq
+
+    def _candidates(self, filters):
+        if not filters:
+            return self._all
+        postings = [self._postings.get((field, value)) for field, value in filters.items()]
+        if any(posting is None for posting in postings):
+            return _EMPTY
+        return min(postings, key=len)
+
+    def _posting(self, field, value):
+        posting = self._postings.get((field, value))
+        if posting is None:
+            posting = self._postings[(field, value)] = _SortedSeqs()
+        return posting
+
+    def _unpost(self, field, value, seq):
+        posting = self._postings[(field, value)]
+        posting.discard(seq)
+        if not posting:
+            del self._postings[(field, value)]
+
+class _SortedSeqs:
+    """Sorted set of ints kept as a list of short sorted runs.
+
+    Inserting into one big list would shift up to a million pointers per
+    status change; with runs of at most 2 * LOAD items an add or discard
+    only shifts one run. New tasks have the highest sequence number, so
+    the common add is an append to the last run.
+    """
+
+    LOAD = 512
+
+    def __init__(self, values=()):
+        """values, if given, must already be sorted"""
+        values = list(values)
+        self._runs = [values[i:i + self.LOAD] for i in range(0, len(values), self.LOAD)]
+        self._maxes = [run[-1] for run in self._runs]
+        self._len = len(values)
+
+    def add(self, value):
+        runs, maxes = self._runs, self._maxes
+        if not runs:
+            runs.append([value])
+            maxes.append(value)
+        else:
+            i = bisect_left(maxes, value)
+            if i == len(maxes):
+                i -= 1
+                runs[i].append(value)
+                maxes[i] = value
+            else:
+                insort(runs[i], value)
+            if len(runs[i]) > 2 * self.LOAD:
+                run = runs[i]
+                runs[i:i + 1] = [run[:self.LOAD], run[self.LOAD:]]
+                maxes[i:i + 1] = [run[self.LOAD - 1], run[-1]]
+        self._len += 1
+
+    def discard(self, value):
+        runs, maxes = self._runs, self._maxes
+        i = bisect_left(maxes, value)
+        if i == len(maxes):
+            return False
+        run = runs[i]
+        j = bisect_left(run, value)
+        if run[j] != value:
+            return False
+        del run[j]
+        self._len -= 1
+        if not run:
+            del runs[i]
+            del maxes[i]
+        elif j == len(run):
+            maxes[i] = run[-1]
+        return True
+
+    def descending(self, bound=None):
+        """Yield values below bound (all values if bound is None), largest first"""
+        runs = self._runs
+        if bound is None:
+            i = len(runs) - 1
+        else:
+            i = min(bisect_left(self._maxes, bound), len(runs) - 1)
+        while i >= 0:
+            run = runs[i]
+            j = len(run) if bound is None else bisect_left(run, bound)
+            bound = None
+            for k in range(j - 1, -1, -1):
+                yield run[k]
+            i -= 1
+
+    def __len__(self):
+        return self._len
+
+_EMPTY = _SortedSeqs()
+
+def _clean(filters):
+    filters = {field: value for field, value in (filters or {}).items() if value is not None}
+    for field in filters:
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Cannot filter tasks by {field}")
+    return filters
+
+def _parse_cursor(cursor):
+    if cursor in (None, ''):
+        return None
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
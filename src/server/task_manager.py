@@ -1,49 +1,876 @@
-# Quick fix for src/server/task_manager.py
+# src/server/task_manager.py
+import heapq
 import uuid
 import threading
 import time
+from .task_queue import TaskQueue, DEFAULT_AGING_INTERVAL
+from .task_store import TaskStore, paused_gc
+from .worker_registry import WorkerRegistry
+from .timing_wheel import TimingWheel
+from .result_cache import cache_key, references_files
+from .update_emitter import UpdateEmitter
+from .task_index import TaskIndex, DEFAULT_PAGE_SIZE
+
+DEFAULT_PRIORITY = 2
+DEFAULT_DISPATCH_THREADS = 4
+DEFAULT_LEASE_TIME = 30.0
+LEASE_CHECK_INTERVAL = 1.0
+DEFAULT_HEARTBEAT_TIMEOUT = 30.0
+DEFAULT_HEARTBEAT_TICK = 1.0
 
 class TaskManager:
-    def __init__(self, socketio):
+    def __init__(self, socketio=None, dispatch_threads=DEFAULT_DISPATCH_THREADS,
+                 aging_interval=DEFAULT_AGING_INTERVAL, store=None,
+                 heartbeat_timeout=DEFAULT_HEARTBEAT_TIMEOUT,
+                 heartbeat_tick=DEFAULT_HEARTBEAT_TICK, result_cache=None):
         self.socketio = socketio
+        self.updates = UpdateEmitter(socketio) if socketio else None
         self.tasks = {}
-        
-    def submit_task(self, task_data, priority):
+        self.index = TaskIndex(self.tasks)
+        self.lock = threading.Lock()
+        self.task_ready = threading.Condition(self.lock)
+        self.aging_interval = aging_interval
+        self.queues = {}  # one ready queue per task type
+        self.workers = WorkerRegistry()
+        self.assigned = {}  # worker_id -> ids of the tasks it is running
+        self.children = {}  # task_id -> ids of blocked tasks that depend on it
+        self.waiting = {}  # blocked task_id -> number of unfinished dependencies
+        self.leases = {}  # task_id -> lease deadline
+        self.watchers = {}  # task_id -> send callables of connections following it
+        self.watching = {}  # send callable -> ids of the tasks it follows
+        self.watch_lock = threading.Lock()
+        # task_id -> whether its current run has forwarded chunks; False once
+        # a run that did was re-queued, so the next run's stream is marked
+        self.streams = {}
+        self._lease_heap = []
+        self.heartbeat_timeout = heartbeat_timeout
+        self.liveness = TimingWheel(heartbeat_tick)  # worker_id -> heartbeat deadline
+        self.store = store or TaskStore()
+        self.result_cache = result_cache
+        self.running = True
+        self._recover()
+
+        # A fixed pool of dispatcher threads drains the ready queue, so the
+        # number of threads no longer grows with the number of tasks
+        self.dispatchers = []
+        for i in range(dispatch_threads):
+            thread = threading.Thread(
+                target=self._dispatch_loop,
+                name=f'task-dispatcher-{i}',
+                daemon=True
+            )
+            thread.start()
+            self.dispatchers.append(thread)
+
+        self.stopped = threading.Event()
+        self.housekeeper = threading.Thread(
+            target=self._housekeeping_loop,
+            name='task-housekeeping',
+            daemon=True
+        )
+        self.housekeeper.start()
+
+    def submit_task(self, task_data, priority=None, owner=None):
+        """Add a task. depends_on lists task ids that must complete before it can run"""
         task_id = str(uuid.uuid4())
-        self.tasks[task_id] = {
+        cached = self._check_cache(task_data)
+        with self.lock:
+            ticket = self._submit(task_id, task_data, priority, cached, owner)
+
+        # Wait for durability outside the lock so concurrent submits share a commit
+        self.store.sync(ticket)
+        self.dispatch([task_data['type']])
+        return task_id
+
+    def submit_tasks(self, tasks, owner=None):
+        """Submit many independent tasks at once.
+
+        All of them are recorded under one lock acquisition and made
+        durable by a single commit. Returns (task_ids, errors): task_ids
+        follows the order of tasks with None for each rejected task, and
+        errors lists {'index', 'error'} for those; a bad task never fails
+        the rest of the batch.
+        """
+        task_ids = [None] * len(tasks)
+        errors = []
+        accepted = []
+        for index, task_data in enumerate(tasks):
+            try:
+                _validate(task_data)
+            except ValueError as e:
+                errors.append({'index': index, 'error': str(e)})
+                continue
+            accepted.append((index, task_data, self._check_cache(task_data)))
+
+        ticket = None
+        with self.lock:
+            for index, task_data, cached in accepted:
+                task_id = str(uuid.uuid4())
+                try:
+                    ticket = self._submit(task_id, task_data, cached=cached, owner=owner)
+                except ValueError as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                task_ids[index] = task_id
+
+        self.store.sync(ticket)
+        self.dispatch(list({task_data['type'] for _, task_data, _ in accepted}))
+        errors.sort(key=lambda error: error['index'])
+        return task_ids, errors
+
+    def submit_dag(self, tasks, owner=None):
+        """Submit a set of tasks that depend on each other in one call.
+
+        Every task carries a ``key`` unique within the call. ``depends_on``
+        entries and ``{'$ref': ...}`` placeholders may name keys from the
+        same call or ids of existing tasks. Returns {key: task_id}.
+        """
+        # Check everything up front: a bad task must not leave part of the DAG recorded
+        task_ids = {}
+        for task_data in tasks:
+            _validate(task_data)
+            key = task_data.get('key')
+            if not isinstance(key, str) or not key:
+                raise ValueError("Every task in a DAG needs a key")
+            if key in task_ids:
+                raise ValueError(f"Duplicate task key: {key}")
+            task_ids[key] = str(uuid.uuid4())
+
+        batch = {}
+        for task_data in tasks:
+            data = _map_refs(task_data.get('data'), task_ids)
+            depends_on = [task_ids.get(d, d) for d in task_data.get('depends_on') or ()]
+            # Whatever a $ref names becomes a dependency too
+            batch[task_ids[task_data['key']]] = dict(
+                task_data, data=data, depends_on=_find_refs(data, depends_on)
+            )
+
+        ticket = None
+        with self.lock:
+            for task_data in batch.values():
+                for parent in _dependencies(task_data):
+                    if parent not in batch and parent not in self.tasks:
+                        raise ValueError(f"Unknown dependency: {parent}")
+            for task_id in _topological_order(batch):
+                ticket = self._submit(task_id, batch[task_id],
+                                      cached=self._check_cache(batch[task_id]), owner=owner)
+
+        self.store.sync(ticket)
+        self.dispatch(list({task_data['type'] for task_data in batch.values()}))
+        return task_ids
+
+    def next_task(self, task_types=None, block=False, timeout=None, worker_id=None):
+        """Dequeue the highest-priority ready task of the given types and mark it running"""
+        assignment = self._next_assignment(task_types, block, timeout, worker_id)
+        return assignment and assignment['id']
+
+    def reprioritize_task(self, task_id, priority):
+        """Change the priority of a task that is still waiting in the queue"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None or not self._queue(task['type']).reprioritize(task_id, priority):
+                return False
+            self._update(task_id, priority=priority)
+        return True
+
+    def register_worker(self, worker_info, send=None):
+        """Add a worker to the registry and hand it any work it can take"""
+        self.workers.register(worker_info, send)
+        self.liveness.schedule(worker_info['id'], self.heartbeat_timeout)
+        self.dispatch(worker_info.get('capabilities'))
+
+    def touch_worker(self, worker_id):
+        """Note that a worker is alive; any message from it counts as a heartbeat"""
+        if worker_id not in self.workers:
+            return False
+        self.liveness.schedule(worker_id, self.heartbeat_timeout)
+        return True
+
+    def expire_workers(self, now=None):
+        """Drop workers that missed their heartbeat deadline; returns their ids"""
+        expired = self.liveness.advance(now)
+        for worker_id in expired:
+            print(f"Worker {worker_id} missed its heartbeat, re-queueing its tasks")
+            self.unregister_worker(worker_id)
+        return expired
+
+    def report_load(self, worker_id, free_slots):
+        """Bring a worker's load in line with the free slots its heartbeat reports.
+
+        The load counts the tasks the worker holds, but it may still be
+        busy with tasks it no longer holds (e.g. a lease ran out while one
+        ran), so the load becomes the larger of the two.
+        """
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return
+        with self.lock:
+            held = len(self.assigned.get(worker_id, ()))
+            previous = self.workers.set_load(worker_id, max(held, worker['capacity'] - int(free_slots)))
+        if previous is not None and worker['load'] < previous:
+            self.dispatch(worker['capabilities'])
+
+    def unregister_worker(self, worker_id):
+        """Drop a worker and put the tasks it was running back in the queue"""
+        self.liveness.cancel(worker_id)
+        removed = self.workers.unregister(worker_id)
+        with self.lock:
+            task_ids = list(self.assigned.get(worker_id, ()))
+        for task_id in task_ids:
+            self.requeue_task(task_id)
+        return removed
+
+    def request_task(self, worker_id):
+        """Answer a worker's pull request with a task it is able to run"""
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return None
+        return self._next_assignment(worker['capabilities'], worker_id=worker_id)
+
+    def lease_tasks(self, worker_id, count, lease_time=DEFAULT_LEASE_TIME):
+        """Hand a worker up to count tasks at once, each held for lease_time seconds"""
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return []
+
+        deadline = time.time() + lease_time
+        tasks = []
+        unresolved = []
+        with self.lock:
+            while len(tasks) < count:
+                queue = self._peek_queue(worker['capabilities'])
+                if queue is None:
+                    break
+                task_id = queue.pop()
+                assignment = self._take(task_id, worker_id, unresolved)
+                if assignment is not None:
+                    self._lease(task_id, deadline)
+                    tasks.append(assignment)
+        self._fail_unresolved(unresolved)
+        return tasks
+
+    def renew_leases(self, worker_id, task_ids, lease_time=DEFAULT_LEASE_TIME):
+        """Extend the leases a worker still holds; returns the ids that were renewed"""
+        deadline = time.time() + lease_time
+        renewed = []
+        with self.lock:
+            for task_id in task_ids:
+                if task_id in self.leases and self.tasks[task_id].get('worker') == worker_id:
+                    self._lease(task_id, deadline)
+                    renewed.append(task_id)
+        return renewed
+
+    def ack_tasks(self, worker_id, outcomes):
+        """Record a batch of results from a worker; returns how many were accepted.
+
+        Each outcome holds a task_id and either a result or an error. Tasks
+        the worker no longer holds, e.g. because the lease ran out and the
+        task went to someone else, are ignored.
+        """
+        return self._finish([
+            (outcome['task_id'],
+             {'status': 'failed', 'error': outcome['error']} if 'error' in outcome else
+             {'status': 'completed', 'progress': 100, 'result': outcome.get('result')})
+            for outcome in outcomes
+        ], worker_id)
+
+    def expire_leases(self, now=None):
+        """Re-queue tasks whose lease ran out; returns their ids"""
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            heap = self._lease_heap
+            while heap and heap[0][0] <= now:
+                deadline, task_id = heapq.heappop(heap)
+                # Renewed and released leases leave stale heap entries behind
+                if self.leases.get(task_id) == deadline:
+                    expired.append(task_id)
+        for task_id in expired:
+            print(f"Lease on task {task_id} expired, re-queueing")
+            self.requeue_task(task_id)
+        return expired
+
+    def dispatch(self, task_types=None):
+        """Push ready tasks to the least-loaded capable workers that have free slots"""
+        unresolved = []
+        for task_type in task_types or list(self.queues):
+            while True:
+                with self.lock:
+                    queue = self.queues.get(task_type)
+                    worker_id = self.workers.least_loaded(task_type) if queue else None
+                    send = self.workers.channel(worker_id) if worker_id else None
+                    task_id = queue.pop() if send else None
+                    if task_id is None:
+                        break
+                    assignment = self._take(task_id, worker_id, unresolved)
+                if assignment is None:
+                    continue
+
+                try:
+                    send({'type': 'task_assignment', 'task': assignment})
+                except Exception as e:
+                    print(f"Failed to push task {task_id} to {worker_id}: {e}")
+                    self.unregister_worker(worker_id)
+        self._fail_unresolved(unresolved)
+
+    def update_progress(self, task_id, progress):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return False
+        task['progress'] = progress
+        self._notify(task_id)
+        return True
+
+    def complete_task(self, task_id, result=None):
+        return self._finish([(task_id, {'status': 'completed', 'progress': 100, 'result': result})]) == 1
+
+    def fail_task(self, task_id, error):
+        return self._finish([(task_id, {'status': 'failed', 'error': error})]) == 1
+
+    def requeue_task(self, task_id):
+        """Put a task that was handed out back in the ready queue"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None or task['status'] != 'running':
+                return False
+            worker_id = self._release(task_id)
+            if task_id in self.streams:
+                self.streams[task_id] = False
+            self._update(task_id, status='pending', progress=0, worker=None)
+            self._enqueue(task_id, task)
+        if worker_id:
+            self.workers.adjust_load(worker_id, -1)
+            self.dispatch([task['type']])
+        return True
+
+    def watch_tasks(self, task_ids, send):
+        """Push task_update messages for task_ids through send until each task finishes.
+
+        Returns the current state of each task, or None for unknown ids, so
+        a task that finished before the call is not missed.
+        """
+        states = {}
+        with self.watch_lock:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    states[task_id] = None
+                    continue
+                if task['status'] not in ('completed', 'failed'):
+                    self.watchers.setdefault(task_id, set()).add(send)
+                    self.watching.setdefault(send, set()).add(task_id)
+                states[task_id] = _update_message(task_id, task)
+        return states
+
+    def unwatch_tasks(self, send):
+        """Stop pushing updates through send, e.g. because its connection closed"""
+        with self.watch_lock:
+            for task_id in self.watching.pop(send, ()):
+                watchers = self.watchers.get(task_id)
+                if watchers is not None:
+                    watchers.discard(send)
+                    if not watchers:
+                        del self.watchers[task_id]
+
+    def push_chunk(self, task_id, offset, data, worker_id=None):
+        """Forward a piece of a running task's streamed result to the connections watching it.
+
+        Chunks are passed through, not stored, so only connections watching
+        while the task runs (e.g. the submitter) see them. Chunks from a
+        worker that no longer holds the task are dropped; returns the
+        number of connections the chunk went to. A re-queued task streams
+        again from the start, so the first chunk of the new run carries
+        ``restart`` to tell watchers to drop what they received before.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None or task['status'] != 'running' or \
+                    (worker_id is not None and task.get('worker') != worker_id):
+                return 0
+            restart = self.streams.get(task_id) is False
+            self.streams[task_id] = True
+        with self.watch_lock:
+            sends = list(self.watchers.get(task_id, ()))
+        message = {'type': 'task_chunk', 'task_id': task_id, 'offset': offset, 'data': data}
+        if restart:
+            message['restart'] = True
+        for send in sends:
+            try:
+                send(message)
+            except Exception as e:
+                print(f"Failed to push chunk for task {task_id}: {e}")
+                self.unwatch_tasks(send)
+        return len(sends)
+
+    def get_task_status(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        return {'task_id': task_id, **task}
+
+    def get_all_tasks(self):
+        with self.lock:
+            return {task_id: dict(task) for task_id, task in self.tasks.items()}
+
+    def query_tasks(self, filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of tasks matching filters, newest first.
+
+        filters maps any of status, priority, type, owner and worker to the
+        value wanted. Tasks are summarized without their data and result.
+        Pass the returned next_cursor back to get the following page; it is
+        None on the last page.
+        """
+        with self.lock:
+            task_ids, next_cursor = self.index.query(filters, cursor, limit)
+            tasks = [_summary(task_id, self.tasks[task_id]) for task_id in task_ids]
+        return {'tasks': tasks, 'next_cursor': next_cursor}
+
+    def count_tasks(self, filters=None):
+        with self.lock:
+            return self.index.count(filters)
+
+    def get_cache_stats(self):
+        return self.result_cache.stats() if self.result_cache else None
+
+    def get_worker_status(self):
+        return self.workers.get_worker_status()
+
+    def pending_count(self):
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def stop(self):
+        self.running = False
+        self.stopped.set()
+        if self.updates:
+            self.updates.stop()
+        with self.lock:
+            self.task_ready.notify_all()
+        self.store.close()
+
+    def _queue(self, task_type):
+        # Caller holds self.lock
+        queue = self.queues.get(task_type)
+        if queue is None:
+            queue = self.queues[task_type] = TaskQueue(self.aging_interval)
+        return queue
+
+    def _enqueue(self, task_id, task):
+        # Caller holds self.lock
+        self._queue(task['type']).push(task_id, task['priority'], task['submitted_at'])
+        self.task_ready.notify()
+
+    def _peek_queue(self, task_types):
+        """Return the queue whose head should run next among task_types"""
+        # Caller holds self.lock. One heap peek per candidate type
+        best, best_key = None, None
+        types = self.queues if task_types is None else task_types
+        for task_type in types:
+            queue = self.queues.get(task_type)
+            key = queue.peek_key() if queue else None
+            if key is not None and (best_key is None or key < best_key):
+                best, best_key = queue, key
+        return best
+
+    def _next_assignment(self, task_types=None, block=False, timeout=None, worker_id=None):
+        """Dequeue and start the next ready task like next_task; returns its assignment"""
+        unresolved = []
+        assignment = None
+        with self.lock:
+            if block:
+                self.task_ready.wait_for(
+                    lambda: not self.running or self._peek_queue(task_types) is not None,
+                    timeout
+                )
+            while assignment is None:
+                queue = self._peek_queue(task_types)
+                if queue is None:
+                    break
+                assignment = self._take(queue.pop(), worker_id, unresolved)
+        self._fail_unresolved(unresolved)
+        return assignment
+
+    def _take(self, task_id, worker_id, unresolved):
+        """Start a task popped from its queue and return its assignment; caller holds self.lock.
+
+        A task whose $ref placeholders cannot be resolved is left unstarted
+        and (task_id, error) goes to unresolved, for _fail_unresolved to fail
+        once the lock is released.
+        """
+        try:
+            assignment = self._assignment(task_id)
+        except ValueError as e:
+            unresolved.append((task_id, str(e)))
+            return None
+        self._start(task_id, worker_id)
+        return assignment
+
+    def _fail_unresolved(self, unresolved):
+        if unresolved:
+            self._finish([(task_id, {'status': 'failed', 'error': error})
+                          for task_id, error in unresolved])
+
+    def _start(self, task_id, worker_id):
+        # Caller holds self.lock
+        fields = {'status': 'running', 'started_at': time.time()}
+        if worker_id:
+            fields['worker'] = worker_id
+            self.assigned.setdefault(worker_id, set()).add(task_id)
+            self.workers.adjust_load(worker_id, 1)
+        self._update(task_id, **fields)
+
+    def _assignment(self, task_id):
+        task = self.tasks[task_id]
+        data = task['data']
+        if task.get('depends_on'):
+            # Children hold references; parent results are looked up only now
+            data = self._resolve_refs(data)
+        return {'id': task_id, 'type': task['type'], 'data': data}
+
+    def _resolve_refs(self, value):
+        if isinstance(value, dict):
+            if '$ref' in value:
+                parent = self.tasks.get(value['$ref'])
+                if parent is None:
+                    raise ValueError(f"Unknown task in $ref: {value['$ref']}")
+                result = parent.get('result')
+                field = value.get('field')
+                if field is None:
+                    return result
+                try:
+                    return result[field]
+                except (KeyError, IndexError, TypeError):
+                    raise ValueError(f"Result of task {value['$ref']} has no field {field!r}")
+            return {key: self._resolve_refs(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._resolve_refs(item) for item in value]
+        return value
+
+    def _check_cache(self, task_data):
+        """Look a task up in the result cache; returns (key, found, result)"""
+        cache = self.result_cache
+        if (cache is None or not cache.caches(task_data['type'])
+                or task_data.get('cache') is False or _dependencies(task_data)
+                or _find_refs(task_data.get('data'), [])
+                or references_files(task_data.get('data'))):
+            return None, False, None
+        key = cache_key(task_data['type'], task_data.get('data'))
+        if key is None:
+            return None, False, None
+        return (key,) + cache.get(key)
+
+    def _submit(self, task_id, task_data, priority=None, cached=(None, False, None), owner=None):
+        """Record a new task and queue it or park it behind its dependencies; caller holds self.lock"""
+        if priority is None:
+            priority = int(task_data.get('priority', DEFAULT_PRIORITY))
+        # Whatever a $ref names must finish first, so it is a dependency too
+        depends_on = list(dict.fromkeys(_find_refs(task_data.get('data'), _dependencies(task_data))))
+        for parent in depends_on:
+            if not isinstance(parent, str) or parent not in self.tasks:
+                raise ValueError(f"Unknown dependency: {parent}")
+
+        task = {
             'status': 'pending',
             'progress': 0,
             'type': task_data['type'],
-            'priority': priority
+            'data': task_data.get('data'),
+            'priority': priority,
+            'submitted_at': time.time()
         }
-        
-        # Start a thread to simulate progress
-        thread = threading.Thread(target=self._simulate_progress, args=(task_id,))
-        thread.start()
-        
-        return task_id
-        
+        if depends_on:
+            task['depends_on'] = depends_on
+        if owner:
+            task['owner'] = owner
+        key, found, result = cached
+        if found:
+            # Same inputs ran before: finish without dispatching
+            task.update(status='completed', progress=100, result=result, cached=True,
+                        finished_at=task['submitted_at'])
+        elif key:
+            task['cache_key'] = key
+        self.tasks[task_id] = task
+        self._block(task_id, task)
+        self.index.add(task_id, task)
+        ticket = self.store.append('put', task_id, task)
+        if task['status'] == 'pending':
+            self._enqueue(task_id, task)
+        return ticket
+
+    def _block(self, task_id, task):
+        """Work out whether a task can run given the state of its dependencies"""
+        # Caller holds self.lock
+        failed = [p for p in task.get('depends_on', ()) if self.tasks[p]['status'] == 'failed']
+        if failed:
+            task.update(status='failed', error=f"Dependency {failed[0]} failed",
+                        finished_at=time.time())
+            return
+        unfinished = [p for p in task.get('depends_on', ()) if self.tasks[p]['status'] != 'completed']
+        if unfinished:
+            task['status'] = 'blocked'
+            self.waiting[task_id] = len(unfinished)
+            for parent in unfinished:
+                self.children.setdefault(parent, []).append(task_id)
+        elif task['status'] == 'blocked':
+            task['status'] = 'pending'
+
+    def _settle_dependents(self, task_id, succeeded, now):
+        """Release or fail the tasks blocked on task_id; returns the ids that changed"""
+        # Caller holds self.lock. A failure cascades down the whole subtree
+        changed = []
+        stack = [(task_id, succeeded)]
+        while stack:
+            parent, ok = stack.pop()
+            for child in self.children.pop(parent, ()):
+                if self.tasks[child]['status'] != 'blocked':
+                    continue
+                if ok:
+                    self.waiting[child] -= 1
+                    if self.waiting[child]:
+                        continue
+                    del self.waiting[child]
+                    self._update(child, status='pending')
+                    self._enqueue(child, self.tasks[child])
+                else:
+                    del self.waiting[child]
+                    self._update(child, status='failed', finished_at=now,
+                                 error=f"Dependency {parent} failed")
+                    stack.append((child, False))
+                changed.append(child)
+        return changed
+
+    def _finish(self, outcomes, worker_id=None):
+        """Record the final state of (task_id, fields) pairs; returns how many were accepted.
+
+        With worker_id set, only tasks that worker is still running are accepted.
+        """
+        finished = []
+        released = []
+        results = []
+        freed = {}
+        now = time.time()
+        ticket = None
+        with self.lock:
+            for task_id, fields in outcomes:
+                task = self.tasks.get(task_id)
+                if task is None or task['status'] in ('completed', 'failed'):
+                    continue
+                if worker_id is not None and (task['status'] != 'running' or task.get('worker') != worker_id):
+                    continue
+                if task['status'] == 'blocked':
+                    self.waiting.pop(task_id, None)
+                owner = self._release(task_id)
+                if owner:
+                    freed[owner] = freed.get(owner, 0) + 1
+                self.streams.pop(task_id, None)
+                ticket = self._update(task_id, finished_at=now, **fields)
+                finished.append(task_id)
+                if 'cache_key' in task and fields['status'] == 'completed':
+                    results.append((task['cache_key'], fields.get('result')))
+                released.extend(self._settle_dependents(task_id, fields['status'] == 'completed', now))
+        # One durability wait covers the whole batch
+        self.store.sync(ticket)
+        for key, result in results:
+            self.result_cache.put(key, result)
+
+        for task_id in finished + released:
+            self._notify(task_id)
+        ready_types = {self.tasks[t]['type'] for t in released if self.tasks[t]['status'] == 'pending'}
+        if ready_types:
+            self.dispatch(list(ready_types))
+        for owner, count in freed.items():
+            worker = self.workers.get(owner)
+            if worker:
+                self.workers.adjust_load(owner, -count)
+                self.dispatch(worker['capabilities'])
+        return len(finished)
+
+    def _lease(self, task_id, deadline):
+        # Caller holds self.lock
+        self.leases[task_id] = deadline
+        heapq.heappush(self._lease_heap, (deadline, task_id))
+
+    def _release(self, task_id):
+        # Caller holds self.lock. Returns the worker that was running the task
+        self.leases.pop(task_id, None)
+        worker_id = self.tasks[task_id].get('worker')
+        running = self.assigned.get(worker_id)
+        if running is not None:
+            running.discard(task_id)
+            if not running:
+                del self.assigned[worker_id]
+        return worker_id
+
+    def _notify(self, task_id):
+        task = self.tasks[task_id]
+        if self.updates:
+            self.updates.publish(task_id, {
+                'status': task['status'],
+                'progress': task['progress']
+            }, task.get('owner'))
+        self._push(task_id, task)
+
+    def _push(self, task_id, task):
+        """Send a task's new state to the connections watching it"""
+        finished = task['status'] in ('completed', 'failed')
+        with self.watch_lock:
+            # Checked under the lock: watch_tasks may be adding the first watcher
+            if task_id not in self.watchers:
+                return
+            if finished:
+                sends = self.watchers.pop(task_id, ())
+                for send in sends:
+                    watched = self.watching.get(send)
+                    if watched is not None:
+                        watched.discard(task_id)
+                        if not watched:
+                            del self.watching[send]
+            else:
+                sends = list(self.watchers.get(task_id, ()))
+        message = _update_message(task_id, task)
+        for send in sends:
+            try:
+                send(message)
+            except Exception as e:
+                print(f"Failed to push update for task {task_id}: {e}")
+                self.unwatch_tasks(send)
+
+    def _update(self, task_id, **fields):
+        """Apply field changes to a task and log them; caller holds self.lock"""
+        self.index.update(task_id, fields)
+        self.tasks[task_id].update(fields)
+        return self.store.append('update', task_id, fields)
+
+    def _recover(self):
+        """Rebuild the task table and ready queues from the store"""
+        start = time.perf_counter()
+        with paused_gc():
+            self.tasks = self.store.load()
+            ready = {}
+            for task_id, task in self.tasks.items():
+                if task['status'] in ('pending', 'running'):
+                    # Anything that was running died with the previous process
+                    task['status'] = 'pending'
+                    task['progress'] = 0
+                    task.pop('worker', None)
+                    ready.setdefault(task['type'], []).append(
+                        (task_id, task['priority'], task['submitted_at'])
+                    )
+            for task_id, task in self.tasks.items():
+                if task['status'] == 'blocked':
+                    self._block(task_id, task)
+                    if task['status'] == 'pending':
+                        ready.setdefault(task['type'], []).append(
+                            (task_id, task['priority'], task['submitted_at'])
+                        )
+            for task_type, items in ready.items():
+                self._queue(task_type).extend(items)
+            self.index.rebuild(self.tasks)
+
+        if self.tasks:
+            requeued = sum(len(items) for items in ready.values())
+            print(f"Recovered {len(self.tasks)} tasks ({requeued} re-queued) "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+    def _dispatch_loop(self):
+        """Hand queued tasks to the executor in priority order"""
+        while self.running:
+            task_id = self.next_task(block=True, timeout=1.0)
+            if task_id is not None:
+                self._simulate_progress(task_id)
+
+    def _housekeeping_loop(self):
+        """Take back tasks from expired leases and from workers that went silent"""
+        interval = min(LEASE_CHECK_INTERVAL, self.liveness.tick)
+        while not self.stopped.wait(interval):
+            self.expire_leases()
+            self.expire_workers()
+
     def _simulate_progress(self, task_id):
         """Simulate task progress"""
         progress = 0
-        self.tasks[task_id]['status'] = 'running'
-        
+
         while progress < 100:
             time.sleep(0.5)  # Update every 0.5 seconds
             progress += 10
-            self.tasks[task_id]['progress'] = progress
-            
-            if self.socketio:
-                self.socketio.emit('task_update', {
-                    'task_id': task_id,
-                    'status': 'running',
-                    'progress': progress
-                })
-        
-        self.tasks[task_id]['status'] = 'completed'
-        if self.socketio:
-            self.socketio.emit('task_update', {
-                'task_id': task_id,
-                'status': 'completed',
-                'progress': 100
-            })
\ No newline at end of file
+            self.update_progress(task_id, progress)
+
+        self.complete_task(task_id)
+
+def _update_message(task_id, task):
+    """The task_update message pushed to watching connections"""
+    message = {'type': 'task_update', 'task_id': task_id,
+               'status': task['status'], 'progress': task['progress']}
+    if task['status'] == 'completed':
+        message['result'] = task.get('result')
+    elif task['status'] == 'failed':
+        message['error'] = task.get('error')
+    return message
+
+def _summary(task_id, task):
+    """A task's fields for listings, leaving out its data and result"""
+    return {'task_id': task_id, **{key: value for key, value in task.items()
+                                   if key not in ('data', 'result')}}
+
+def _find_refs(value, refs):
+    """Collect the task ids named by $ref placeholders in task data"""
+    if isinstance(value, dict):
+        if '$ref' in value:
+            refs.append(value['$ref'])
+        else:
+            for item in value.values():
+                _find_refs(item, refs)
+    elif isinstance(value, list):
+        for item in value:
+            _find_refs(item, refs)
+    return refs
+
+def _map_refs(value, task_ids):
+    """Rewrite $ref placeholders that name batch keys to the keys' task ids"""
+    if isinstance(value, dict):
+        if '$ref' in value:
+            return dict(value, **{'$ref': task_ids.get(value['$ref'], value['$ref'])})
+        return {key: _map_refs(item, task_ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_refs(item, task_ids) for item in value]
+    return value
+
+def _validate(task_data):
+    """Reject task data that _submit could not record"""
+    if not isinstance(task_data, dict):
+        raise ValueError("Task must be an object")
+    if not isinstance(task_data.get('type'), str) or not task_data['type']:
+        raise ValueError("Task type is required")
+    try:
+        int(task_data.get('priority', DEFAULT_PRIORITY))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid priority: {task_data.get('priority')}")
+    depends_on = task_data.get('depends_on') or []
+    if not isinstance(depends_on, list) or not all(isinstance(d, str) for d in depends_on):
+        raise ValueError("depends_on must be a list of task ids")
+
+def _dependencies(task_data):
+    """The task's depends_on list without duplicates"""
+    return list(dict.fromkeys(task_data.get('depends_on') or ()))
+
+def _topological_order(batch):
+    """Order a {task_id: task_data} batch so parents come before their children"""
+    indegree = {task_id: 0 for task_id in batch}
+    children = {}
+    for task_id, task_data in batch.items():
+        for parent in _dependencies(task_data):
+            if parent in batch:
+                indegree[task_id] += 1
+                children.setdefault(parent, []).append(task_id)
+
+    ready = [task_id for task_id, count in indegree.items() if count == 0]
+    order = []
+    while ready:
+        task_id = ready.pop()
+        order.append(task_id)
+        for child in children.get(task_id, ()):
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if len(order) != len(batch):
+        raise ValueError("Task dependencies contain a cycle")
+    return order
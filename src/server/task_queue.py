@@ -0,0 +1,120 @@
+# src/server/task_queue.py
+
+import heapq
+import itertools
+import time
+
+# Seconds of waiting that are worth one priority level (1 = High, 3 = Low)
+DEFAULT_AGING_INTERVAL = 30.0
+
+_REMOVED = None
+
+# Shared by every queue, so equal keys in queues of different task types
+# still come out in the order they were queued
+_sequence = itertools.count()
+
+
+class TaskQueue:
+    """Ready queue ordered by priority, then submit time, with aging.
+
+    A task's effective priority improves by one level for every
+    ``aging_interval`` seconds it waits. Because every queued task ages at
+    the same rate, that ordering is equivalent to the static key
+    ``priority * aging_interval + submitted_at``, so aging costs nothing
+    beyond a normal heap. Reprioritize and remove use lazy deletion:
+    the old entry is marked dead and skipped when it reaches the top.
+
+    Not thread-safe on its own: TaskManager only touches its queues while
+    holding its lock.
+    """
+
+    def __init__(self, aging_interval=DEFAULT_AGING_INTERVAL):
+        self.aging_interval = aging_interval
+        self._heap = []
+        self._entries = {}
+
+    def _key(self, priority, submitted_at):
+        if self.aging_interval:
+            return priority * self.aging_interval + submitted_at
+        return priority
+
+    def push(self, task_id, priority, submitted_at=None):
+        """Add a task, or move it if it is already queued. O(log n)"""
+        if submitted_at is None:
+            submitted_at = time.monotonic()
+        self._push(task_id, priority, submitted_at)
+
+    def extend(self, items):
+        """Add many (task_id, priority, submitted_at) tuples in O(n + k)"""
+        for task_id, priority, submitted_at in items:
+            old = self._entries.pop(task_id, None)
+            if old is not None:
+                old[-1] = _REMOVED
+            entry = [self._key(priority, submitted_at), submitted_at,
+                     next(_sequence), priority, task_id]
+            self._entries[task_id] = entry
+            self._heap.append(entry)
+        heapq.heapify(self._heap)
+
+    def _push(self, task_id, priority, submitted_at):
+        old = self._entries.pop(task_id, None)
+        if old is not None:
+            old[-1] = _REMOVED
+        entry = [self._key(priority, submitted_at), submitted_at,
+                 next(_sequence), priority, task_id]
+        self._entries[task_id] = entry
+        heapq.heappush(self._heap, entry)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        # Keep dead entries from outnumbering live ones after heavy churn
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [e for e in self._heap if e[-1] is not _REMOVED]
+            heapq.heapify(self._heap)
+
+    def reprioritize(self, task_id, priority):
+        """Change the priority of a queued task, keeping its submit time"""
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return False
+        self._push(task_id, priority, entry[1])
+        return True
+
+    def remove(self, task_id):
+        """Drop a queued task (e.g. on cancellation). O(1)"""
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return False
+        entry[-1] = _REMOVED
+        self._maybe_compact()
+        return True
+
+    def pop(self):
+        """Remove and return the next task id, or None if the queue is empty"""
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            task_id = entry[-1]
+            if task_id is not _REMOVED:
+                del self._entries[task_id]
+                return task_id
+        return None
+
+    def peek(self):
+        """Return the next task id without removing it"""
+        self._drop_dead_head()
+        return self._heap[0][-1] if self._heap else None
+
+    def peek_key(self):
+        """Return the ordering key of the next task, for comparing queues"""
+        self._drop_dead_head()
+        return (self._heap[0][0], self._heap[0][2]) if self._heap else None
+
+    def _drop_dead_head(self):
+        while self._heap and self._heap[0][-1] is _REMOVED:
+            heapq.heappop(self._heap)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
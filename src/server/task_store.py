@@ -0,0 +1,298 @@
+# src/server/task_store.py
+
+import gc
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from ..utils.codec import encode_message
+from ..utils.framing import FrameDecoder, encode_frame
+
+FSYNC_ALWAYS = 'always'  # each append is durable before the caller continues
+FSYNC_BATCH = 'batch'    # a background commit fsyncs every commit_interval
+FSYNC_OFF = 'off'        # leave flushing to the OS
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_OFF)
+
+DEFAULT_COMMIT_INTERVAL = 0.01
+DEFAULT_SNAPSHOT_EVERY = 500_000
+SNAPSHOT_BATCH_SIZE = 10_000
+READ_CHUNK_SIZE = 1024 * 1024
+MAX_RECORD_SIZE = 1024 * 1024 * 1024
+
+_SEGMENT = re.compile(r'^wal-(\d{8})\.log$')
+_SNAPSHOT = re.compile(r'^snapshot-(\d{8})\.bin$')
+
+@contextmanager
+def paused_gc():
+    """Suspend the cyclic garbage collector while bulk-loading task state.
+
+    Replay allocates millions of small containers that are never garbage;
+    letting the collector repeatedly scan them costs more than the parsing.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def create_task_store():
+    """Build the task store selected by the TASK_STORE environment variable"""
+    kind = os.getenv('TASK_STORE', 'memory')
+    if kind == 'memory':
+        return TaskStore()
+    if kind == 'wal':
+        return WalTaskStore(
+            os.getenv('TASK_STORE_PATH', 'data/tasks'),
+            fsync=os.getenv('TASK_STORE_FSYNC', FSYNC_BATCH),
+            commit_interval=float(os.getenv('TASK_STORE_COMMIT_INTERVAL', DEFAULT_COMMIT_INTERVAL)),
+            snapshot_every=int(os.getenv('TASK_STORE_SNAPSHOT_EVERY', DEFAULT_SNAPSHOT_EVERY))
+        )
+    raise ValueError(f"Unsupported TASK_STORE: {kind}")
+
+class TaskStore:
+    """Persistence backend for task state. The base class keeps nothing.
+
+    Backends receive an ordered stream of ``put`` (whole record) and
+    ``update`` (changed fields) operations. ``append`` must be cheap because
+    TaskManager calls it under its lock; waiting for durability happens in
+    ``sync``, after the lock is released, so concurrent writers share a
+    commit.
+    """
+
+    def load(self):
+        """Return {task_id: record} as of the last durable write"""
+        return {}
+
+    def append(self, op, task_id, fields):
+        """Queue one operation; returns a ticket to pass to sync()"""
+        return None
+
+    def sync(self, ticket):
+        """Block until the operation behind ticket is durable, per the fsync policy"""
+
+    def close(self):
+        pass
+
+class WalTaskStore(TaskStore):
+    """Append-only write-ahead log with periodic compacted snapshots.
+
+    The log is split into numbered segments. Every ``snapshot_every``
+    records a new segment is started and a background thread folds the
+    previous snapshot plus the finished segments into a new snapshot,
+    then deletes them. Recovery loads the newest snapshot and replays the
+    segments after it. Each commit is written as one length-prefixed frame
+    holding a JSON array of records, so a write torn by a crash is detected
+    and dropped, and replay parses whole batches instead of single records.
+    """
+
+    def __init__(self, path, fsync=FSYNC_BATCH, commit_interval=DEFAULT_COMMIT_INTERVAL,
+                 snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy: {fsync}")
+
+        self.path = path
+        self.fsync = fsync
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(path, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._since_snapshot = 0
+        self._compactor = None
+
+        segments = self._segments()
+        self._segment = (segments[-1] if segments else self._latest_snapshot()) + 1
+        self._file = self._open_segment(self._segment)
+
+        self._committer = threading.Thread(
+            target=self._commit_loop,
+            name='task-store-commit',
+            daemon=True
+        )
+        self._committer.start()
+
+    def load(self):
+        snapshot = self._latest_snapshot()
+        segments = [s for s in self._segments() if s > snapshot]
+        return self._load(snapshot, segments)
+
+    def append(self, op, task_id, fields):
+        record = encode_message([op, task_id, fields])
+        with self._cond:
+            self._pending.append(record)
+            self._appended += 1
+            self._since_snapshot += 1
+            if len(self._pending) == 1:
+                self._cond.notify_all()  # wake the committer for a new batch
+            if self._since_snapshot >= self.snapshot_every:
+                self._start_compaction()
+            return self._appended
+
+    def sync(self, ticket):
+        if self.fsync != FSYNC_ALWAYS or ticket is None:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._durable >= ticket or self._closed)
+
+    def flush(self):
+        """Block until everything appended so far has been written out"""
+        with self._cond:
+            target = self._appended
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: self._durable >= target or self._closed)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._committer.join()
+        if self._compactor:
+            self._compactor.join()
+        self._file.close()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                upto = self._appended
+                # Taken before releasing the condition so a segment rotation
+                # cannot write newer records ahead of this batch
+                self._write_lock.acquire()
+
+            try:
+                # One write and at most one fsync per batch: group commit
+                self._file.write(_encode_batch(batch))
+                self._file.flush()
+                if self.fsync != FSYNC_OFF:
+                    os.fsync(self._file.fileno())
+            finally:
+                self._write_lock.release()
+
+            with self._cond:
+                self._durable = max(self._durable, upto)
+                self._cond.notify_all()
+
+            if self.fsync != FSYNC_ALWAYS:
+                time.sleep(self.commit_interval)
+
+    def _start_compaction(self):
+        # Called with self._cond held. Finish the current segment and let a
+        # background thread fold it into a new snapshot
+        if self._compactor and self._compactor.is_alive():
+            return
+        with self._write_lock:
+            if self._pending:
+                self._file.write(_encode_batch(self._pending))
+            self._pending = []
+            self._durable = self._appended
+            self._file.flush()
+            if self.fsync != FSYNC_OFF:
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+            upto = self._segment
+            self._segment += 1
+            self._file = self._open_segment(self._segment)
+        self._since_snapshot = 0
+        self._cond.notify_all()
+        self._compactor = threading.Thread(
+            target=self._compact,
+            args=(upto,),
+            name='task-store-compact',
+            daemon=True
+        )
+        self._compactor.start()
+
+    def _compact(self, upto):
+        snapshot = self._latest_snapshot()
+        segments = [s for s in self._segments() if snapshot < s <= upto]
+        tasks = self._load(snapshot, segments)
+
+        temp_path = self._snapshot_path(upto) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            batch = []
+            for task_id, record in tasks.items():
+                batch.append(encode_message(['put', task_id, record]))
+                if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                    f.write(_encode_batch(batch))
+                    batch = []
+            if batch:
+                f.write(_encode_batch(batch))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._snapshot_path(upto))
+
+        if snapshot:
+            os.remove(self._snapshot_path(snapshot))
+        for segment in segments:
+            os.remove(self._segment_path(segment))
+
+    def _load(self, snapshot, segments):
+        tasks = {}
+        with paused_gc():
+            if snapshot:
+                self._replay(self._snapshot_path(snapshot), tasks)
+            for segment in segments:
+                self._replay(self._segment_path(segment), tasks)
+        return tasks
+
+    def _replay(self, path, tasks):
+        decoder = FrameDecoder(MAX_RECORD_SIZE)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                for frame in decoder.feed(chunk):
+                    try:
+                        records = json.loads(frame)
+                    except ValueError:
+                        print(f"Skipping corrupt batch in {path}")
+                        continue
+                    for op, task_id, fields in records:
+                        if op == 'put':
+                            tasks[task_id] = fields
+                        elif op == 'update' and task_id in tasks:
+                            tasks[task_id].update(fields)
+                        elif op == 'delete':
+                            tasks.pop(task_id, None)
+        # Anything left in the decoder is a batch torn by a crash
+
+    def _open_segment(self, segment):
+        return open(self._segment_path(segment), 'ab')
+
+    def _segments(self):
+        return sorted(
+            int(match.group(1)) for match in map(_SEGMENT.match, os.listdir(self.path))
+            if match
+        )
+
+    def _latest_snapshot(self):
+        snapshots = [
+            int(match.group(1)) for match in map(_SNAPSHOT.match, os.listdir(self.path))
+            if match
+        ]
+        return max(snapshots, default=0)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f'wal-{segment:08d}.log')
+
+    def _snapshot_path(self, snapshot):
+        return os.path.join(self.path, f'snapshot-{snapshot:08d}.bin')
+
+def _encode_batch(records):
+    """Frame already-encoded JSON records as one JSON array"""
+    return encode_frame(b'[' + b','.join(records) + b']')
@@ -0,0 +1,77 @@
+# src/server/timing_wheel.py
+
+import math
+import threading
+import time
+
+DEFAULT_TICK = 1.0
+DEFAULT_SLOTS = 512
+
+class TimingWheel:
+    """Hashed timing wheel for large numbers of resettable deadlines.
+
+    Time is cut into ticks and a deadline is hashed into slot
+    ``due_tick % slots``; deadlines more than one revolution away simply
+    stay in their slot until their tick comes round. Scheduling, resetting
+    and cancelling are O(1), and each tick only looks at one slot instead
+    of every timer.
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.clock = clock
+        self._wheel = [{} for _ in range(slots)]
+        self._timers = {}  # key -> (slot, due_tick)
+        self._current = self._tick_of(clock())
+        self._lock = threading.Lock()
+
+    def schedule(self, key, delay):
+        """Set key to expire delay seconds from now, replacing any earlier deadline"""
+        due = math.ceil((self.clock() + delay) / self.tick)
+        with self._lock:
+            due = max(due, self._current + 1)
+            timer = self._timers.get(key)
+            if timer is not None:
+                if timer[1] == due:
+                    return  # Same tick as before: nothing moves
+                del self._wheel[timer[0]][key]
+            slot = due % self.slots
+            self._wheel[slot][key] = due
+            self._timers[key] = (slot, due)
+
+    def cancel(self, key):
+        with self._lock:
+            timer = self._timers.pop(key, None)
+            if timer is None:
+                return False
+            del self._wheel[timer[0]][key]
+            return True
+
+    def advance(self, now=None):
+        """Move the wheel up to now and return the keys that expired"""
+        target = self._tick_of(self.clock() if now is None else now)
+        expired = []
+        with self._lock:
+            # After a long stall one full turn visits every slot
+            steps = min(target - self._current, self.slots)
+            for step in range(1, steps + 1):
+                bucket = self._wheel[(self._current + step) % self.slots]
+                if not bucket:
+                    continue
+                due = [key for key, due_tick in bucket.items() if due_tick <= target]
+                for key in due:
+                    del bucket[key]
+                    del self._timers[key]
+                expired.extend(due)
+            self._current = max(self._current, target)
+        return expired
+
+    def _tick_of(self, timestamp):
+        return int(timestamp // self.tick)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def __len__(self):
+        return len(self._timers)
@@ -0,0 +1,59 @@
+# src/server/update_emitter.py
+
+import os
+import threading
+
+DEFAULT_FLUSH_INTERVAL = float(os.getenv('UPDATE_FLUSH_INTERVAL', 0.25))
+
+def task_room(task_id):
+    return f'task:{task_id}'
+
+def user_room(username):
+    return f'user:{username}'
+
+class UpdateEmitter:
+    """Batches task updates per Socket.IO room and sends them once per tick.
+
+    Updates go only to the task's own room and to its owner's room, never
+    to every client. Within a tick a task's later updates replace its
+    earlier ones, so each room receives at most one ``task_updates``
+    message per interval holding the latest state of each changed task.
+    """
+
+    def __init__(self, socketio, interval=DEFAULT_FLUSH_INTERVAL):
+        self.socketio = socketio
+        self.interval = interval
+        self.running = True
+        self._pending = {}  # room -> {task_id: latest update}
+        self._lock = threading.Lock()
+        self._thread = socketio.start_background_task(self._flush_loop)
+
+    def publish(self, task_id, update, owner=None):
+        """Queue the latest state of a task for its subscribers"""
+        update = dict(update, task_id=task_id)
+        rooms = [task_room(task_id)]
+        if owner:
+            rooms.append(user_room(owner))
+        with self._lock:
+            for room in rooms:
+                self._pending.setdefault(room, {})[task_id] = update
+
+    def flush(self):
+        """Send one message per room with everything queued since the last flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, updates in pending.items():
+            self.socketio.emit('task_updates', list(updates.values()), to=room)
+        return len(pending)
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+    def _flush_loop(self):
+        while self.running:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error sending task updates: {e}")
@@ -0,0 +1,112 @@
+# src/server/worker_registry.py
+
+import heapq
+import itertools
+import threading
+import time
+
+DEFAULT_WORKER_CAPACITY = 1
+
+class WorkerRegistry:
+    """Connected workers, indexed by capability and ordered by load.
+
+    Each capability keeps a heap of (utilization, load, seq, worker_id)
+    entries. A load change pushes fresh entries rather than re-sorting;
+    older entries are recognised by their sequence number and dropped
+    when they surface, so picking the least-loaded capable worker is
+    O(log n) amortized.
+    """
+
+    def __init__(self):
+        self.workers = {}
+        self._by_capability = {}
+        self._versions = {}
+        self._channels = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, worker_info, send=None):
+        """Add or replace a worker; send is used to push assignments to it"""
+        worker_id = worker_info['id']
+        with self._lock:
+            self._remove(worker_id)
+            self.workers[worker_id] = {
+                'id': worker_id,
+                'capabilities': list(worker_info.get('capabilities', [])),
+                'capacity': max(1, int(worker_info.get('capacity', DEFAULT_WORKER_CAPACITY))),
+                'load': 0,
+                'registered_at': time.time()
+            }
+            self._channels[worker_id] = send
+            self._index(worker_id)
+
+    def unregister(self, worker_id):
+        with self._lock:
+            return self._remove(worker_id) is not None
+
+    def adjust_load(self, worker_id, delta):
+        """Record tasks assigned (+) to or finished (-) by a worker"""
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is None:
+                return
+            worker['load'] = max(0, worker['load'] + delta)
+            self._index(worker_id)
+
+    def set_load(self, worker_id, load):
+        """Replace a worker's load, e.g. with what it reports; returns the previous load"""
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is None:
+                return None
+            previous, worker['load'] = worker['load'], max(0, load)
+            self._index(worker_id)
+            return previous
+
+    def least_loaded(self, capability):
+        """Return the id of the least-loaded worker with a free slot, or None"""
+        with self._lock:
+            heap = self._by_capability.get(capability)
+            while heap:
+                utilization, _, seq, worker_id = heap[0]
+                if self._versions.get(worker_id) != seq:
+                    heapq.heappop(heap)
+                    continue
+                return worker_id if utilization < 1 else None
+            return None
+
+    def get(self, worker_id):
+        return self.workers.get(worker_id)
+
+    def channel(self, worker_id):
+        return self._channels.get(worker_id)
+
+    def get_worker_status(self):
+        with self._lock:
+            return [dict(worker) for worker in self.workers.values()]
+
+    def _index(self, worker_id):
+        # Caller holds self._lock
+        worker = self.workers[worker_id]
+        seq = next(self._counter)
+        self._versions[worker_id] = seq
+        entry = (worker['load'] / worker['capacity'], worker['load'], seq, worker_id)
+        for capability in worker['capabilities']:
+            heap = self._by_capability.setdefault(capability, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 4 * len(self.workers) + 64:
+                # Drop superseded entries once they dominate the heap
+                heap[:] = [e for e in heap if self._versions.get(e[3]) == e[2]]
+                heapq.heapify(heap)
+
+    def _remove(self, worker_id):
+        # Caller holds self._lock; heap entries die with the version
+        self._versions.pop(worker_id, None)
+        self._channels.pop(worker_id, None)
+        return self.workers.pop(worker_id, None)
+
+    def __contains__(self, worker_id):
+        return worker_id in self.workers
+
+    def __len__(self):
+        return len(self.workers)
@@ -21,10 +21,9 @@ function initializeSocket() {
         showNotification('Connection lost. Attempting to reconnect...', 'error');
     });
 
-    // Handle task updates from server
-    socket.on('task_update', (data) => {
-        console.log('Received task update:', data);
-        updateTaskUI(data);
+    // Task updates arrive in batches, one entry per changed task
+    socket.on('task_updates', (updates) => {
+        updates.forEach(updateTaskUI);
     });
 }
 
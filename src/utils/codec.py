@@ -0,0 +1,176 @@
+# src/utils/codec.py
+
+import json
+import os
+import struct
+import numpy as np
+
+JSON = 'json'
+BINARY = 'binary'
+SUPPORTED_CODECS = (BINARY, JSON)
+
+# Codecs this process offers when connecting, most preferred first
+OFFERED_CODECS = tuple(
+    name.strip() for name in os.getenv('MESSAGE_CODECS', 'binary,json').split(',')
+    if name.strip() in SUPPORTED_CODECS
+) or (JSON,)
+
+# Binary messages start with a byte that can never open a JSON document, so
+# the receiver can decode either codec without knowing what was negotiated
+BINARY_MAGIC = b'\xb1'
+
+_U8 = struct.Struct('!B')
+_U32 = struct.Struct('!I')
+_U64 = struct.Struct('!Q')
+_I64 = struct.Struct('!q')
+_F64 = struct.Struct('!d')
+
+def negotiate_codec(offered):
+    """Pick the first codec in the peer's preference list that we support"""
+    for name in offered or ():
+        if name in SUPPORTED_CODECS:
+            return name
+    return JSON
+
+def encode_message(message, codec=JSON):
+    """Serialize a message with the given codec"""
+    if codec == BINARY:
+        parts = [BINARY_MAGIC]
+        _encode_value(message, parts)
+        return b''.join(parts)
+    return _json_encoder.encode(message).encode()
+
+def decode_message(data):
+    """Deserialize a message produced by either codec.
+
+    NumPy arrays in binary messages are read-only views into ``data``.
+    """
+    if data[:1] == BINARY_MAGIC:
+        value, _ = _decode_value(memoryview(data), 1)
+        return value
+    return json.loads(data)
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode('latin-1')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_json_encoder = json.JSONEncoder(default=_json_default)
+
+def _encode_value(value, parts):
+    if value is None:
+        parts.append(b'N')
+    elif value is True:
+        parts.append(b'T')
+    elif value is False:
+        parts.append(b'F')
+    elif isinstance(value, int):
+        if -2**63 <= value < 2**63:
+            parts.append(b'i' + _I64.pack(value))
+        else:
+            digits = str(value).encode()
+            parts.append(b'I' + _U32.pack(len(digits)) + digits)
+    elif isinstance(value, float):
+        parts.append(b'd' + _F64.pack(value))
+    elif isinstance(value, str):
+        encoded = value.encode()
+        parts.append(b's' + _U32.pack(len(encoded)))
+        parts.append(encoded)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        if isinstance(value, memoryview):
+            value = value.cast('B')
+        parts.append(b'b' + _U32.pack(len(value)))
+        parts.append(value)
+    elif isinstance(value, dict):
+        parts.append(b'm' + _U32.pack(len(value)))
+        for key, item in value.items():
+            _encode_value(key, parts)
+            _encode_value(item, parts)
+    elif isinstance(value, (list, tuple)):
+        parts.append(b'l' + _U32.pack(len(value)))
+        for item in value:
+            _encode_value(item, parts)
+    elif isinstance(value, np.ndarray):
+        _encode_array(value, parts)
+    elif isinstance(value, np.generic):
+        _encode_value(value.item(), parts)
+    else:
+        raise TypeError(f"Cannot encode value of type {type(value).__name__}")
+
+def _encode_array(array, parts):
+    if array.dtype.hasobject:
+        _encode_value(array.tolist(), parts)
+        return
+
+    array = np.ascontiguousarray(array)
+    dtype = array.dtype.str.encode()
+    header = [b'a', _U8.pack(len(dtype)), dtype, _U8.pack(array.ndim)]
+    header.extend(_U64.pack(dim) for dim in array.shape)
+    header.append(_U64.pack(array.nbytes))
+    parts.append(b''.join(header))
+    # The raw buffer goes out as-is: no per-element conversion
+    parts.append(memoryview(array.reshape(-1).view(np.uint8)))
+
+def _decode_value(view, offset):
+    tag = view[offset:offset + 1].tobytes()
+    offset += 1
+
+    if tag == b'N':
+        return None, offset
+    if tag == b'T':
+        return True, offset
+    if tag == b'F':
+        return False, offset
+    if tag == b'i':
+        return _I64.unpack_from(view, offset)[0], offset + 8
+    if tag == b'd':
+        return _F64.unpack_from(view, offset)[0], offset + 8
+    if tag in (b's', b'b', b'I'):
+        (length,) = _U32.unpack_from(view, offset)
+        offset += 4
+        raw = view[offset:offset + length]
+        offset += length
+        if tag == b's':
+            return str(raw, 'utf-8'), offset
+        if tag == b'I':
+            return int(raw.tobytes()), offset
+        return raw.tobytes(), offset
+    if tag == b'm':
+        (count,) = _U32.unpack_from(view, offset)
+        offset += 4
+        result = {}
+        for _ in range(count):
+            key, offset = _decode_value(view, offset)
+            result[key], offset = _decode_value(view, offset)
+        return result, offset
+    if tag == b'l':
+        (count,) = _U32.unpack_from(view, offset)
+        offset += 4
+        result = []
+        for _ in range(count):
+            item, offset = _decode_value(view, offset)
+            result.append(item)
+        return result, offset
+    if tag == b'a':
+        return _decode_array(view, offset)
+
+    raise ValueError(f"Unknown binary codec tag {tag!r}")
+
+def _decode_array(view, offset):
+    (dtype_length,) = _U8.unpack_from(view, offset)
+    offset += 1
+    dtype = np.dtype(view[offset:offset + dtype_length].tobytes().decode())
+    offset += dtype_length
+    (ndim,) = _U8.unpack_from(view, offset)
+    offset += 1
+    shape = struct.unpack_from(f'!{ndim}Q', view, offset)
+    offset += 8 * ndim
+    (nbytes,) = _U64.unpack_from(view, offset)
+    offset += 8
+
+    array = np.frombuffer(view[offset:offset + nbytes], dtype=dtype).reshape(shape)
+    return array, offset + nbytes
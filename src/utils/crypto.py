@@ -1,14 +1,91 @@
 # src/utils/crypto.py
 
+import hmac
 import os
-from base64 import b64encode, b64decode
+import ssl
+import struct
+import threading
+import time
+from base64 import b64encode, b64decode, urlsafe_b64decode
+from collections import OrderedDict
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.fernet import Fernet
 import jwt
 
+# Message envelopes: how a message is protected on top of the transport
+NO_ENVELOPE = 'none'  # rely on TLS alone; only offered when the server certificate is verified
+AESGCM_ENVELOPE = 'aesgcm'  # chunked AES-256-GCM, raw bytes
+FERNET_ENVELOPE = 'fernet'  # AES-CBC + HMAC, base64; what peers that don't negotiate use
+SUPPORTED_ENVELOPES = (NO_ENVELOPE, AESGCM_ENVELOPE, FERNET_ENVELOPE)
+
+# Envelopes this process accepts or offers, most preferred first
+ENVELOPES = tuple(
+    name.strip() for name in os.getenv('MESSAGE_ENVELOPES', 'none,aesgcm,fernet').split(',')
+    if name.strip() in SUPPORTED_ENVELOPES
+) or (FERNET_ENVELOPE,)
+
+# Each message is sealed under its own key, derived from the shared one and
+# a random salt sent in the header, so chunk counters never repeat a nonce
+# under a key however many messages are sent
+GCM_MAGIC = b'\xa3'
+GCM_CHUNK_SIZE = 1024 * 1024
+GCM_TAG_SIZE = 16
+_GCM_SALT_SIZE = 16
+_GCM_NONCE_PAD = bytes(8)
+_GCM_PREFIX_SIZE = 8
+_GCM_COUNTER = struct.Struct('!I')
+# The last chunk is authenticated as last, so cutting a message short at a
+# chunk boundary fails decryption instead of yielding a valid prefix
+_GCM_MORE = b'\x00'
+_GCM_LAST = b'\x01'
+
+KDF_ITERATIONS = 100000
+DEFAULT_KDF_CACHE_SIZE = int(os.getenv('KDF_CACHE_SIZE', 128))
+DEFAULT_KDF_CACHE_TTL = float(os.getenv('KDF_CACHE_TTL', 300))
+
+# encrypt_stream output: magic, salt, nonce prefix, chunk size, then GCM chunks
+STREAM_MAGIC = b'\xa2'
+STREAM_CHUNK_SIZE = 256 * 1024
+MAX_STREAM_CHUNK_SIZE = 64 * 1024 * 1024
+_SALT_SIZE = 16
+_STREAM_HEADER_SIZE = 1 + _SALT_SIZE + _GCM_PREFIX_SIZE + _GCM_COUNTER.size
+
+def offered_envelopes(tls_verified):
+    """Envelopes to offer the server; skipping the envelope needs an authenticated TLS peer"""
+    return [name for name in ENVELOPES if tls_verified or name != NO_ENVELOPE]
+
+def negotiate_envelope(offered):
+    """Pick the first envelope in the peer's preference list that we accept"""
+    if offered is None:
+        return FERNET_ENVELOPE  # A peer that predates negotiation
+    for name in offered:
+        if name in ENVELOPES:
+            return name
+    return FERNET_ENVELOPE
+
+def client_ssl_context():
+    """TLS context for connecting to the server, and whether it verifies the server.
+
+    With TLS_CA_FILE set the server certificate must chain to it (for the
+    self-signed server certificate, the certificate itself); otherwise any
+    certificate is accepted and the connection only counts as encrypted.
+    """
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ca_file = os.getenv('TLS_CA_FILE')
+    if ca_file:
+        context.load_verify_locations(ca_file)
+        context.check_hostname = os.getenv('TLS_CHECK_HOSTNAME', 'false') == 'true'
+        return context, True
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context, False
+
 class CryptoManager:
     def __init__(self):
         # Use environment variable for key instead of generating new one
@@ -22,34 +99,117 @@ class CryptoManager:
             self.key = self.key.encode()
         
         self.backend = default_backend()
-        self.salt = os.urandom(16)
+        self.salt = os.urandom(_SALT_SIZE)
+        # Cipher objects hold the expanded key, so build them once
+        self.fernet = Fernet(self.key)
+        self.envelope_key = urlsafe_b64decode(self.key)
+
+        # PBKDF2 is deliberately slow, so derived keys are reused for a while.
+        # Entries are keyed by an HMAC of the password under a per-process
+        # secret, so the cache never holds the password or a plain hash of it.
+        self.kdf_cache_size = DEFAULT_KDF_CACHE_SIZE
+        self.kdf_cache_ttl = DEFAULT_KDF_CACHE_TTL
+        self._kdf_cache = OrderedDict()  # (password digest, salt) -> (key, expires_at)
+        self._kdf_secret = os.urandom(32)
+        self._kdf_lock = threading.Lock()
         
     def _generate_key(self):
         """Generate a secure encryption key"""
         return Fernet.generate_key()
         
-    def _derive_key(self, password, salt):
-        """Derive a key from password using PBKDF2"""
+    def _derive_key(self, password, salt, cache=True):
+        """Derive a key from password using PBKDF2, reusing recent derivations.
+
+        With cache false the new key is not kept, for a fresh salt that no
+        later call will ask for again.
+        """
+        if isinstance(password, str):
+            password = password.encode()
+        cache_key = (hmac.digest(self._kdf_secret, password, 'sha256'), bytes(salt))
+        now = time.monotonic()
+        with self._kdf_lock:
+            entry = self._kdf_cache.get(cache_key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._kdf_cache.move_to_end(cache_key)
+                    return entry[0]
+                del self._kdf_cache[cache_key]
+
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=100000,
+            iterations=KDF_ITERATIONS,
             backend=self.backend
         )
-        return kdf.derive(password.encode())
+        key = kdf.derive(password)
+        if cache and self.kdf_cache_size > 0:
+            with self._kdf_lock:
+                self._kdf_cache[cache_key] = (key, now + self.kdf_cache_ttl)
+                self._kdf_cache.move_to_end(cache_key)
+                while len(self._kdf_cache) > self.kdf_cache_size:
+                    self._kdf_cache.popitem(last=False)
+        return key
         
-    def encrypt_message(self, message):
-        """Encrypt a message using Fernet"""
-        f = Fernet(self.key)
+    def encrypt_message(self, message, envelope=FERNET_ENVELOPE):
+        """Wrap a serialized message in the negotiated envelope"""
         if isinstance(message, str):
             message = message.encode()
-        return f.encrypt(message)
+        if envelope == NO_ENVELOPE:
+            return message
+        if envelope == AESGCM_ENVELOPE:
+            return self._seal_chunks(message)
+        return self.fernet.encrypt(message)
+        
+    def decrypt_message(self, encrypted_message, envelope=FERNET_ENVELOPE):
+        """Unwrap a message received in the negotiated envelope"""
+        if envelope == NO_ENVELOPE:
+            return encrypted_message
+        if envelope == AESGCM_ENVELOPE:
+            return self._open_chunks(encrypted_message)
+        if not isinstance(encrypted_message, bytes):
+            # Frames assembled in place arrive as bytearray
+            encrypted_message = bytes(encrypted_message)
+        return self.fernet.decrypt(encrypted_message)
+        
+    def _message_aead(self, salt):
+        """AES-GCM under the key of one message, derived from the envelope key and its salt"""
+        return AESGCM(HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            info=b'message-envelope',
+            backend=self.backend
+        ).derive(self.envelope_key))
         
-    def decrypt_message(self, encrypted_message):
-        """Decrypt a Fernet-encrypted message"""
-        f = Fernet(self.key)
-        return f.decrypt(encrypted_message)
+    def _seal_chunks(self, message):
+        """Encrypt in GCM_CHUNK_SIZE chunks, each with its own nonce and tag"""
+        salt = os.urandom(_GCM_SALT_SIZE)
+        aead = self._message_aead(salt)
+        view = memoryview(message)
+        parts = [GCM_MAGIC, salt]
+        count = max(1, -(-len(view) // GCM_CHUNK_SIZE))
+        for index in range(count):
+            chunk = view[index * GCM_CHUNK_SIZE:(index + 1) * GCM_CHUNK_SIZE]
+            nonce = _GCM_NONCE_PAD + _GCM_COUNTER.pack(index)
+            parts.append(aead.encrypt(nonce, chunk, _GCM_LAST if index == count - 1 else _GCM_MORE))
+        return b''.join(parts)
+        
+    def _open_chunks(self, data):
+        view = memoryview(data)
+        header = 1 + _GCM_SALT_SIZE
+        if view[:1] != GCM_MAGIC or len(view) < header + GCM_TAG_SIZE:
+            raise InvalidTag()
+        aead = self._message_aead(bytes(view[1:header]))
+        stride = GCM_CHUNK_SIZE + GCM_TAG_SIZE
+        body = view[header:]
+        count = max(1, -(-len(body) // stride))
+        parts = []
+        for index in range(count):
+            chunk = body[index * stride:(index + 1) * stride]
+            nonce = _GCM_NONCE_PAD + _GCM_COUNTER.pack(index)
+            parts.append(aead.decrypt(nonce, chunk, _GCM_LAST if index == count - 1 else _GCM_MORE))
+        return parts[0] if count == 1 else b''.join(parts)
         
     def encrypt_data(self, data, password):
         """Encrypt data using AES"""
@@ -77,9 +237,9 @@ class CryptoManager:
         decoded_data = b64decode(encrypted_data.encode('utf-8'))
         
         # Extract salt, iv, and encrypted data
-        salt = decoded_data[:16]
-        iv = decoded_data[16:32]
-        encrypted_data = decoded_data[32:]
+        salt = decoded_data[:_SALT_SIZE]
+        iv = decoded_data[_SALT_SIZE:_SALT_SIZE + 16]
+        encrypted_data = decoded_data[_SALT_SIZE + 16:]
         
         # Derive key
         key = self._derive_key(password, salt)
@@ -98,6 +258,72 @@ class CryptoManager:
         data = unpadder.update(padded_data) + unpadder.finalize()
         
         return data.decode('utf-8')
+
+    def encrypt_stream(self, source, target, password, chunk_size=STREAM_CHUNK_SIZE):
+        """Encrypt binary file object source into target, chunk_size bytes at a time.
+
+        Memory use stays at a couple of chunks whatever the size of the
+        input. Chunks are sealed with AES-GCM like message envelopes, under
+        a key derived from password and a salt of the stream's own, so each
+        stream costs one PBKDF2 derivation. Returns the number of bytes
+        encrypted.
+        """
+        if not 0 < chunk_size <= MAX_STREAM_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_STREAM_CHUNK_SIZE}")
+        # A fresh salt gives every stream its own key, so nonces only need
+        # to be unique within the stream
+        salt = os.urandom(_SALT_SIZE)
+        aead = AESGCM(self._derive_key(password, salt, cache=False))
+        prefix = os.urandom(_GCM_PREFIX_SIZE)
+        target.write(STREAM_MAGIC + salt + prefix + _GCM_COUNTER.pack(chunk_size))
+
+        total = 0
+        index = 0
+        chunk = _read_full(source, chunk_size)
+        while True:
+            # Read ahead one chunk so the last one can be marked as last
+            following = _read_full(source, chunk_size) if len(chunk) == chunk_size else b''
+            last = not following
+            nonce = prefix + _GCM_COUNTER.pack(index)
+            target.write(aead.encrypt(nonce, chunk, _GCM_LAST if last else _GCM_MORE))
+            total += len(chunk)
+            if last:
+                return total
+            chunk = following
+            index += 1
+
+    def decrypt_stream(self, source, target, password):
+        """Decrypt encrypt_stream output from source into target; returns the bytes written.
+
+        Raises InvalidTag if the data was tampered with, truncated or the
+        password is wrong. Chunks are written as they are verified, so on
+        failure target holds partial output and should be discarded.
+        """
+        header = _read_full(source, _STREAM_HEADER_SIZE)
+        if len(header) < _STREAM_HEADER_SIZE or header[:1] != STREAM_MAGIC:
+            raise InvalidTag()
+        salt = header[1:1 + _SALT_SIZE]
+        prefix = header[1 + _SALT_SIZE:1 + _SALT_SIZE + _GCM_PREFIX_SIZE]
+        chunk_size, = _GCM_COUNTER.unpack(header[-_GCM_COUNTER.size:])
+        if not 0 < chunk_size <= MAX_STREAM_CHUNK_SIZE:
+            raise InvalidTag()
+        aead = AESGCM(self._derive_key(password, salt))
+        stride = chunk_size + GCM_TAG_SIZE
+
+        total = 0
+        index = 0
+        chunk = _read_full(source, stride)
+        while True:
+            following = _read_full(source, stride) if len(chunk) == stride else b''
+            last = not following
+            nonce = prefix + _GCM_COUNTER.pack(index)
+            data = aead.decrypt(nonce, chunk, _GCM_LAST if last else _GCM_MORE)
+            target.write(data)
+            total += len(data)
+            if last:
+                return total
+            chunk = following
+            index += 1
         
     def generate_token(self, payload, secret_key):
         """Generate a JWT token"""
@@ -114,11 +340,11 @@ class CryptoManager:
 crypto_manager = CryptoManager()
 
 # Convenience functions
-def encrypt_message(message):
-    return crypto_manager.encrypt_message(message)
+def encrypt_message(message, envelope=FERNET_ENVELOPE):
+    return crypto_manager.encrypt_message(message, envelope)
 
-def decrypt_message(encrypted_message):
-    return crypto_manager.decrypt_message(encrypted_message)
+def decrypt_message(encrypted_message, envelope=FERNET_ENVELOPE):
+    return crypto_manager.decrypt_message(encrypted_message, envelope)
 
 def encrypt_data(data, password):
     return crypto_manager.encrypt_data(data, password)
@@ -126,10 +352,31 @@ def encrypt_data(data, password):
 def decrypt_data(encrypted_data, password):
     return crypto_manager.decrypt_data(encrypted_data, password)
 
+def encrypt_stream(source, target, password, chunk_size=STREAM_CHUNK_SIZE):
+    return crypto_manager.encrypt_stream(source, target, password, chunk_size)
+
+def decrypt_stream(source, target, password):
+    return crypto_manager.decrypt_stream(source, target, password)
+
 def generate_token(payload):
     secret_key = os.getenv('SECRET_KEY', 'your-secret-key')
     return crypto_manager.generate_token(payload, secret_key)
 
 def verify_token(token):
     secret_key = os.getenv('SECRET_KEY', 'your-secret-key')
-    return crypto_manager.verify_token(token, secret_key)
\ No newline at end of file
+    return crypto_manager.verify_token(token, secret_key)
+
+def _read_full(source, size):
+    """Read size bytes from a file object, or fewer only at end of file"""
+    data = source.read(size)
+    if not data or len(data) == size:
+        return data or b''
+    parts = [data]
+    received = len(data)
+    while received < size:
+        more = source.read(size - received)
+        if not more:
+            break
+        parts.append(more)
+        received += len(more)
+    return b''.join(parts)
@@ -0,0 +1,115 @@
+# src/utils/framing.py
+
+import os
+import struct
+
+# Every message on the wire is a 4-byte big-endian length followed by the payload
+HEADER = struct.Struct('!I')
+DEFAULT_MAX_FRAME_SIZE = int(os.getenv('MAX_FRAME_SIZE', 64 * 1024 * 1024))
+RECV_BUFFER_SIZE = 256 * 1024
+
+# Frames at least this big are assembled in a preallocated buffer instead
+# of growing the shared receive buffer
+LARGE_FRAME_SIZE = 64 * 1024
+
+class FrameTooLargeError(ValueError):
+    pass
+
+def encode_frame(payload):
+    """Prefix a payload with its length"""
+    return HEADER.pack(len(payload)) + payload
+
+def send_frame(sock, payload):
+    """Send one length-prefixed frame over a blocking socket"""
+    if len(payload) < LARGE_FRAME_SIZE:
+        sock.sendall(encode_frame(payload))
+    else:
+        # Skip copying a big payload just to prepend four bytes
+        sock.sendall(HEADER.pack(len(payload)))
+        sock.sendall(payload)
+
+def iter_frames(sock, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+    """Yield complete frames received from a blocking socket until EOF"""
+    decoder = FrameDecoder(max_frame_size)
+    while True:
+        frames = decoder.read_from(sock)
+        if frames is None:
+            return
+        yield from frames
+
+class FrameDecoder:
+    """Incremental decoder that turns a byte stream back into frames.
+
+    Small frames are parsed out of one reusable buffer. A large frame gets a
+    buffer of its exact size up front, and read_from() receives straight
+    into it, so a payload of many MB is never re-concatenated.
+    """
+
+    def __init__(self, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._frame = None
+        self._filled = 0
+
+    def feed(self, data):
+        """Consume received bytes and return the list of completed frames"""
+        frames = []
+        if self._frame is not None:
+            data = self._fill(memoryview(data), frames)
+            if self._frame is not None:
+                return frames
+        self._buffer += data
+        self._drain(frames)
+        return frames
+
+    def read_from(self, sock, bufsize=RECV_BUFFER_SIZE):
+        """Receive once from a socket; returns completed frames, or None at EOF"""
+        if self._frame is None:
+            data = sock.recv(bufsize)
+            if not data:
+                return None
+            return self.feed(data)
+
+        received = sock.recv_into(memoryview(self._frame)[self._filled:])
+        if not received:
+            return None
+        self._filled += received
+        if self._filled < len(self._frame):
+            return []
+        frame, self._frame = self._frame, None
+        return [frame]
+
+    def _fill(self, view, frames):
+        count = min(len(view), len(self._frame) - self._filled)
+        self._frame[self._filled:self._filled + count] = view[:count]
+        self._filled += count
+        if self._filled == len(self._frame):
+            frames.append(self._frame)
+            self._frame = None
+        return view[count:]
+
+    def _drain(self, frames):
+        buffer = self._buffer
+        offset = 0
+        with memoryview(buffer) as view:
+            while len(buffer) - offset >= HEADER.size:
+                (length,) = HEADER.unpack_from(buffer, offset)
+                if length > self.max_frame_size:
+                    raise FrameTooLargeError(
+                        f"Frame of {length} bytes exceeds limit of {self.max_frame_size}"
+                    )
+
+                start = offset + HEADER.size
+                end = start + length
+                if end <= len(buffer):
+                    frames.append(bytes(view[start:end]))
+                    offset = end
+                    continue
+
+                if length >= LARGE_FRAME_SIZE:
+                    self._frame = bytearray(length)
+                    self._filled = len(buffer) - start
+                    self._frame[:self._filled] = view[start:]
+                    offset = len(buffer)
+                break
+        del buffer[:offset]
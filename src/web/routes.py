@@ -3,8 +3,11 @@
 from flask import current_app
 from flask_socketio import SocketIO
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from flask_socketio import emit
+from flask_socketio import emit, join_room, leave_room
 from ..server.task_manager import TaskManager
+from ..server.update_emitter import task_room, user_room
+from ..server.task_index import INDEXED_FIELDS, DEFAULT_PAGE_SIZE
+from ..server.result_cache import create_result_cache
 from ..utils.logger import logger
 
 routes = Blueprint('routes', __name__)
@@ -14,17 +17,25 @@ socketio = None
 def init_routes(socketio_instance):
     global task_manager, socketio
     socketio = socketio_instance
-    task_manager = TaskManager(socketio_instance)
+    task_manager = TaskManager(socketio_instance, result_cache=create_result_cache())
     
     # Socket.IO event handlers
     @socketio.on('connect')
     def handle_connect():
         logger.info('Client connected')
+        # Updates for the user's own tasks arrive without subscribing to each
+        if 'user_id' in session:
+            join_room(user_room(session['user_id']))
 
     @socketio.on('subscribe_task')
     def handle_task_subscription(task_id):
+        join_room(task_room(task_id))
         logger.info(f'Client subscribed to task: {task_id}')
 
+    @socketio.on('unsubscribe_task')
+    def handle_task_unsubscription(task_id):
+        leave_room(task_room(task_id))
+
 @routes.route('/')
 def index():
     if 'user_id' not in session:
@@ -59,12 +70,60 @@ def create_task():
         return jsonify({'error': 'Unauthorized'}), 401
     
     task_data = request.json
-    priority = int(task_data.get('priority', 2))
-    task_id = task_manager.submit_task(task_data, priority)
+    try:
+        if 'tasks' in task_data:
+            # A whole DAG: {"tasks": [{"key": ..., "depends_on": [...], ...}]}
+            task_ids = task_manager.submit_dag(task_data['tasks'], owner=session['user_id'])
+            logger.info(f"New task DAG created: {list(task_ids.values())}")
+            return jsonify({'task_ids': task_ids})
+        
+        priority = int(task_data.get('priority', 2))
+        task_id = task_manager.submit_task(task_data, priority, owner=session['user_id'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     logger.info(f"New task created: {task_id}")
     return jsonify({'task_id': task_id})
 
+@routes.route('/api/tasks/batch', methods=['POST'])
+def create_tasks():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    tasks = (request.json or {}).get('tasks')
+    if not isinstance(tasks, list):
+        return jsonify({'error': 'Expected {"tasks": [...]}'}), 400
+    
+    task_ids, errors = task_manager.submit_tasks(tasks, owner=session['user_id'])
+    logger.info(f"Batch of {len(tasks)} tasks submitted, {len(errors)} rejected")
+    return jsonify({'task_ids': task_ids, 'errors': errors})
+
+@routes.route('/api/tasks', methods=['GET'])
+def list_tasks():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        page = task_manager.query_tasks(
+            _task_filters(),
+            cursor=request.args.get('cursor'),
+            limit=int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+@routes.route('/api/tasks/count', methods=['GET'])
+def count_tasks():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        count = task_manager.count_tasks(_task_filters())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'count': count})
+
 @routes.route('/api/tasks/<task_id>', methods=['GET'])
 def get_task(task_id):
     if 'user_id' not in session:
@@ -83,10 +142,25 @@ def get_workers():
     workers = task_manager.get_worker_status()
     return jsonify(workers)
 
+@routes.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    stats = task_manager.get_cache_stats()
+    if stats is None:
+        return jsonify({'error': 'Result cache is disabled'}), 404
+    return jsonify(stats)
+
+def _task_filters():
+    """Task query filters from the request's query string"""
+    filters = {field: request.args.get(field) for field in INDEXED_FIELDS}
+    if filters['priority'] is not None:
+        filters['priority'] = int(filters['priority'])
+    return filters
+
 def handle_task_update(task_id, status):
-    """Emit task update to connected clients"""
-    if socketio:
-        socketio.emit('task_update', {
-            'task_id': task_id,
-            'status': status
-        }, broadcast=True)
\ No newline at end of file
+    """Queue a task update for the clients subscribed to it"""
+    if task_manager and task_manager.updates:
+        task = task_manager.get_task_status(task_id)
+        task_manager.updates.publish(task_id, {'status': status}, task and task.get('owner'))
\ No newline at end of file
@@ -1,16 +1,19 @@
 # src/web/socket_events.py
-from flask_socketio import emit
+from flask_socketio import emit, join_room
+from ..server.update_emitter import task_room
+
+INITIAL_TASKS = 50
 
 def init_socket_events(socketio, task_manager):
     @socketio.on('connect')
     def handle_connect():
         print('Client connected')
-        # Send current tasks state
-        tasks = task_manager.get_all_tasks()
-        emit('initial_tasks', tasks)
+        # Send the newest tasks only; older pages come from GET /api/tasks
+        emit('initial_tasks', task_manager.query_tasks(limit=INITIAL_TASKS))
 
     @socketio.on('subscribe_task')
     def handle_task_subscribe(task_id):
+        join_room(task_room(task_id))
         print(f'Client subscribed to task {task_id}')
 
-    return socketio
\ No newline at end of file
+    return socketio
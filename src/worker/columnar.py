@@ -0,0 +1,208 @@
+# src/worker/columnar.py
+import numpy as np
+
+SORT = 'sort'
+FILTER = 'filter'
+TRANSFORM = 'transform'
+OPERATIONS = (SORT, FILTER, TRANSFORM)
+
+TRANSFORMS = {
+    'uppercase': str.upper,
+    'lowercase': str.lower
+}
+
+_MISSING = object()  # a record without the column, told apart from an explicit None
+
+class Table:
+    """Rows of a data_processing task, held column by column.
+
+    Built from a list of records (dicts) or from a dict of columns (lists or
+    arrays). A column is only converted when an operation needs it: numbers
+    and booleans become typed NumPy arrays, anything else an object array
+    that is dictionary-encoded (distinct values plus an integer code per
+    row) when it has to be sorted or transformed. Operations work on whole
+    columns and produce row indices; ``rows`` materializes the result in
+    the input's form at the end. Ints mixed with floats only share a
+    float64 array when every one of them converts exactly, and transforms
+    read the values as given, so results match plain Python comparisons.
+    """
+
+    def __init__(self, records=None, columns=None):
+        self.records = records
+        self.source = columns
+        self.length = len(records) if records is not None else \
+            len(next(iter(columns.values()), ()))
+        self.columns = {}
+        self.encodings = {}
+
+    @classmethod
+    def wrap(cls, data):
+        if isinstance(data, dict):
+            return cls(columns=data)
+        return cls(records=list(data))
+
+    def column(self, name):
+        """The named column as an array, converted on first use"""
+        array = self.columns.get(name)
+        if array is None:
+            array = self.columns[name] = _typed(self._raw(name))
+        return array
+
+    def _raw(self, name):
+        """The named column's values as given: a list, or the array of an array column"""
+        if self.records is not None:
+            return [record.get(name, _MISSING) for record in self.records]
+        values = self.source.get(name)
+        return [_MISSING] * self.length if values is None else values
+
+    def encoded(self, name):
+        """(distinct values in first-seen order, code per row) for a column"""
+        encoding = self.encodings.get(name)
+        if encoding is None:
+            # The values as given, so 1 in a column of floats stays 1
+            column = self._raw(name)
+            column = column.tolist() if isinstance(column, np.ndarray) else list(column)
+            keys = column
+            if len(set(map(type, column))) > 1:
+                # 1, 1.0 and True hash alike, but must not share a code
+                keys = list(zip(map(type, column), column))
+            try:
+                index = {key: code for code, key in enumerate(dict.fromkeys(keys))}
+            except TypeError:
+                # Unhashable cells (lists, dicts): every row is its own value
+                values, codes = column, np.arange(self.length, dtype=np.intp)
+            else:
+                codes = np.fromiter(map(index.__getitem__, keys), dtype=np.intp, count=self.length)
+                values = list(index) if keys is column else [key[1] for key in index]
+            encoding = self.encodings[name] = (values, codes)
+        return encoding
+
+    def sort_order(self, keys, descending=False):
+        """Stable row order sorting by keys, the first key most significant"""
+        if isinstance(descending, bool):
+            descending = [descending] * len(keys)
+        sort_keys = []
+        for key, reverse in zip(keys, descending):
+            column = self.column(key)
+            if column.dtype == object:
+                values, codes = self.encoded(key)
+                order = sorted(range(len(values)), key=values.__getitem__)
+                ranks = np.empty(len(values), np.intp)
+                ranks[order] = np.arange(len(values))
+                column = ranks[codes]
+            elif column.dtype == bool or column.dtype.kind == 'u':
+                column = column.astype(np.int64)
+            sort_keys.append(-column if reverse else column)
+        # lexsort treats its last key as the primary one
+        return np.lexsort(sort_keys[::-1]) if sort_keys else np.arange(self.length)
+
+    def match(self, condition):
+        """Boolean mask of the rows whose columns equal every value in condition"""
+        mask = np.ones(self.length, dtype=bool)
+        for name, value in condition.items():
+            column = self.column(name)
+            if column.dtype == object:
+                if isinstance(value, (list, tuple, dict)):
+                    equal = np.array([item == value for item in column.tolist()], dtype=bool)
+                else:
+                    equal = column == value
+                if value is None:
+                    equal |= column == _MISSING  # record.get(name) is None for these too
+            elif isinstance(value, (int, float, np.number)):
+                equal = _equal_numbers(column, value)
+            else:
+                equal = np.zeros(self.length, dtype=bool)  # a number never equals this
+            mask &= equal
+        return mask
+
+    def transformed(self, name, transform):
+        """New values of a column with transform applied once per distinct value"""
+        values, codes = self.encoded(name)
+        function = TRANSFORMS[transform]
+        mapped = np.empty(len(values), dtype=object)
+        mapped[:] = [function('' if value is _MISSING else str(value)) for value in values]
+        return mapped[codes]
+
+    def rows(self, selection=None, replaced=None):
+        """Materialize selected rows (indices or a mask; all by default) with replaced columns"""
+        if isinstance(selection, np.ndarray) and selection.dtype == bool:
+            selection = np.flatnonzero(selection)
+        if self.records is not None:
+            if selection is None:
+                records = self.records
+            else:
+                records = [self.records[i] for i in selection.tolist()]
+            if not replaced:
+                return records
+            records = [dict(record) for record in records]
+            for name, values in replaced.items():
+                for record, value in zip(records, _plain(values, selection)):
+                    record[name] = value
+            return records
+
+        columns = dict(self.source, **(replaced or {}))
+        return {name: _plain(values, selection) for name, values in columns.items()}
+
+def process(data, operation, options):
+    """Run a data_processing operation on records or columns; the result has the input's form"""
+    table = Table.wrap(data)
+    if operation == SORT:
+        keys = options.get('key', 'id')
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return table.rows(table.sort_order(keys, options.get('descending', False)))
+    if operation == FILTER:
+        return table.rows(table.match(options.get('condition', {})))
+    if operation == TRANSFORM:
+        replaced = {
+            name: table.transformed(name, transform)
+            for name, transform in options.get('transformation', {}).items()
+            if transform in TRANSFORMS
+        }
+        return table.rows(replaced=replaced)
+    raise ValueError(f"Unsupported data processing operation: {operation}")
+
+def _typed(values):
+    """A column's values as a typed array where they allow one, else an object array"""
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind in 'biuf':
+            return values
+        values = values.tolist()  # strings, dates, ... compare as Python objects
+    kinds = set(map(type, values))
+    numeric = kinds and kinds <= {int, float, bool} and (bool not in kinds or len(kinds) == 1)
+    # Ints mixed with floats go to float64 only if none of them would be rounded
+    if numeric and (kinds != {int, float} or all(_exact_float(v) for v in values if type(v) is int)):
+        try:
+            return np.fromiter(values, dtype=float if float in kinds else kinds.pop(), count=len(values))
+        except OverflowError:
+            pass  # ints beyond 64 bits
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def _exact_float(value):
+    """Whether an int survives conversion to float64 unchanged"""
+    try:
+        return int(float(value)) == value
+    except OverflowError:
+        return False
+
+def _equal_numbers(column, value):
+    """column == value for a typed column, as exact as Python's int/float comparison"""
+    if column.dtype.kind == 'f' and isinstance(value, (int, np.integer)) and not _exact_float(value):
+        return np.zeros(len(column), dtype=bool)  # the column only holds values float64 represents
+    if column.dtype.kind in 'iu' and isinstance(value, (float, np.floating)):
+        if not float(value).is_integer():
+            return np.zeros(len(column), dtype=bool)
+        value = int(value)  # NumPy would compare in float64, rounding large ints
+    return column == value
+
+def _plain(values, selection):
+    """Selected values of a column, as a list unless it is a typed array"""
+    if selection is not None:
+        if isinstance(values, np.ndarray):
+            values = values[selection]
+        else:
+            values = [values[i] for i in selection.tolist()]
+    if isinstance(values, np.ndarray) and values.dtype == object:
+        return values.tolist()
+    return values
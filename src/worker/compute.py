@@ -0,0 +1,171 @@
+# src/worker/compute.py
+import math
+import statistics
+import numpy as np
+
+BLOCK_ELEMENTS = 1 << 22  # elements per block for reductions (32 MiB of float64)
+MATMUL_BLOCK_BYTES = 256 * 1024 * 1024  # working set for one step of a blocked matmul
+DEFAULT_HISTOGRAM_BINS = 10
+
+REDUCTIONS = ('sum', 'average', 'mean', 'min', 'max', 'std', 'histogram')
+
+def as_array(value, dtype=None):
+    """Turn inline numbers or a file reference into a typed, contiguous array.
+
+    Instead of inline numbers an input may reference an array on disk,
+    either a .npy file or raw values with their dtype and shape::
+
+        {'path': 'data.npy'}
+        {'path': 'data.bin', 'dtype': 'float32', 'shape': [4096, 4096], 'offset': 0}
+
+    Referenced arrays are memory-mapped rather than read, and the kernels
+    below walk them in blocks, so they can be larger than RAM. Integers
+    beyond 64 bits stay Python ints in an object array.
+    """
+    if isinstance(value, dict) and 'path' in value:
+        path = value['path']
+        if 'dtype' not in value:
+            return np.load(path, mmap_mode='r')
+        return np.memmap(path, dtype=np.dtype(value['dtype']), mode='r',
+                         offset=int(value.get('offset', 0)),
+                         shape=tuple(value['shape']) if 'shape' in value else None)
+    array = np.asarray(value, dtype=dtype)
+    if array.dtype == object:
+        if not all(isinstance(item, (int, float)) for item in array.reshape(-1).tolist()):
+            raise ValueError("Input must be numeric")
+        return array
+    if array.dtype.kind not in 'biufc':
+        raise ValueError("Input must be numeric")
+    return np.ascontiguousarray(array)
+
+def reduce(values, operation, bins=DEFAULT_HISTOGRAM_BINS, value_range=None):
+    """Apply a reduction from REDUCTIONS to all elements of values, block by block"""
+    array = as_array(values)
+    flat = array.reshape(-1)
+    if flat.dtype == object:
+        return _reduce_python(flat.tolist(), operation, bins, value_range)
+    if operation == 'sum':
+        if flat.dtype.kind in 'biu':
+            return _int_sum(flat)
+        return _scalar(sum(block.sum() for block in _blocks(flat)) if flat.size else array.dtype.type(0))
+    if not flat.size:
+        raise ValueError(f"{operation} of an empty input")
+    if operation in ('average', 'mean'):
+        return float(sum(block.sum(dtype=np.float64) for block in _blocks(flat))) / flat.size
+    if operation == 'std':
+        count, _, m2 = _moments(flat)
+        return math.sqrt(m2 / count)
+    if operation == 'min':
+        return _min(flat)
+    if operation == 'max':
+        return _max(flat)
+    if operation == 'histogram':
+        return _histogram(flat, bins, value_range)
+    raise ValueError(f"Unsupported operation: {operation}")
+
+def matmul(left, right, out=None, block_bytes=MATMUL_BLOCK_BYTES):
+    """Matrix product of two inputs.
+
+    Small in-memory operands go straight to np.matmul. Memory-mapped
+    operands, or an ``out`` file reference to write the product to, use a
+    blocked product that only holds a few tiles in memory at a time; with
+    ``out`` the result is returned as that reference instead of inline.
+    """
+    a = as_array(left)
+    b = as_array(right)
+    if a.ndim != 2 or b.ndim != 2 or a.shape[1] != b.shape[0]:
+        raise ValueError(f"Cannot multiply shapes {a.shape} and {b.shape}")
+    if out is None and not isinstance(a, np.memmap) and not isinstance(b, np.memmap):
+        return np.matmul(a, b)
+
+    dtype = np.result_type(a, b)
+    shape = (a.shape[0], b.shape[1])
+    if out is None:
+        product = np.empty(shape, dtype)
+    else:
+        out = dict(out, dtype=dtype.str, shape=list(shape))
+        product = np.lib.format.open_memmap(out['path'], mode='w+', dtype=dtype, shape=shape) \
+            if out['path'].endswith('.npy') else np.memmap(out['path'], dtype, 'w+', shape=shape)
+
+    # Three square tiles (a block of each operand and of the output) in budget
+    tile = max(1, int(math.sqrt(block_bytes / (3 * dtype.itemsize))))
+    for i in range(0, shape[0], tile):
+        for j in range(0, shape[1], tile):
+            acc = np.zeros((min(tile, shape[0] - i), min(tile, shape[1] - j)), dtype)
+            for k in range(0, a.shape[1], tile):
+                acc += np.asarray(a[i:i + tile, k:k + tile]) @ np.asarray(b[k:k + tile, j:j + tile])
+            product[i:i + tile, j:j + tile] = acc
+
+    if out is None:
+        return product
+    product.flush()
+    if out['path'].endswith('.npy'):
+        del out['dtype'], out['shape']  # np.load reads them from the header
+    return out
+
+def _reduce_python(values, operation, bins, value_range):
+    """reduce() with Python arithmetic, for integers that overflow int64"""
+    if operation == 'sum':
+        return sum(values)
+    if not values:
+        raise ValueError(f"{operation} of an empty input")
+    if operation in ('average', 'mean'):
+        return sum(values) / len(values)
+    if operation == 'std':
+        return statistics.pstdev(values)
+    if operation == 'min':
+        return min(values)
+    if operation == 'max':
+        return max(values)
+    if operation == 'histogram':
+        return _histogram(np.asarray(values, dtype=np.float64), bins, value_range)
+    raise ValueError(f"Unsupported operation: {operation}")
+
+def _blocks(flat):
+    for start in range(0, flat.size, BLOCK_ELEMENTS):
+        yield flat[start:start + BLOCK_ELEMENTS]
+
+def _int_sum(flat):
+    """Exact sum of an integer array as a Python int, like the builtin sum"""
+    total = 0
+    for block in _blocks(flat):
+        # int64 where the block's sum cannot overflow it, Python ints where it might
+        bound = max(abs(int(block.min())), abs(int(block.max()))) * block.size
+        total += int(block.sum(dtype=np.int64 if bound < 2 ** 63 else object))
+    return total
+
+def _min(flat):
+    return _scalar(min(block.min() for block in _blocks(flat)))
+
+def _max(flat):
+    return _scalar(max(block.max() for block in _blocks(flat)))
+
+def _moments(flat):
+    """(count, mean, sum of squared deviations), merging per-block moments (Chan et al.)"""
+    count, mean, m2 = 0, 0.0, 0.0
+    for block in _blocks(flat):
+        block = block.astype(np.float64, copy=False)
+        n = block.size
+        block_mean = float(block.mean())
+        deviations = block - block_mean
+        block_m2 = float(deviations @ deviations)
+        delta = block_mean - mean
+        total = count + n
+        mean += delta * n / total
+        m2 += block_m2 + delta * delta * count * n / total
+        count = total
+    return count, mean, m2
+
+def _histogram(flat, bins, value_range):
+    if value_range is None:
+        value_range = (_min(flat), _max(flat))
+    counts = np.zeros(bins, np.int64)
+    edges = None
+    for block in _blocks(flat):
+        block_counts, edges = np.histogram(block, bins=bins, range=value_range)
+        counts += block_counts
+    return {'counts': counts, 'edges': edges}
+
+def _scalar(value):
+    """NumPy scalar to the matching Python number"""
+    return value.item() if isinstance(value, np.generic) else value
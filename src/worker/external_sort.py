@@ -0,0 +1,171 @@
+# src/worker/external_sort.py
+import os
+import json
+import heapq
+import marshal
+import struct
+import tempfile
+from . import columnar
+
+DEFAULT_SORT_MEMORY = int(os.getenv('SORT_MEMORY', 256 * 1024 * 1024))
+DEFAULT_SORT_FAN_IN = int(os.getenv('SORT_FAN_IN', 64))
+SORT_TMPDIR = os.getenv('SORT_TMPDIR') or None
+
+# A chunk's lines, parsed records (dicts) and sort columns take about this
+# many times the size of its JSON text
+RECORD_EXPANSION = 20
+MIN_CHUNK_BYTES = 64 * 1024
+
+_U32 = struct.Struct('!I')
+_json_encoder = json.JSONEncoder()
+
+def sort_file(source, output, keys, descending=False, memory=DEFAULT_SORT_MEMORY,
+              fan_in=DEFAULT_SORT_FAN_IN, tmp_dir=SORT_TMPDIR):
+    """Sort a JSON Lines file that need not fit in memory into another one.
+
+    The input is read in chunks that fit in ``memory`` bytes once parsed.
+    Each chunk is sorted with the columnar engine and spilled to a run file
+    as length-prefixed, marshalled blocks of records (the runs are private
+    to this process, which is all marshal's format promises). The runs are
+    then merged with a heap, at most ``fan_in`` at a time, reading one block
+    per run, until one pass writes the output. Equal keys keep their input
+    order.
+
+    A generator, as a task handler: it yields progress as a fraction (the
+    first half while spilling runs, the rest once per merged run and output
+    block) and returns ``{'path': output, 'records': count, 'runs': n}``.
+    """
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    if isinstance(descending, bool):
+        descending = [descending] * len(keys)
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+    chunk_bytes = max(MIN_CHUNK_BYTES, memory // RECORD_EXPANSION)
+    block_bytes = max(1, chunk_bytes // (fan_in + 1))
+    size = os.path.getsize(source) or 1
+
+    with tempfile.TemporaryDirectory(prefix='sort-', dir=tmp_dir) as directory:
+        runs = []
+        records = 0
+        with open(source, 'rb') as f:
+            while True:
+                lines = f.readlines(chunk_bytes)
+                if not lines:
+                    break
+                chunk = [json.loads(line) for line in lines if line.strip()]
+                block = _block_records(lines, block_bytes)
+                del lines
+                # The columnar order is the one Python's comparisons give (no
+                # float64 rounding of large ints), which _merge relies on
+                table = columnar.Table(chunk)
+                chunk = table.rows(table.sort_order(keys, descending))
+                if not runs and f.tell() >= size:
+                    # It all fit in one chunk: no runs to spill or merge
+                    with open(output, 'wb') as target:
+                        _write_lines(target, chunk)
+                    yield 1.0
+                    return {'path': output, 'records': len(chunk), 'runs': 0}
+                path = os.path.join(directory, f'run-{len(runs)}')
+                _write_run(path, chunk, block)
+                runs.append(path)
+                records += len(chunk)
+                yield f.tell() / size / 2
+
+        spilled = len(runs)
+        passes, count = 1, spilled
+        while count > fan_in:
+            passes, count = passes + 1, -(-count // fan_in)
+        progress = 0.5
+        step = 0.5 / passes
+        average = sum(map(os.path.getsize, runs)) / max(records, 1)
+        block = max(1, int(block_bytes / max(average, 1)))
+
+        while len(runs) > fan_in:
+            merged = []
+            groups = [runs[i:i + fan_in] for i in range(0, len(runs), fan_in)]
+            for group in groups:
+                path = os.path.join(directory, f'run-{len(runs) + len(merged)}')
+                with open(path, 'wb') as target:
+                    for rows in _batches(_merge(group, keys, descending), block):
+                        _write_block(target, rows)
+                for consumed in group:
+                    os.remove(consumed)
+                merged.append(path)
+                progress += step / len(groups)
+                yield progress
+            runs = merged
+
+        written = 0
+        with open(output, 'wb') as target:
+            for rows in _batches(_merge(runs, keys, descending), block):
+                _write_lines(target, rows)
+                written += len(rows)
+                yield 1.0 - step * (1 - written / records)
+
+    return {'path': output, 'records': records, 'runs': spilled}
+
+class _Reversed:
+    """Sort key wrapper that orders its value descending"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def _merge(runs, keys, descending):
+    """Records of sorted runs in one sorted, stable stream"""
+    streams = [_read_run(path) for path in runs]
+    if len(keys) == 1:
+        key = keys[0]
+        sort_key = lambda record: record.get(key)
+    elif len(set(descending)) == 1:
+        sort_key = lambda record: tuple(record.get(key) for key in keys)
+    else:
+        sort_key = lambda record: tuple(
+            _Reversed(record.get(key)) if reverse else record.get(key)
+            for key, reverse in zip(keys, descending)
+        )
+    # merge(reverse=True) still takes ties from the earlier run first
+    return heapq.merge(*streams, key=sort_key, reverse=all(descending))
+
+def _read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_U32.size)
+            if not header:
+                return
+            (length,) = _U32.unpack(header)
+            yield from marshal.loads(f.read(length))
+
+def _write_run(path, records, block):
+    with open(path, 'wb') as target:
+        for start in range(0, len(records), block):
+            _write_block(target, records[start:start + block])
+
+def _write_block(target, records):
+    encoded = marshal.dumps(records)
+    target.write(_U32.pack(len(encoded)))
+    target.write(encoded)
+
+def _write_lines(target, records):
+    target.write(''.join([_json_encoder.encode(record) + '\n' for record in records]).encode())
+
+def _block_records(lines, block_bytes):
+    """Records per run block, so that a block is about block_bytes of input"""
+    average = sum(map(len, lines)) / len(lines)
+    return max(1, int(block_bytes / average))
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,163 @@
+# src/worker/file_io.py
+import os
+import mmap
+import codecs
+import threading
+from collections import OrderedDict
+
+DEFAULT_IO_CHUNK_SIZE = int(os.getenv('IO_CHUNK_SIZE', 1024 * 1024))
+MAX_IO_CHUNK_SIZE = 64 * 1024 * 1024
+# Largest range read returned inline in a task result; stream anything bigger
+MAX_INLINE_READ = int(os.getenv('IO_MAX_INLINE_READ', 64 * 1024 * 1024))
+# Files kept mapped for random-access reads, least recently used dropped first
+DEFAULT_MMAP_CACHE_SIZE = int(os.getenv('IO_MMAP_CACHE_SIZE', 16))
+
+# Bytes that continue a UTF-8 character; a character has at most three
+_CONTINUATION = bytes(range(0x80, 0xC0))
+_MAX_CONTINUATION = 3
+
+_maps = OrderedDict()  # (path, inode, size, mtime) -> mmap
+_maps_lock = threading.Lock()
+
+def file_range(path, offset=0, length=None):
+    """(offset, length) of a byte range of a file, clipped to its end"""
+    offset = int(offset or 0)
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    size = os.path.getsize(path)
+    available = max(0, size - offset)
+    length = available if length is None else min(int(length), available)
+    if length < 0:
+        raise ValueError("length must not be negative")
+    return offset, length
+
+def read(path, offset=0, length=None, binary=False, use_mmap=False, max_bytes=None):
+    """Bytes (binary) or UTF-8 text of a byte range of a file, at most max_bytes long.
+
+    Text ranges are moved to character boundaries (see _char_bounds), so
+    they never split a character.
+    """
+    start, count = file_range(path, offset, length)
+    max_bytes = MAX_INLINE_READ if max_bytes is None else max_bytes
+    if count > max_bytes:
+        raise ValueError(f"Reading {count} bytes inline exceeds the {max_bytes} byte limit; "
+                         f"stream the file or read a smaller length")
+    if not binary and not use_mmap and not offset and length is None:
+        with open(path, 'r') as f:  # a whole text file, with universal newlines as before
+            return f.read()
+
+    # Text reads fetch the bytes that may complete the last character too
+    size = count if binary else count + _MAX_CONTINUATION
+    if use_mmap and count:
+        content = _mapped(path)[start:start + size]
+    else:
+        with open(path, 'rb') as f:
+            f.seek(start)
+            content = f.read(size)
+    if binary:
+        return content
+    head, tail = content[:min(count, _MAX_CONTINUATION)], content[count:]
+    return content[slice(*_char_bounds(0, count, head, tail))].decode('utf-8')
+
+def read_chunks(path, offset=0, length=None, chunk_size=DEFAULT_IO_CHUNK_SIZE, binary=False, use_mmap=False):
+    """Yield (byte offset, content) for consecutive chunks of a byte range of a file.
+
+    Only one chunk is held at a time, however large the file. Text is
+    decoded incrementally, so a character split between two chunks comes
+    out whole in the second one, and the range is moved to character
+    boundaries as in read.
+    """
+    start, count = file_range(path, offset, length)
+    chunk_size = min(max(1, int(chunk_size)), MAX_IO_CHUNK_SIZE)
+    decoder = None if binary else codecs.getincrementaldecoder('utf-8')()
+    end = start + count
+    with open(path, 'rb') as f:
+        if decoder is not None and count:
+            f.seek(start)
+            head = f.read(min(count, _MAX_CONTINUATION))
+            f.seek(end)
+            start, end = _char_bounds(start, end, head, f.read(_MAX_CONTINUATION))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap and count else None
+        try:
+            if mapped is None:
+                f.seek(start)
+            position = start
+            while position < end:
+                size = min(chunk_size, end - position)
+                content = mapped[position:position + size] if mapped is not None else f.read(size)
+                if not content:
+                    break  # the file shrank while we read it
+                final = position + len(content) >= end
+                yield position, content if decoder is None else decoder.decode(content, final)
+                position += len(content)
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+def _char_bounds(start, end, head, tail):
+    """Move the byte range [start, end) to UTF-8 character boundaries.
+
+    head holds the range's first bytes and tail the bytes after it. A
+    character belongs to the range its first byte is in: bytes continuing
+    one that began earlier are skipped, and one that starts in the range is
+    completed past its end. Ranges that split a file between them decode to
+    text that joins back up.
+    """
+    start += len(head) - len(head.lstrip(_CONTINUATION))
+    if start < end:
+        end += len(tail) - len(tail.lstrip(_CONTINUATION))
+    return start, end
+
+def _mapped(path):
+    """A read-only map of a file, reused across reads until the file changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _maps_lock:
+        mapped = _maps.get(key)
+        if mapped is not None:
+            _maps.move_to_end(key)
+            return mapped
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with _maps_lock:
+        _maps[key] = mapped
+        while len(_maps) > DEFAULT_MMAP_CACHE_SIZE:
+            # Not closed here: a read in another thread may still be slicing
+            # it; it closes when the last reference goes
+            _maps.popitem(last=False)
+    return mapped
+
+def write(path, content, offset=None, append=False, binary=False):
+    """Write content to a file, returns the number of bytes written.
+
+    Without offset or append the file is replaced, as before. With append
+    the content goes to the end of the file, and with offset to that
+    position (the file is created if needed and not truncated), so the
+    chunks of a large upload can be written by separate tasks in any
+    order. Binary content sent by a JSON client arrives as a latin-1
+    string and is turned back into bytes.
+    """
+    if offset is None and not append and not binary and isinstance(content, str):
+        with open(path, 'w') as f:
+            f.write(content)
+            return f.tell()
+
+    if isinstance(content, str):
+        content = content.encode('latin-1' if binary else 'utf-8')
+    elif isinstance(content, memoryview):
+        content = content.cast('B')
+
+    if offset is not None:
+        position = int(offset)
+        if position < 0:
+            raise ValueError("offset must not be negative")
+        # r+b without truncating, creating the file if no other chunk has yet
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        with open(os.open(path, flags, 0o644), 'r+b') as f:
+            f.seek(position)
+            f.write(content)
+        return len(content)
+
+    with open(path, 'ab' if append else 'wb') as f:
+        f.write(content)
+    return len(content)
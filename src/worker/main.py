@@ -1,35 +1,78 @@
 import os
-import ssl
+import itertools
+import queue
 import socket
 import threading
-import json
 import time
 from dotenv import load_dotenv
-from ..utils.crypto import encrypt_message, decrypt_message
+from ..utils.crypto import (
+    encrypt_message, decrypt_message, client_ssl_context, offered_envelopes, FERNET_ENVELOPE
+)
+from ..utils.framing import FrameDecoder, send_frame
+from ..utils.codec import encode_message, decode_message, OFFERED_CODECS, JSON
 from .task_executor import TaskExecutor
 
 load_dotenv()
 
+DEFAULT_PREFETCH = 32
+DEFAULT_LEASE_TIME = 30.0
+ACK_BATCH_SIZE = 64
+ACK_INTERVAL = 0.05
+IDLE_POLL_INTERVAL = 0.1
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+
 class WorkerNode:
     def __init__(self):
         self.host = os.getenv('SERVER_HOST', 'localhost')
         self.port = int(os.getenv('SERVER_PORT', 5000))
         self.worker_id = os.getenv('WORKER_ID', f'worker-{os.getpid()}')
-        self.task_executor = TaskExecutor()
+        self.username = os.getenv('WORKER_USERNAME', 'worker')
+        self.password = os.getenv('WORKER_PASSWORD', 'worker123')
+        self.codec = JSON
+        self.envelope = FERNET_ENVELOPE
+        self.tls_verified = False
+        self.slots = max(1, int(os.getenv('WORKER_SLOTS', os.cpu_count() or 1)))
+        self.task_executor = TaskExecutor(self.slots)
         self.running = True
-        self.current_task = None
+        # Up to `slots` tasks run at once, each taking a slot until it finishes
+        self.free_slots = threading.Semaphore(self.slots)
+        self.running_tasks = {}  # task_id -> task data
         self.use_ssl = False  # Toggle this to True when using SSL in production
+        self.decoder = FrameDecoder()
+        self.send_lock = threading.Lock()
+
+        # Leased tasks wait in a local buffer so the next one is ready
+        # without a round trip; results go back in batches
+        self.prefetch = max(1, int(os.getenv('WORKER_PREFETCH', max(DEFAULT_PREFETCH, 2 * self.slots))))
+        self.lease_time = float(os.getenv('WORKER_LEASE_TIME', DEFAULT_LEASE_TIME))
+        self.buffer = queue.Queue()
+        self.acks = []
+        self.ack_lock = threading.Lock()
+        self.leased = set()
+        self.lease_lock = threading.Lock()
+        # request_id of the lease request awaiting its reply; a reply that
+        # never comes only holds up the next request for lease_time seconds
+        self.lease_request = None
+        self.lease_requested_at = 0
+        self.lease_ids = itertools.count(1)
+        self.next_lease_at = 0
+        
+        # Any message tells the server we are alive, so a heartbeat is only
+        # sent after heartbeat_interval seconds without other traffic
+        self.heartbeat_interval = float(
+            os.getenv('WORKER_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL)
+        )
+        self.last_sent = time.monotonic()
         
     def connect(self):
         try:
             # Create socket
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             if self.use_ssl:
-                # SSL configuration for production
-                self.ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-                self.ssl_context.check_hostname = False
-                self.ssl_context.verify_mode = ssl.CERT_NONE
+                # SSL configuration for production; TLS_CA_FILE turns on verification
+                self.ssl_context, self.tls_verified = client_ssl_context()
                 self.connection = self.ssl_context.wrap_socket(
                     self.socket,
                     server_hostname=self.host
@@ -40,13 +83,15 @@ class WorkerNode:
             
             # Connect to server
             self.connection.connect((self.host, self.port))
+            self.authenticate()
             
             # Register with server
             registration_data = {
                 'type': 'register_worker',
                 'worker_info': {
                     'id': self.worker_id,
-                    'capabilities': self.task_executor.get_capabilities()
+                    'capabilities': self.task_executor.get_capabilities(),
+                    'capacity': self.slots
                 }
             }
             self.send_message(registration_data)
@@ -58,6 +103,30 @@ class WorkerNode:
             print(f"Connection failed: {e}")
             return False
             
+    def authenticate(self):
+        """Log in and switch to the message codec and envelope the server picked"""
+        self.codec = JSON
+        self.envelope = FERNET_ENVELOPE
+        self.send_message({
+            'type': 'auth',
+            'username': self.username,
+            'password': self.password,
+            'codecs': list(OFFERED_CODECS),
+            'envelopes': offered_envelopes(self.use_ssl and self.tls_verified)
+        })
+        
+        frames = []
+        while not frames:
+            frames = self.decoder.read_from(self.connection)
+            if frames is None:
+                raise ConnectionError("Server closed the connection during login")
+        
+        response = decode_message(decrypt_message(frames[0]))
+        if response.get('status') != 'success':
+            raise Exception(response.get('message', 'Authentication failed'))
+        self.codec = response.get('codec', JSON)
+        self.envelope = response.get('envelope', FERNET_ENVELOPE)
+            
     def start(self):
         if not self.connect():
             return
@@ -69,92 +138,172 @@ class WorkerNode:
         heartbeat_thread.daemon = True
         heartbeat_thread.start()
         
-        # Main work loop
+        # Keep leases on buffered tasks alive
+        lease_thread = threading.Thread(target=self.renew_leases)
+        lease_thread.daemon = True
+        lease_thread.start()
+        
+        # Set up progress callback
+        def progress_callback(task_id, status, progress):
+            self.send_status_update(task_id, status, progress)
+        
+        self.task_executor.update_callback = progress_callback
+        self.task_executor.chunk_callback = self.send_chunk
+        
+        # Start tasks from the buffer as slots free up
+        execution_thread = threading.Thread(target=self.run_tasks)
+        execution_thread.daemon = True
+        execution_thread.start()
+        
+        # Main loop reads server messages
         while self.running:
             try:
-                # Request new task if not currently working
-                if not self.current_task:
-                    self.request_task()
-                
-                # Process server messages
                 self.process_server_messages()
                 
-                time.sleep(0.1)  # Prevent CPU hogging
-                
             except Exception as e:
                 print(f"Error in work loop: {e}")
                 time.sleep(5)  # Wait before retry
                 
-    def request_task(self):
-        request = {
-            'type': 'request_task',
-            'worker_id': self.worker_id
-        }
-        self.send_message(request)
+    def request_tasks(self):
+        """Lease enough tasks to refill the buffer, unless a request is in flight"""
+        now = time.monotonic()
+        if now < self.next_lease_at:
+            return
+        if self.lease_request is not None and now - self.lease_requested_at < self.lease_time:
+            return
+        self.lease_request = f'lease-{next(self.lease_ids)}'
+        self.lease_requested_at = now
+        self.send_message({
+            'type': 'lease_tasks',
+            'request_id': self.lease_request,
+            'worker_id': self.worker_id,
+            'count': self.prefetch - self.buffer.qsize(),
+            'lease_time': self.lease_time
+        })
         
     def process_server_messages(self):
         try:
-            data = self.connection.recv(4096)
-            if not data:
+            frames = self.decoder.read_from(self.connection)
+            if frames is None:
+                print("Server closed the connection")
+                self.running = False
                 return
             
-            message = json.loads(decrypt_message(data).decode())
-            
-            if message['type'] == 'task_assignment':
-                self.handle_task_assignment(message['task'])
-            elif message['type'] == 'cancel_task':
-                self.handle_task_cancellation(message['task_id'])
+            for data in frames:
+                message = decode_message(decrypt_message(data, self.envelope))
+                
+                if message.get('type') == 'task_lease':
+                    if not message['tasks']:
+                        # Nothing to do: back off before asking again
+                        self.next_lease_at = time.monotonic() + IDLE_POLL_INTERVAL
+                    self.receive_tasks(message['tasks'])
+                    self._lease_answered(message)
+                elif message.get('request_id') is not None and message.get('request_id') == self.lease_request:
+                    # The lease request failed; ask again after a pause
+                    print(f"Lease request failed: {message.get('message')}")
+                    self.next_lease_at = time.monotonic() + IDLE_POLL_INTERVAL
+                    self._lease_answered(message)
+                elif message.get('type') == 'task_assignment':
+                    self.receive_tasks([message['task']])
+                elif message.get('type') == 'cancel_task':
+                    self.handle_task_cancellation(message['task_id'])
                 
         except socket.timeout:
             pass
         except Exception as e:
             print(f"Error processing message: {e}")
             
-    def handle_task_assignment(self, task_data):
-        self.current_task = task_data
-        
-        # Set up progress callback
-        def progress_callback(task_id, status, progress):
-            self.send_status_update(task_id, status, progress)
-        
-        self.task_executor.update_callback = progress_callback
-        
-        # Execute task in separate thread
-        execution_thread = threading.Thread(
-            target=self.execute_task,
-            args=(task_data,)
-        )
-        execution_thread.start()
-        
-    def execute_task(self, task_data):
-        try:
-            # Execute the task
-            result = self.task_executor.execute_task(task_data)
+    def _lease_answered(self, message):
+        # Replies to requests that already timed out leave the current one alone
+        if message.get('request_id') in (None, self.lease_request):
+            self.lease_request = None
+
+    def receive_tasks(self, tasks):
+        with self.lease_lock:
+            self.leased.update(task['id'] for task in tasks)
+        for task in tasks:
+            self.buffer.put(task)
             
-            # Send result back to server
-            self.send_task_result(task_data['id'], result)
+    def run_tasks(self):
+        """Start buffered tasks in free slots, topping up the buffer and flushing acks in batches"""
+        last_flush = time.monotonic()
+        while self.running:
+            try:
+                if self.buffer.qsize() <= self.prefetch // 2:
+                    self.request_tasks()
+                
+                task_data = None
+                if self.free_slots.acquire(timeout=ACK_INTERVAL):
+                    try:
+                        task_data = self.buffer.get(timeout=ACK_INTERVAL)
+                    except queue.Empty:
+                        self.free_slots.release()
+                
+                if task_data is not None:
+                    self.execute_task(task_data)
+                
+                now = time.monotonic()
+                with self.ack_lock:
+                    pending = len(self.acks)
+                if pending and (pending >= ACK_BATCH_SIZE or self.buffer.empty()
+                                or now - last_flush >= ACK_INTERVAL):
+                    self.flush_acks()
+                    last_flush = now
+                    
+            except Exception as e:
+                print(f"Error running tasks: {e}")
+                time.sleep(5)
             
+    def execute_task(self, task_data):
+        """Start one task in the slot taken for it; its outcome joins the next ack batch"""
+        self.running_tasks[task_data['id']] = task_data
+        try:
+            future = self.task_executor.submit(task_data)
         except Exception as e:
-            self.send_task_failure(task_data['id'], str(e))
-            
-        finally:
-            self.current_task = None
+            self.finish_task(task_data, {'task_id': task_data['id'], 'error': str(e)})
+            return
+        future.add_done_callback(lambda future: self.finish_task(task_data, _outcome(task_data, future)))
+
+    def finish_task(self, task_data, outcome):
+        self.running_tasks.pop(task_data['id'], None)
+        with self.ack_lock:
+            self.acks.append(outcome)
+        self.free_slots.release()
+        if self.buffer.empty():
+            # Nothing else queued to batch it with: don't leave the result waiting
+            try:
+                self.flush_acks()
+            except Exception as e:
+                print(f"Error sending results: {e}")
             
-    def send_task_result(self, task_id, result):
-        message = {
-            'type': 'task_complete',
-            'task_id': task_id,
-            'result': result
-        }
-        self.send_message(message)
+    def flush_acks(self):
+        with self.ack_lock:
+            batch, self.acks = self.acks, []
+        if not batch:
+            return
+        with self.lease_lock:
+            self.leased.difference_update(outcome['task_id'] for outcome in batch)
+        self.send_message({
+            'type': 'ack_tasks',
+            'worker_id': self.worker_id,
+            'results': batch
+        })
         
-    def send_task_failure(self, task_id, error):
-        message = {
-            'type': 'task_failed',
-            'task_id': task_id,
-            'error': error
-        }
-        self.send_message(message)
+    def renew_leases(self):
+        while self.running:
+            time.sleep(self.lease_time / 3)
+            try:
+                with self.lease_lock:
+                    task_ids = list(self.leased)
+                if task_ids:
+                    self.send_message({
+                        'type': 'renew_leases',
+                        'worker_id': self.worker_id,
+                        'task_ids': task_ids,
+                        'lease_time': self.lease_time
+                    })
+            except Exception as e:
+                print(f"Error renewing leases: {e}")
         
     def send_status_update(self, task_id, status, progress=None):
         message = {
@@ -165,29 +314,60 @@ class WorkerNode:
         }
         self.send_message(message)
         
+    def send_chunk(self, task_id, offset, data):
+        """Send a piece of a streamed result; blocks while the connection is backed up"""
+        self.send_message({
+            'type': 'task_chunk',
+            'worker_id': self.worker_id,
+            'task_id': task_id,
+            'offset': offset,
+            'data': data
+        })
+        
     def send_heartbeat(self):
         while self.running:
             try:
+                idle = time.monotonic() - self.last_sent
+                if idle < self.heartbeat_interval:
+                    time.sleep(self.heartbeat_interval - idle)
+                    continue
                 message = {
                     'type': 'heartbeat',
                     'worker_id': self.worker_id,
                     'status': 'alive',
-                    'current_task': self.current_task
+                    'current_tasks': list(self.running_tasks),
+                    'free_slots': self.slots - len(self.running_tasks)
                 }
                 self.send_message(message)
-                time.sleep(30)  # Send heartbeat every 30 seconds
             except Exception as e:
                 print(f"Error sending heartbeat: {e}")
+                time.sleep(self.heartbeat_interval)
                 
     def send_message(self, message):
-        encrypted_message = encrypt_message(json.dumps(message).encode())
-        self.connection.send(encrypted_message)
+        encrypted_message = encrypt_message(encode_message(message, self.codec), self.envelope)
+        # Heartbeats, results and requests come from different threads
+        with self.send_lock:
+            send_frame(self.connection, encrypted_message)
+            self.last_sent = time.monotonic()
         
     def stop(self):
         self.running = False
+        self.task_executor.shutdown(wait=False)
         if hasattr(self, 'connection'):
+            try:
+                # Wakes the message loop, which is blocked reading the socket
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.connection.close()
 
+def _outcome(task_data, future):
+    """The ack entry for a finished task future"""
+    try:
+        return {'task_id': task_data['id'], 'result': future.result()}
+    except Exception as e:
+        return {'task_id': task_data['id'], 'error': str(e)}
+
 if __name__ == "__main__":
     worker = WorkerNode()
     try:
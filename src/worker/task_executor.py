@@ -1,45 +1,137 @@
+# src/worker/task_executor.py
+import os
 import time
 import json
+import inspect
+import threading
 import multiprocessing
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from . import compute, columnar, external_sort, file_io
+
+DEFAULT_PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', 0.5))
+DEFAULT_PROGRESS_MIN_DELTA = int(os.getenv('PROGRESS_MIN_DELTA', 5))
+
+# Pure-Python handlers hold the GIL, so these task types run in worker
+# processes; everything else (I/O) runs on threads
+CPU_BOUND_TYPES = ('computation', 'data_processing')
+
+class ProgressReporter:
+    """Forward a task's progress to the worker, rate limited.
+
+    An update is sent only once ``interval`` seconds have passed since the
+    last one (or since the task started) and progress has moved by at least
+    ``min_delta`` percent, so tasks that finish within the first interval
+    send no progress at all; the final ack marks them complete.
+    """
+
+    def __init__(self, callback, task_id, interval=DEFAULT_PROGRESS_INTERVAL,
+                 min_delta=DEFAULT_PROGRESS_MIN_DELTA, clock=time.monotonic):
+        self.callback = callback
+        self.task_id = task_id
+        self.interval = interval
+        self.min_delta = min_delta
+        self.clock = clock
+        self.last_sent_at = clock()
+        self.last_progress = 0
+
+    def report(self, fraction):
+        """Note that the task is fraction (0..1) done; returns True if an update was sent"""
+        progress = int(min(max(fraction, 0.0), 1.0) * 100)
+        if self.callback is None or progress - self.last_progress < self.min_delta:
+            return False
+        now = self.clock()
+        if now - self.last_sent_at < self.interval:
+            return False
+        self.callback(self.task_id, 'running', progress)
+        self.last_sent_at = now
+        self.last_progress = progress
+        return True
+
+class ResultChunk:
+    """A piece of a task's result that a handler yields to send it on before returning"""
+    __slots__ = ('offset', 'data')
+
+    def __init__(self, offset, data):
+        self.offset = offset
+        self.data = data
 
 class TaskExecutor:
-    def __init__(self):
-        self.executor = ThreadPoolExecutor(
-            max_workers=multiprocessing.cpu_count()
-        )
+    """Runs tasks on ``slots`` threads and ``slots`` processes.
+
+    On a multi-core machine ``submit`` sends CPU-bound task types to a
+    process pool, where each process runs them on its own instance of this
+    class (so handlers must be defined on the class, not patched onto an
+    instance); everything else goes to a thread pool. Progress from the
+    processes comes back over a queue and is passed to update_callback
+    (and result chunks to chunk_callback) in this process. Both pools are
+    only started when first needed.
+    """
+
+    def __init__(self, slots=None):
+        self.slots = slots or multiprocessing.cpu_count()
         self.task_handlers = {
             'computation': self.handle_computation,
             'io_operation': self.handle_io_operation,
             'data_processing': self.handle_data_processing
         }
+        # Shipping a task to another process only pays off with cores to spread over
+        self.cpu_bound = set(CPU_BOUND_TYPES) if multiprocessing.cpu_count() > 1 else set()
         self.update_callback = None
+        self.chunk_callback = None  # (task_id, offset, data) for streamed results
+        self.executor = None  # threads, for I/O-bound tasks
+        self.processes = None  # processes, for CPU-bound tasks
+        self.progress_queue = None
+        self.pool_lock = threading.Lock()
         
+
     def get_capabilities(self):
         return list(self.task_handlers.keys())
 
+    def submit(self, task_data):
+        """Start a task on the pool that suits its type; returns a Future for the result"""
+        if task_data['type'] in self.cpu_bound:
+            return self._process_pool().submit(_execute_in_process, task_data)
+        return self._thread_pool().submit(self.execute_task, task_data)
+
+    def shutdown(self, wait=True):
+        with self.pool_lock:
+            executor, self.executor = self.executor, None
+            processes, self.processes = self.processes, None
+        if executor:
+            executor.shutdown(wait=wait)
+        if processes:
+            processes.shutdown(wait=wait)
+            self.progress_queue.put(None)  # Stops the relay thread
+
     def execute_task(self, task_data):
-        """Execute task and report progress"""
+        """Execute task and report progress.
+
+        A handler either returns its result, or is a generator that yields
+        its progress as fractions between 0 and 1 and returns the result;
+        the yielded progress is passed on to update_callback, rate limited
+        by a ProgressReporter. A generator can also yield ResultChunks,
+        which go to chunk_callback as they come.
+        """
         try:
             task_type = task_data['type']
             if task_type not in self.task_handlers:
                 raise ValueError(f"Unsupported task type: {task_type}")
                 
             handler = self.task_handlers[task_type]
-            
-            # Simulate progress updates
-            total_steps = 10
-            for step in range(total_steps):
-                # Do actual work
-                if step == total_steps - 1:
-                    result = handler(task_data['data'])
-                
-                # Send progress update through worker's socket connection
-                progress = int((step + 1) / total_steps * 100)
-                if self.update_callback:
-                    self.update_callback(task_data['id'], 'running', progress)
-                time.sleep(0.5)  # Simulate work
+            result = handler(task_data['data'])
+            if inspect.isgenerator(result):
+                reporter = ProgressReporter(self.update_callback, task_data.get('id'))
+                while True:
+                    try:
+                        update = next(result)
+                    except StopIteration as done:
+                        result = done.value
+                        break
+                    if isinstance(update, ResultChunk):
+                        if self.chunk_callback:
+                            self.chunk_callback(task_data.get('id'), update.offset, update.data)
+                    else:
+                        reporter.report(update)
                 
             return result
             
@@ -50,17 +142,19 @@ class TaskExecutor:
         """Handle computational tasks like mathematical operations"""
         try:
             operation = data.get('operation', 'sum')
-            numbers = data.get('numbers', [])
             
-            if operation == 'sum':
-                return {'result': sum(numbers)}
-            elif operation == 'average':
-                return {'result': sum(numbers) / len(numbers)}
-            elif operation == 'matrix_multiply':
-                matrix1 = np.array(data.get('matrix1'))
-                matrix2 = np.array(data.get('matrix2'))
-                result = np.matmul(matrix1, matrix2)
-                return {'result': result.tolist()}
+            if operation == 'matrix_multiply':
+                # Arrays arrive as ndarrays over the binary codec, as lists
+                # from JSON clients, or as references to files to map
+                result = compute.matmul(data.get('matrix1'), data.get('matrix2'), out=data.get('output'))
+                return {'result': result}
+            elif operation in compute.REDUCTIONS:
+                result = compute.reduce(
+                    data.get('numbers', []), operation,
+                    bins=data.get('bins', compute.DEFAULT_HISTOGRAM_BINS),
+                    value_range=data.get('range')
+                )
+                return {'result': result}
             else:
                 raise ValueError(f"Unsupported operation: {operation}")
                 
@@ -73,13 +167,19 @@ class TaskExecutor:
             operation = data.get('operation')
             
             if operation == 'read':
-                with open(data['filename'], 'r') as f:
-                    content = f.read()
+                if data.get('stream'):
+                    return self._stream_file(data)
+                content = file_io.read(
+                    data['filename'], data.get('offset', 0), data.get('length'),
+                    binary=data.get('binary', False), use_mmap=data.get('mmap', False)
+                )
                 return {'content': content}
                 
             elif operation == 'write':
-                with open(data['filename'], 'w') as f:
-                    f.write(data['content'])
+                file_io.write(
+                    data['filename'], data['content'], offset=data.get('offset'),
+                    append=data.get('append', False), binary=data.get('binary', False)
+                )
                 return {'status': 'success'}
                 
             else:
@@ -88,43 +188,91 @@ class TaskExecutor:
         except Exception as e:
             raise Exception(f"I/O error: {str(e)}")
             
+    def _stream_file(self, data):
+        """Read a file range chunk by chunk, yielding each as a ResultChunk"""
+        try:
+            offset, length = file_io.file_range(data['filename'], data.get('offset', 0), data.get('length'))
+            chunk_size = int(data.get('chunk_size', file_io.DEFAULT_IO_CHUNK_SIZE))
+            total = max(1, -(-length // chunk_size))
+            chunks = 0
+            for chunk_offset, content in file_io.read_chunks(
+                data['filename'], offset, length, chunk_size,
+                binary=data.get('binary', False), use_mmap=data.get('mmap', False)
+            ):
+                yield ResultChunk(chunk_offset, content)
+                chunks += 1
+                yield chunks / total
+            return {'offset': offset, 'length': length, 'chunks': chunks}
+        except Exception as e:
+            raise Exception(f"I/O error: {str(e)}")
+
     def handle_data_processing(self, data):
         """Handle data processing tasks like filtering, sorting, etc."""
         try:
             operation = data.get('operation')
             input_data = data.get('data', [])
-            
-            if operation == 'sort':
-                return {
-                    'result': sorted(
-                        input_data,
-                        key=lambda x: x.get(data.get('key', 'id'))
-                    )
-                }
-                
-            elif operation == 'filter':
-                condition = data.get('condition', {})
-                filtered = [
-                    item for item in input_data
-                    if all(item.get(k) == v for k, v in condition.items())
-                ]
-                return {'result': filtered}
-                
-            elif operation == 'transform':
-                transformation = data.get('transformation', {})
-                transformed = []
-                for item in input_data:
-                    new_item = item.copy()
-                    for key, transform in transformation.items():
-                        if transform == 'uppercase':
-                            new_item[key] = str(new_item.get(key, '')).upper()
-                        elif transform == 'lowercase':
-                            new_item[key] = str(new_item.get(key, '')).lower()
-                    transformed.append(new_item)
-                return {'result': transformed}
-                
-            else:
-                raise ValueError(f"Unsupported data processing operation: {operation}")
-                
+            if operation == 'sort' and isinstance(input_data, dict) and 'path' in input_data:
+                return self._sort_file(input_data['path'], data)
+            return {'result': columnar.process(input_data, operation, data)}
         except Exception as e:
-            raise Exception(f"Data processing error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Data processing error: {str(e)}")
+
+    def _sort_file(self, path, data):
+        """External sort of a JSON Lines file on the worker's disk into data['output']"""
+        try:
+            output = data.get('output')
+            if not isinstance(output, dict) or 'path' not in output:
+                raise ValueError("Sorting a file needs an output file reference")
+            result = yield from external_sort.sort_file(
+                path, output['path'], data.get('key', 'id'), data.get('descending', False),
+                memory=int(data.get('memory', external_sort.DEFAULT_SORT_MEMORY))
+            )
+            return {'result': result}
+        except Exception as e:
+            raise Exception(f"Data processing error: {str(e)}")
+
+    def _thread_pool(self):
+        with self.pool_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.slots, thread_name_prefix='task-io')
+            return self.executor
+
+    def _process_pool(self):
+        with self.pool_lock:
+            if self.processes is None:
+                self.progress_queue = multiprocessing.Queue()
+                self.processes = ProcessPoolExecutor(
+                    self.slots,
+                    initializer=_init_process,
+                    initargs=(type(self), self.progress_queue)
+                )
+                threading.Thread(
+                    target=self._relay_progress,
+                    args=(self.progress_queue,),
+                    name='task-progress',
+                    daemon=True
+                ).start()
+            return self.processes
+
+    def _relay_progress(self, progress_queue):
+        """Pass progress and chunks from worker processes on to the callbacks of the same name"""
+        while True:
+            update = progress_queue.get()
+            if update is None:
+                return
+            name, args = update
+            callback = getattr(self, name)
+            if callback:
+                callback(*args)
+
+_process_executor = None
+
+def _init_process(executor_class, progress_queue):
+    """Set up a pool process with its own executor that reports progress over progress_queue"""
+    global _process_executor
+    _process_executor = executor_class()
+    _process_executor.update_callback = lambda *update: progress_queue.put(('update_callback', update))
+    _process_executor.chunk_callback = lambda *chunk: progress_queue.put(('chunk_callback', chunk))
+
+def _execute_in_process(task_data):
+    return _process_executor.execute_task(task_data)
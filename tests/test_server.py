@@ -1,7 +1,24 @@
 import pytest
+import asyncio
 import json
+import socket
+import ssl
+import threading
+import time
+from src.server import main as server_main
 from src.server.main import DistributedServer
 from src.server.task_manager import TaskManager
+from src.server.task_queue import TaskQueue
+from src.server.task_store import WalTaskStore
+from src.server.worker_registry import WorkerRegistry
+from src.server.timing_wheel import TimingWheel
+from src.server.auth import AuthManager, TOKEN_LIFETIME
+from src.server.result_cache import ResultCache, cache_key
+from src.utils.crypto import encrypt_message, decrypt_message
+from src.utils.framing import send_frame, iter_frames
+from src.client.client import TaskClient
+from src.client.futures import TaskFailedError, as_completed, wait_all
+from src.client.async_client import AsyncTaskClient
 
 @pytest.fixture
 def server():
@@ -22,4 +39,579 @@ def test_task_submission(server):
     task_id = server.task_manager.submit_task(task_data)
     assert task_id is not None
     status = server.task_manager.get_task_status(task_id)
-    assert status['status'] == 'pending'
\ No newline at end of file
+    assert status['status'] == 'pending'
+
+def test_task_queue_orders_by_priority_then_submit_time():
+    queue = TaskQueue(aging_interval=None)
+    queue.push('low', 3, submitted_at=0)
+    queue.push('high-late', 1, submitted_at=2)
+    queue.push('high-early', 1, submitted_at=1)
+    assert [queue.pop() for _ in range(3)] == ['high-early', 'high-late', 'low']
+    assert queue.pop() is None
+
+def test_task_queue_aging_and_reprioritize():
+    queue = TaskQueue(aging_interval=10)
+    queue.push('old-low', 3, submitted_at=0)
+    queue.push('new-high', 1, submitted_at=25)
+    # 25s of waiting is worth 2.5 levels, so the old low-priority task wins
+    assert queue.peek() == 'old-low'
+
+    assert queue.reprioritize('new-high', 0)
+    assert queue.pop() == 'new-high'
+    assert queue.remove('old-low')
+    assert len(queue) == 0
+
+def test_task_manager_dispatches_by_priority():
+    manager = TaskManager(dispatch_threads=0)
+    low = manager.submit_task({'type': 'computation', 'data': {}}, priority=3)
+    high = manager.submit_task({'type': 'computation', 'data': {}}, priority=1)
+    assert manager.next_task() == high
+    assert manager.get_task_status(high)['status'] == 'running'
+    assert manager.get_task_status(low)['status'] == 'pending'
+
+def test_equal_keys_leave_queues_of_different_types_in_submit_order():
+    manager = TaskManager(dispatch_threads=0, aging_interval=0)
+    order = [manager.submit_task({'type': task_type}) for task_type in ('b', 'a', 'a', 'b')]
+    assert [manager.next_task() for _ in order] == order
+    manager.stop()
+
+def test_worker_registry_picks_least_loaded_capable_worker():
+    registry = WorkerRegistry()
+    registry.register({'id': 'small', 'capabilities': ['computation'], 'capacity': 1})
+    registry.register({'id': 'big', 'capabilities': ['computation', 'io'], 'capacity': 4})
+    assert registry.least_loaded('io') == 'big'
+    registry.adjust_load('big', 1)
+    assert registry.least_loaded('computation') == 'small'
+    registry.adjust_load('small', 1)
+    assert registry.least_loaded('computation') == 'big'
+    registry.adjust_load('big', 3)
+    assert registry.least_loaded('computation') is None
+    assert registry.least_loaded('unknown') is None
+
+def test_heartbeat_free_slots_set_the_worker_load():
+    manager = TaskManager(dispatch_threads=0)
+    manager.register_worker({'id': 'w1', 'capabilities': ['computation'], 'capacity': 2})
+    manager.report_load('w1', 0)  # busy with work the server no longer counts
+    assert manager.workers.least_loaded('computation') is None
+    manager.report_load('w1', 2)
+    assert manager.workers.get('w1')['load'] == 0
+    manager.submit_task({'type': 'computation'})
+    assert len(manager.lease_tasks('w1', 1)) == 1
+    manager.report_load('w1', 2)  # a leased task not started yet still counts
+    assert manager.workers.get('w1')['load'] == 1
+    manager.stop()
+
+def test_task_manager_pushes_to_workers_and_requeues_on_disconnect():
+    manager = TaskManager(dispatch_threads=0)
+    pushed = []
+    manager.register_worker({'id': 'w1', 'capabilities': ['computation']}, pushed.append)
+    first = manager.submit_task({'type': 'computation', 'data': {}})
+    second = manager.submit_task({'type': 'computation', 'data': {}})
+    assert [m['task']['id'] for m in pushed] == [first]
+    assert manager.get_task_status(second)['status'] == 'pending'
+
+    # Finishing frees the slot, which is filled straight away
+    manager.complete_task(first, result=6)
+    assert manager.get_task_status(first)['result'] == 6
+    assert [m['task']['id'] for m in pushed] == [first, second]
+
+    manager.unregister_worker('w1')
+    assert manager.get_task_status(second)['status'] == 'pending'
+    assert manager.request_task('w1') is None
+
+def test_task_manager_leases_acks_and_expires():
+    manager = TaskManager(dispatch_threads=0)
+    manager.register_worker({'id': 'w1', 'capabilities': ['computation']})
+    manager.register_worker({'id': 'w2', 'capabilities': ['computation']})
+    task_ids = [manager.submit_task({'type': 'computation', 'data': {}}) for _ in range(3)]
+
+    leased = manager.lease_tasks('w1', 2, lease_time=10)
+    assert [task['id'] for task in leased] == task_ids[:2]
+    assert manager.ack_tasks('w1', [
+        {'task_id': task_ids[0], 'result': 1},
+        {'task_id': task_ids[1], 'error': 'boom'}
+    ]) == 2
+    assert manager.get_task_status(task_ids[0])['status'] == 'completed'
+    assert manager.get_task_status(task_ids[1])['status'] == 'failed'
+
+    # An expired lease goes back to the queue and a late ack is ignored
+    [task] = manager.lease_tasks('w1', 5, lease_time=10)
+    assert manager.renew_leases('w2', [task['id']]) == []
+    assert manager.expire_leases(now=time.time() + 20) == [task['id']]
+    assert [t['id'] for t in manager.lease_tasks('w2', 5)] == [task['id']]
+    assert manager.ack_tasks('w1', [{'task_id': task['id'], 'result': 1}]) == 0
+    manager.stop()
+
+def test_timing_wheel_expires_reset_and_cancelled_timers():
+    now = [0.0]
+    wheel = TimingWheel(tick=1.0, slots=8, clock=lambda: now[0])
+    wheel.schedule('a', 3)
+    wheel.schedule('b', 3)
+    wheel.schedule('far', 20)  # more than one revolution away
+    wheel.cancel('b')
+    now[0] = 2
+    wheel.schedule('a', 3)  # reset before it fired
+    assert wheel.advance(4) == []
+    assert wheel.advance(5) == ['a']
+    assert wheel.advance(19) == []
+    assert wheel.advance(100) == ['far']
+    assert len(wheel) == 0
+
+def test_auth_tokens_are_cached_invalidated_and_swept():
+    auth = AuthManager(cache_size=2)
+    tokens = [auth.generate_auth_token('admin') for _ in range(3)]
+    assert len(auth.verified) == 2  # bounded; the oldest token fell out
+    for token in tokens:
+        assert auth.verify_auth_token(token)['username'] == 'admin'
+    assert auth.verify_auth_token(tokens[0][:-2] + 'xx') is None
+
+    assert auth.invalidate_token(tokens[0])
+    assert auth.verify_auth_token(tokens[0]) is None
+    assert not auth.invalidate_token(tokens[0])
+
+    assert auth.purge_expired(time.time() + TOKEN_LIFETIME - 120) == 0
+    assert auth.purge_expired(time.time() + TOKEN_LIFETIME + 120) == 2
+    assert len(auth.active_tokens) == 0 and not auth.verified
+    assert auth.verify_auth_token(tokens[1]) is None
+    auth.stop()
+
+def test_silent_worker_is_expired_and_its_tasks_requeued():
+    manager = TaskManager(dispatch_threads=0, heartbeat_timeout=5, heartbeat_tick=0.5)
+    manager.register_worker({'id': 'w1', 'capabilities': ['computation']})
+    manager.register_worker({'id': 'w2', 'capabilities': ['computation']})
+    task_id = manager.submit_task({'type': 'computation', 'data': {}})
+    assert [t['id'] for t in manager.lease_tasks('w1', 1)] == [task_id]
+
+    manager.heartbeat_timeout = 10
+    assert manager.touch_worker('w2')
+    now = time.monotonic()
+    assert manager.expire_workers(now + 4) == []
+    assert manager.expire_workers(now + 6) == ['w1']
+    assert manager.get_task_status(task_id)['status'] == 'pending'
+    assert 'w1' not in manager.workers and 'w2' in manager.workers
+    manager.stop()
+
+def test_dag_releases_children_with_parent_results():
+    manager = TaskManager(dispatch_threads=0)
+    task_ids = manager.submit_dag([
+        {'key': 'sum', 'type': 'computation', 'depends_on': ['sort'],
+         'data': {'operation': 'sum', 'numbers': {'$ref': 'sort', 'field': 'result'}}},
+        {'key': 'read', 'type': 'io_operation', 'data': {'operation': 'read'}},
+        {'key': 'sort', 'type': 'data_processing',
+         'data': {'operation': 'sort', 'data': {'$ref': 'read', 'field': 'content'}}}
+    ])
+    assert manager.get_task_status(task_ids['sort'])['status'] == 'blocked'
+
+    assert manager.next_task() == task_ids['read']
+    manager.complete_task(task_ids['read'], {'content': [3, 1, 2]})
+    assert manager.request_task('nobody') is None
+    manager.register_worker({'id': 'w1', 'capabilities': ['data_processing', 'computation']})
+    assignment = manager.request_task('w1')
+    assert assignment['data'] == {'operation': 'sort', 'data': [3, 1, 2]}
+    assert manager.get_task_status(task_ids['sum'])['status'] == 'blocked'
+
+    # A failed parent fails everything downstream
+    manager.fail_task(task_ids['sort'], 'boom')
+    assert manager.get_task_status(task_ids['sum'])['status'] == 'failed'
+
+    # A field missing from the parent's result fails the child, not the worker
+    parent = manager.submit_task({'type': 'io_operation'})
+    child = manager.submit_task({'type': 'computation', 'depends_on': [parent],
+                                 'data': {'numbers': {'$ref': parent, 'field': 'missing'}}})
+    assert manager.next_task(['io_operation']) == parent
+    manager.complete_task(parent, {'content': []})
+    assert manager.lease_tasks('w1', 5) == []
+    status = manager.get_task_status(child)
+    assert status['status'] == 'failed' and 'missing' in status['error']
+    assert 'worker' not in status and 'w1' not in manager.assigned
+
+    # A $ref from a plain submit must name a known task, which it then waits for
+    with pytest.raises(ValueError, match='nope'):
+        manager.submit_task({'type': 'computation', 'depends_on': [parent],
+                             'data': {'numbers': {'$ref': 'nope'}}})
+    with pytest.raises(ValueError, match='nope'):
+        manager._resolve_refs({'$ref': 'nope'})
+    source = manager.submit_task({'type': 'io_operation'})
+    child = manager.submit_task({'type': 'computation', 'data': {'numbers': {'$ref': source, 'field': 'content'}}})
+    assert manager.get_task_status(child)['status'] == 'blocked'
+    assert manager.next_task(['io_operation']) == source
+    manager.complete_task(source, {'content': [4, 5]})
+    assert manager.request_task('w1')['data'] == {'numbers': [4, 5]}
+    with pytest.raises(ValueError):
+        manager.submit_task({'type': 'computation', 'depends_on': ['missing']})
+    with pytest.raises(ValueError):
+        manager.submit_dag([
+            {'key': 'a', 'type': 'computation', 'depends_on': ['b']},
+            {'key': 'b', 'type': 'computation', 'depends_on': ['a']}
+        ])
+    # A bad task anywhere rejects the whole DAG before any of it is recorded
+    count = len(manager.get_all_tasks())
+    for bad in ({'type': 'computation'}, {'key': 'b', 'type': 'computation', 'priority': 'high'}):
+        with pytest.raises(ValueError):
+            manager.submit_dag([{'key': 'a', 'type': 'computation'}, bad])
+    assert len(manager.get_all_tasks()) == count
+    manager.stop()
+
+def test_result_cache_lru_ttl_and_spill(tmp_path):
+    now = [0.0]
+    cache = ResultCache(max_bytes=100, ttl=10, spill_path=str(tmp_path), clock=lambda: now[0])
+    assert cache_key('computation', {'a': 1, 'b': [1, 2]}) == cache_key('computation', {'b': [1, 2], 'a': 1})
+    assert cache_key('computation', {'a': 1}) != cache_key('data_processing', {'a': 1})
+
+    cache.put('first', {'result': 'x' * 60})
+    cache.put('second', {'result': 'y' * 60})  # pushes 'first' out to disk
+    assert cache.stats()['entries'] == 1 and cache.stats()['spills'] == 1
+    assert cache.get('first') == (True, {'result': 'x' * 60})
+    assert cache.stats()['disk_hits'] == 1
+
+    now[0] = 11
+    assert cache.get('first') == (False, None)
+    assert cache.stats()['expirations'] >= 1
+
+def test_task_manager_serves_repeated_tasks_from_cache():
+    manager = TaskManager(dispatch_threads=0, result_cache=ResultCache())
+    task = {'type': 'computation', 'data': {'operation': 'sum', 'numbers': [1, 2, 3]}}
+    first = manager.submit_task(task)
+    assert manager.next_task() == first
+    manager.complete_task(first, {'result': 6})
+
+    second = manager.submit_task(task)
+    status = manager.get_task_status(second)
+    assert status['status'] == 'completed' and status['result'] == {'result': 6}
+    assert manager.pending_count() == 0
+    assert manager.get_cache_stats()['hits'] == 1
+    uncached = manager.submit_task({'type': 'io_operation', 'data': {'operation': 'read'}})
+    assert manager.get_task_status(uncached)['status'] == 'pending'
+
+    # Results that depend on files on a worker are never cached
+    matmul = {'type': 'computation', 'data': {'operation': 'matrix_multiply', 'matrix1': {'path': 'a.npy'},
+                                              'matrix2': [[1]], 'output': {'path': 'c.npy'}}}
+    for _ in range(2):
+        task_id = manager.submit_task(matmul)
+        assert manager.get_task_status(task_id)['status'] == 'pending'
+        manager.complete_task(task_id, {'result': {'path': 'c.npy'}})
+    file_sort = {'type': 'data_processing', 'data': {'operation': 'sort', 'data': {'path': 'in.jsonl'},
+                                                     'output': {'path': 'out.jsonl'}, 'key': 'id'}}
+    for _ in range(2):
+        task_id = manager.submit_task(file_sort)
+        assert manager.get_task_status(task_id)['status'] == 'pending'  # the output is rewritten
+        manager.complete_task(task_id, {'result': {'path': 'out.jsonl', 'records': 1, 'runs': 0}})
+    assert manager.get_cache_stats()['hits'] == 1
+    manager.stop()
+
+def test_asyncio_mode_round_trip(monkeypatch):
+    monkeypatch.setenv('SERVER_MODE', 'asyncio')
+    monkeypatch.setenv('SERVER_PORT', '0')
+    server = DistributedServer()
+    port = server.server_socket.getsockname()[1]
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        with context.wrap_socket(socket.create_connection(('localhost', port))) as conn:
+            frames = iter_frames(conn)
+            send_frame(conn, encrypt_message(json.dumps({'username': 'admin', 'password': 'admin123'})))
+            assert json.loads(decrypt_message(next(frames)))['status'] == 'success'
+
+            send_frame(conn, encrypt_message(json.dumps({'type': 'task_status', 'task_id': 'missing'})))
+            response = json.loads(decrypt_message(next(frames)))
+            assert response == {'status': 'success', 'task_status': None}
+
+            # Updates pushed from other threads go through the loop and are drained
+            send_frame(conn, encrypt_message(json.dumps(
+                {'type': 'task_submit', 'watch': True, 'data': {'type': 'custom', 'data': {}}})))
+            task_id = json.loads(decrypt_message(next(frames)))['task_id']
+            server.task_manager.complete_task(task_id, {'done': True})
+            updates = (json.loads(decrypt_message(frame)) for frame in frames)
+            assert next(update for update in updates if update['status'] == 'completed')['result'] == {'done': True}
+    finally:
+        server.stop()
+
+def test_asyncio_mode_drops_a_peer_that_stops_reading(monkeypatch):
+    monkeypatch.setenv('SERVER_MODE', 'asyncio')
+    monkeypatch.setenv('SERVER_PORT', '0')
+    monkeypatch.setattr(server_main, 'SEND_TIMEOUT', 0.5)
+    server = DistributedServer()
+    port = server.server_socket.getsockname()[1]
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        with context.wrap_socket(socket.create_connection(('localhost', port))) as conn:
+            frames = iter_frames(conn)
+            send_frame(conn, encrypt_message(json.dumps({'username': 'admin', 'password': 'admin123'})))
+            next(frames)
+            send_frame(conn, encrypt_message(json.dumps(
+                {'type': 'task_submit', 'watch': True, 'data': {'type': 'custom', 'data': {}}})))
+            task_id = json.loads(decrypt_message(next(frames)))['task_id']
+            [send] = server.task_manager.watchers[task_id]
+
+            # The client reads nothing more: pushes back up, then the peer is dropped
+            start = time.monotonic()
+            with pytest.raises(ConnectionError):
+                for _ in range(1000):
+                    send({'type': 'task_update', 'task_id': task_id, 'data': 'x' * (1 << 20)})
+            assert time.monotonic() - start < 30
+    finally:
+        server.stop()
+
+def test_wal_store_recovers_queue_after_restart(tmp_path):
+    manager = TaskManager(dispatch_threads=0, store=WalTaskStore(str(tmp_path), fsync='always'))
+    done = manager.submit_task({'type': 'computation', 'data': {}}, priority=1)
+    running = manager.submit_task({'type': 'computation', 'data': {}}, priority=2)
+    waiting = manager.submit_task({'type': 'computation', 'data': {}}, priority=3)
+    assert manager.next_task() == done
+    with manager.lock:
+        manager._update(done, status='completed')
+    assert manager.next_task() == running
+    manager.stop()
+
+    # A torn record at the tail of the log must not break recovery
+    segment = sorted(tmp_path.iterdir())[-1]
+    with open(segment, 'ab') as f:
+        f.write(b'\x00\x00\x01\x00partial')
+
+    recovered = TaskManager(dispatch_threads=0, store=WalTaskStore(str(tmp_path)))
+    assert recovered.get_task_status(done)['status'] == 'completed'
+    assert recovered.get_task_status(running)['status'] == 'pending'
+    assert [recovered.next_task(), recovered.next_task()] == [running, waiting]
+    recovered.stop()
+
+def test_wal_store_compacts_into_snapshot(tmp_path):
+    store = WalTaskStore(str(tmp_path), fsync='off', snapshot_every=10)
+    for i in range(25):
+        store.append('put', f'task-{i}', {'status': 'pending'})
+        store.append('update', f'task-{i}', {'status': 'completed'})
+    store.close()
+
+    assert any(p.name.startswith('snapshot-') for p in tmp_path.iterdir())
+    tasks = WalTaskStore(str(tmp_path)).load()
+    assert len(tasks) == 25
+    assert all(task['status'] == 'completed' for task in tasks.values())
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+    def start_background_task(self, target):
+        return None
+
+    def sleep(self, seconds):
+        pass
+
+def test_progress_updates_are_coalesced_per_room():
+    socketio = FakeSocketIO()
+    manager = TaskManager(socketio, dispatch_threads=0)
+    task_id = manager.submit_task({'type': 'computation', 'data': {}}, owner='alice')
+    manager.next_task()
+    for progress in (10, 20, 30):
+        manager.update_progress(task_id, progress)
+    manager.updates.flush()
+
+    rooms = {to: data for event, data, to in socketio.emitted}
+    assert len(socketio.emitted) == 2
+    assert set(rooms) == {f'task:{task_id}', 'user:alice'}
+    assert rooms['user:alice'] == [{'task_id': task_id, 'status': 'running', 'progress': 30}]
+    assert manager.updates.flush() == 0
+    manager.stop()
+
+def test_task_queries_filter_and_paginate():
+    manager = TaskManager(dispatch_threads=0)
+    ids = [manager.submit_task({'type': 'computation' if i % 2 else 'file_operation', 'data': {}},
+                               owner='alice' if i < 6 else 'bob')
+           for i in range(10)]
+    manager.register_worker({'id': 'w1', 'capabilities': ['computation']})
+    leased = [task['id'] for task in manager.lease_tasks('w1', 3)]
+
+    running = manager.query_tasks({'status': 'running'})
+    assert sorted(task['task_id'] for task in running['tasks']) == sorted(leased)
+    assert running['next_cursor'] is None
+    assert all('data' not in task for task in running['tasks'])
+    assert manager.count_tasks({'worker': 'w1'}) == 3
+    assert manager.count_tasks({'type': 'computation', 'owner': 'alice'}) == 3
+
+    # Newest first, resuming from the cursor
+    seen, cursor = [], None
+    while True:
+        page = manager.query_tasks(cursor=cursor, limit=4)
+        seen += [task['task_id'] for task in page['tasks']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+    manager.requeue_task(leased[0])
+    assert manager.count_tasks({'worker': 'w1'}) == 2
+    assert manager.count_tasks({'status': 'pending'}) == 8
+    with pytest.raises(ValueError):
+        manager.query_tasks({'data': 'x'})
+    manager.stop()
+
+def test_batch_submission_keeps_order_and_reports_bad_items():
+    manager = TaskManager(dispatch_threads=0)
+    tasks = [
+        {'type': 'computation', 'data': {'n': 1}},
+        {'data': {}},
+        {'type': 'computation', 'data': {'n': 2}, 'depends_on': ['missing']},
+        {'type': 'computation', 'data': {'n': 3}, 'priority': 1},
+    ]
+    task_ids, errors = manager.submit_tasks(tasks, owner='alice')
+    assert task_ids[1] is None and task_ids[2] is None
+    assert [error['index'] for error in errors] == [1, 2]
+    assert manager.get_task_status(task_ids[0])['data'] == {'n': 1}
+    assert manager.get_task_status(task_ids[3])['owner'] == 'alice'
+    assert [manager.next_task(), manager.next_task()] == [task_ids[3], task_ids[0]]
+    manager.stop()
+
+def test_client_pipelines_requests_by_id(monkeypatch):
+    monkeypatch.setenv('SERVER_PORT', '0')
+    server = DistributedServer()
+    monkeypatch.setenv('SERVER_PORT', str(server.server_socket.getsockname()[1]))
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    client = TaskClient()
+    try:
+        assert client.connect()
+        assert client.login('admin', 'admin123', timeout=5)
+        task_ids = [client.submit_task({'type': 'computation', 'data': {'n': i}}).task_id for i in range(3)]
+        futures = [client.send_request({'type': 'task_status', 'task_id': task_id})
+                   for task_id in reversed(task_ids) for _ in range(20)]
+        statuses = [future.result(5)['task_status'] for future in futures]
+        assert [status['task_id'] for status in statuses[::20]] == task_ids[::-1]
+        assert client.pending == {}
+    finally:
+        client.close()
+        server.stop()
+
+def test_async_client_pool_and_pushed_updates(monkeypatch):
+    monkeypatch.setenv('SERVER_PORT', '0')
+    server = DistributedServer()
+    port = server.server_socket.getsockname()[1]
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    async def run():
+        async with AsyncTaskClient(port=port, pool_size=2) as client:
+            assert await client.login('admin', 'admin123')
+            task_ids = await asyncio.gather(*(
+                client.submit_task({'type': 'computation', 'data': {'n': i}}) for i in range(50)
+            ))
+            assert len(set(task_ids)) == 50
+            assert (await client.get_task_status(task_ids[0]))['status'] == 'pending'
+
+            states = await client.watch([task_ids[0], 'missing'])
+            assert states['missing'] is None and states[task_ids[0]]['status'] == 'pending'
+            # Pushed before any updates() iterator exists: kept for the next one
+            server.task_manager.complete_task(task_ids[0], {'sum': 6})
+            await asyncio.sleep(0.1)
+            updates = client.updates()
+            async for update in updates:
+                assert update['status'] == 'completed' and update['result'] == {'sum': 6}
+                break
+            await updates.aclose()
+            assert server.task_manager.watchers == {}
+
+            updates = client.updates()  # subscribed before the first __anext__
+            await client.watch([task_ids[1]])
+            server.task_manager.complete_task(task_ids[1], {'sum': 7})
+            await asyncio.sleep(0.1)
+            assert (await asyncio.wait_for(updates.__anext__(), 5))['result'] == {'sum': 7}
+            await updates.aclose()
+            assert client.subscribers == set()
+
+            # Without an iterator only the latest updates are kept
+            for progress in range(client.backlog.maxlen + 10):
+                client._publish({'type': 'task_update', 'progress': progress})
+            assert len(client.backlog) == client.backlog.maxlen
+            assert client.backlog[0]['progress'] == 10
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.stop()
+
+def test_task_futures_complete_from_pushed_updates(monkeypatch):
+    monkeypatch.setenv('SERVER_PORT', '0')
+    server = DistributedServer()
+    monkeypatch.setenv('SERVER_PORT', str(server.server_socket.getsockname()[1]))
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    client = TaskClient()
+    try:
+        assert client.connect() and client.login('admin', 'admin123')
+        futures = [client.submit_task({'type': 'computation', 'data': {'n': i}}) for i in range(3)]
+        done, not_done = wait_all(futures, timeout=0.1)
+        assert not done and len(not_done) == 3
+
+        manager = server.task_manager
+        manager.complete_task(futures[2].task_id, 'third')
+        assert next(as_completed(futures, timeout=5)) is futures[2]
+        manager.complete_task(futures[0].task_id, 'first')
+        manager.fail_task(futures[1].task_id, 'boom')
+        done, not_done = wait_all(futures, timeout=5)
+        assert len(done) == 3 and futures[0].result() == 'first'
+        with pytest.raises(TaskFailedError):
+            futures[1].result()
+        assert client.task_futures == {}
+
+        # Tasks submitted without a future can be watched afterwards
+        task_ids, _ = client.submit_many([{'type': 'computation', 'data': {'n': 9}}])
+        manager.complete_task(task_ids[0], 'later')
+        assert client.watch(task_ids)[task_ids[0]].result(5) == 'later'
+    finally:
+        client.close()
+        server.stop()
+
+def test_client_drops_pushes_no_submit_claims():
+    client = TaskClient()
+    client.request_timeout = 0.05
+    client._handle_message({'type': 'task_update', 'task_id': 'early', 'status': 'running', 'progress': 5})
+    client._handle_message({'type': 'task_chunk', 'task_id': 'early', 'offset': 0, 'data': 'ab'})
+    future = client._track('early')  # claimed in time
+    assert not future.done() and client.unclaimed == {} and client.unclaimed_chunks == {}
+
+    client._handle_message({'type': 'task_chunk', 'task_id': 'orphan', 'offset': 0, 'data': 'ab'})
+    time.sleep(0.1)
+    client._handle_message({'type': 'task_update', 'task_id': 'other', 'status': 'running', 'progress': 5})
+    assert 'orphan' not in client.unclaimed_chunks and 'other' in client.unclaimed
+
+def test_streamed_result_chunks_reach_the_submitter_in_order(monkeypatch):
+    monkeypatch.setenv('SERVER_PORT', '0')
+    server = DistributedServer()
+    monkeypatch.setenv('SERVER_PORT', str(server.server_socket.getsockname()[1]))
+    threading.Thread(target=server.serve, daemon=True).start()
+
+    client = TaskClient()
+    try:
+        assert client.connect() and client.login('admin', 'admin123')
+        chunks = []
+        future = client.submit_task(
+            {'type': 'io_operation', 'data': {'operation': 'read', 'filename': 'f', 'stream': True}},
+            on_chunk=lambda message: chunks.append(
+                (message['offset'], message['data'], message.get('restart', False)))
+        )
+        manager = server.task_manager
+        manager.register_worker({'id': 'w1', 'capabilities': ['io_operation']})
+        [task] = manager.lease_tasks('w1', 1)
+        assert manager.push_chunk(task['id'], 0, 'ab', 'w1') == 1
+        assert manager.push_chunk(task['id'], 2, 'cd', 'w2') == 0  # not the worker holding it
+        assert manager.push_chunk(task['id'], 2, 'ef', 'w1') == 1
+        # A re-run streams from the start again, and says so
+        manager.requeue_task(task['id'])
+        [task] = manager.lease_tasks('w1', 1)
+        assert manager.push_chunk(task['id'], 0, 'ab', 'w1') == 1
+        assert manager.push_chunk(task['id'], 2, 'ef', 'w1') == 1
+        manager.ack_tasks('w1', [{'task_id': task['id'], 'result': {'chunks': 2}}])
+        assert future.result(5) == {'chunks': 2}
+        assert chunks == [(0, 'ab', False), (2, 'ef', False), (0, 'ab', True), (2, 'ef', False)]
+        assert manager.streams == {}
+        assert client.chunk_callbacks == {}
+    finally:
+        client.close()
+        server.stop()
@@ -0,0 +1,101 @@
+import io
+import socket
+import threading
+import numpy as np
+import pytest
+from src.utils.codec import encode_message, decode_message, negotiate_codec, BINARY, JSON
+from cryptography.exceptions import InvalidTag
+from src.utils import crypto
+from src.utils.crypto import (
+    encrypt_message, decrypt_message, negotiate_envelope, offered_envelopes,
+    encrypt_data, decrypt_data, encrypt_stream, decrypt_stream, crypto_manager,
+    AESGCM_ENVELOPE, FERNET_ENVELOPE, NO_ENVELOPE
+)
+from src.utils.framing import (
+    FrameDecoder, FrameTooLargeError, encode_frame, send_frame, iter_frames
+)
+
+def test_decoder_reassembles_split_and_coalesced_frames():
+    stream = encode_frame(b'first') + encode_frame(b'') + encode_frame(b'third')
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(len(stream)):
+        frames.extend(decoder.feed(stream[i:i + 1]))
+    assert frames == [b'first', b'', b'third']
+    assert FrameDecoder().feed(stream) == [b'first', b'', b'third']
+
+def test_large_frame_over_socket():
+    payload = bytes(range(256)) * 4096  # 1 MiB, far more than one recv
+    left, right = socket.socketpair()
+    sender = threading.Thread(target=lambda: [send_frame(left, payload), left.close()])
+    sender.start()
+    frames = list(iter_frames(right))
+    sender.join()
+    right.close()
+    assert len(frames) == 1 and frames[0] == payload
+
+def test_decoder_rejects_oversized_frames():
+    decoder = FrameDecoder(max_frame_size=16)
+    with pytest.raises(FrameTooLargeError):
+        decoder.feed(encode_frame(b'x' * 17))
+
+def test_binary_codec_round_trips_arrays_without_copying():
+    matrix = np.arange(12, dtype=np.float64).reshape(3, 4)
+    message = {'type': 'task_complete', 'result': {'result': matrix}, 'ok': True, 'n': None}
+    payload = encode_message(message, BINARY)
+
+    decoded = decode_message(payload)
+    assert decoded['ok'] is True and decoded['n'] is None
+    assert decoded['result']['result'].dtype == np.float64
+    np.testing.assert_array_equal(decoded['result']['result'], matrix)
+    assert np.shares_memory(decoded['result']['result'], np.frombuffer(payload, np.uint8))
+
+def test_json_codec_fallback_and_negotiation():
+    payload = encode_message({'result': np.array([1, 2, 3])}, JSON)
+    assert decode_message(payload) == {'result': [1, 2, 3]}
+    assert negotiate_codec(['msgpack', 'binary']) == BINARY
+    assert negotiate_codec(None) == JSON
+
+def test_message_envelopes_round_trip_and_negotiate(monkeypatch):
+    monkeypatch.setattr(crypto, 'GCM_CHUNK_SIZE', 64)
+    for size in (0, 10, 64, 200):
+        payload = bytes(range(256))[:size]
+        for envelope in (NO_ENVELOPE, AESGCM_ENVELOPE, FERNET_ENVELOPE):
+            sealed = encrypt_message(payload, envelope)
+            assert decrypt_message(bytearray(sealed), envelope) == payload
+
+    # Dropping whole trailing chunks must not decrypt to a valid prefix
+    sealed = encrypt_message(bytes(200), AESGCM_ENVELOPE)
+    with pytest.raises(InvalidTag):
+        decrypt_message(sealed[:1 + 16 + 2 * (64 + 16)], AESGCM_ENVELOPE)
+    # Every message has its own salt, hence its own key
+    assert encrypt_message(bytes(200), AESGCM_ENVELOPE)[1:17] != sealed[1:17]
+
+    assert NO_ENVELOPE not in offered_envelopes(tls_verified=False)
+    assert negotiate_envelope(offered_envelopes(tls_verified=True)) == NO_ENVELOPE
+    assert negotiate_envelope(None) == FERNET_ENVELOPE
+
+def test_derived_keys_are_cached_and_streams_round_trip():
+    crypto_manager._kdf_cache.clear()
+    assert decrypt_data(encrypt_data('payload', 'secret'), 'secret') == 'payload'
+    assert len(crypto_manager._kdf_cache) == 1  # the second derivation was a hit
+
+    for size in (0, 100, 128, 1000):
+        plain = bytes(range(256)) * 4
+        sealed = io.BytesIO()
+        assert encrypt_stream(io.BytesIO(plain[:size]), sealed, 'secret', chunk_size=128) == size
+        opened = io.BytesIO()
+        assert decrypt_stream(io.BytesIO(sealed.getvalue()), opened, 'secret') == size
+        assert opened.getvalue() == plain[:size]
+
+    # Each stream is salted, hence keyed, on its own
+    other = io.BytesIO()
+    encrypt_stream(io.BytesIO(plain), other, 'secret', chunk_size=128)
+    assert other.getvalue()[1:17] != sealed.getvalue()[1:17]
+
+    # Dropping whole trailing chunks or using the wrong password fails
+    with pytest.raises(InvalidTag):
+        decrypt_stream(io.BytesIO(sealed.getvalue()[:-(1000 % 128 + 16)]), io.BytesIO(), 'secret')
+    with pytest.raises(InvalidTag):
+        decrypt_stream(io.BytesIO(sealed.getvalue()), io.BytesIO(), 'wrong')
+
@@ -1,6 +1,15 @@
+import os
+import json
+import time
+import socket
 import pytest
+import numpy as np
+from src.utils.codec import encode_message, decode_message
+from src.utils.crypto import encrypt_message, decrypt_message
+from src.utils.framing import send_frame, iter_frames
 from src.worker.main import WorkerNode
-from src.worker.task_executor import TaskExecutor
+from src.worker import compute, columnar, external_sort, file_io
+from src.worker.task_executor import TaskExecutor, ProgressReporter
 
 @pytest.fixture
 def worker():
@@ -12,6 +21,32 @@ def test_worker_initialization(worker):
     assert worker.worker_id.startswith('worker-')
     assert isinstance(worker.task_executor, TaskExecutor)
 
+def test_any_reply_to_a_lease_request_allows_the_next_one(worker):
+    worker.connection, server = socket.socketpair()
+    frames = iter_frames(server)
+    reply = lambda message: send_frame(server, encrypt_message(encode_message(message)))
+    try:
+        worker.request_tasks()
+        request = decode_message(decrypt_message(next(frames)))
+        worker.request_tasks()  # still in flight: nothing sent
+        reply({'status': 'success'})  # not an answer to the lease request
+        worker.process_server_messages()
+        assert worker.lease_request == request['request_id']
+
+        reply({'status': 'error', 'message': 'boom', 'request_id': request['request_id']})
+        worker.process_server_messages()
+        assert worker.lease_request is None
+        worker.next_lease_at = 0
+        worker.request_tasks()
+        assert decode_message(decrypt_message(next(frames)))['request_id'] != request['request_id']
+
+        # A reply that never comes only holds up the next request for lease_time
+        worker.lease_time = 0
+        worker.request_tasks()
+        assert decode_message(decrypt_message(next(frames)))['type'] == 'lease_tasks'
+    finally:
+        server.close()
+
 def test_task_execution():
     executor = TaskExecutor()
     task_data = {
@@ -23,3 +58,219 @@ def test_task_execution():
     }
     result = executor.execute_task(task_data)
     assert result['result'] == 15
+
+def test_matrix_multiply_returns_ndarray():
+    executor = TaskExecutor()
+    result = executor.handle_computation({
+        'operation': 'matrix_multiply',
+        'matrix1': np.eye(2),
+        'matrix2': [[1, 2], [3, 4]]
+    })
+    assert isinstance(result['result'], np.ndarray)
+    assert result['result'].tolist() == [[1, 2], [3, 4]]
+
+def test_blocked_reductions_and_matmul_over_memory_mapped_inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(compute, 'BLOCK_ELEMENTS', 7)  # many small blocks
+    values = np.random.default_rng(0).normal(size=(10, 5))
+    np.save(tmp_path / 'values.npy', values)
+    executor = TaskExecutor()
+    for source in (values.tolist(), {'path': str(tmp_path / 'values.npy')}):
+        def run(operation, **options):
+            return executor.handle_computation(dict(options, operation=operation, numbers=source))['result']
+        assert run('sum') == pytest.approx(values.sum())
+        assert run('average') == pytest.approx(values.mean())
+        assert run('std') == pytest.approx(values.std())
+        assert (run('min'), run('max')) == (values.min(), values.max())
+        histogram = run('histogram', bins=4, range=[-3, 3])
+        assert histogram['counts'].tolist() == np.histogram(values, 4, (-3, 3))[0].tolist()
+
+    right = np.arange(35, dtype=np.float32).reshape(5, 7)
+    right.tofile(tmp_path / 'right.bin')
+    reference = executor.handle_computation({
+        'operation': 'matrix_multiply',
+        'matrix1': {'path': str(tmp_path / 'values.npy')},
+        'matrix2': {'path': str(tmp_path / 'right.bin'), 'dtype': 'float32', 'shape': [5, 7]},
+        'output': {'path': str(tmp_path / 'product.npy')}
+    })['result']
+    assert reference == {'path': str(tmp_path / 'product.npy')}
+    np.testing.assert_allclose(np.load(reference['path']), values @ right)
+    blocked = compute.matmul(values, right, out={'path': str(tmp_path / 'product.bin')}, block_bytes=200)
+    np.testing.assert_allclose(compute.as_array(blocked), values @ right)
+
+def test_reductions_over_ints_beyond_64_bits_use_python_arithmetic():
+    big = [10 ** 20, 1]
+    assert compute.reduce(big, 'sum') == 10 ** 20 + 1
+    assert compute.reduce(big, 'max') == 10 ** 20 and compute.reduce(big, 'min') == 1
+    assert compute.reduce(big, 'mean') == (10 ** 20 + 1) / 2
+    with pytest.raises(ValueError, match='numeric'):
+        compute.as_array(['a', 1])
+
+def test_integer_sums_are_exact_when_the_total_overflows_int64(monkeypatch):
+    assert compute.reduce([2 ** 62, 2 ** 62], 'sum') == 2 ** 63
+    assert compute.reduce([2 ** 63 - 1, 1], 'sum') == 2 ** 63
+    monkeypatch.setattr(compute, 'BLOCK_ELEMENTS', 2)  # and across blocks
+    assert compute.reduce([2 ** 62] * 5, 'sum') == 5 * 2 ** 62
+    assert compute.reduce(np.array([3, -4, 5], dtype=np.int8), 'sum') == 4
+
+def test_progress_is_reported_from_handlers_and_rate_limited():
+    now = [0.0]
+    sent = []
+    reporter = ProgressReporter(lambda *update: sent.append(update), 't1',
+                                interval=1.0, min_delta=10, clock=lambda: now[0])
+    assert not reporter.report(0.5)  # too soon after the start
+    now[0] = 1.0
+    assert reporter.report(0.5)
+    now[0] = 5.0
+    assert not reporter.report(0.55)  # has not moved enough
+    assert reporter.report(1.2)
+    assert sent == [('t1', 'running', 50), ('t1', 'running', 100)]
+
+    executor = TaskExecutor()
+    executor.update_callback = lambda *update: sent.append(update)
+    items = [{'name': 'a'}] * 25_000
+    result = executor.execute_task({'id': 't2', 'type': 'data_processing', 'data': {
+        'operation': 'transform', 'data': items, 'transformation': {'name': 'uppercase'}
+    }})
+    assert len(result['result']) == 25_000 and result['result'][-1] == {'name': 'A'}
+    assert len(sent) == 2  # finished within the first interval: no updates
+
+class SlowComputation(TaskExecutor):
+    def handle_computation(self, data):
+        time.sleep(0.6)
+        yield 0.5
+        return {'result': os.getpid()}
+
+def test_cpu_bound_tasks_run_in_processes_and_io_on_threads(tmp_path):
+    executor = SlowComputation(slots=2)
+    executor.cpu_bound = {'computation'}  # even on a single-core machine
+    updates = []
+    executor.update_callback = lambda *update: updates.append(update)
+    try:
+        computation = executor.submit({'id': 't1', 'type': 'computation', 'data': {}})
+        io = executor.submit({'id': 't2', 'type': 'io_operation', 'data': {
+            'operation': 'write', 'filename': str(tmp_path / 'out'), 'content': 'x'
+        }})
+        assert io.result(timeout=10) == {'status': 'success'}
+        assert computation.result(timeout=30)['result'] != os.getpid()
+        deadline = time.monotonic() + 5
+        while not updates and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert updates == [('t1', 'running', 50)]  # relayed from the pool process
+    finally:
+        executor.shutdown()
+
+def test_columnar_data_processing_matches_row_by_row_semantics():
+    records = [
+        {'id': 3, 'name': 'b', 'group': 'x'},
+        {'id': 1, 'name': 'a', 'group': None},
+        {'id': 2, 'name': 'b'},
+        {'id': 0, 'name': 'A', 'group': 'x', 'flag': True},
+        {'id': 4, 'name': 1, 'group': 'y', 'flag': 1},
+    ]
+    by_id = lambda rows: [row['id'] for row in rows]
+
+    rows = columnar.process(records[:4], 'sort', {'key': 'name'})
+    assert by_id(rows) == by_id(sorted(records[:4], key=lambda x: x['name']))
+    rows = columnar.process(records[:4], 'sort', {'key': ['name', 'id'], 'descending': [False, True]})
+    assert by_id(rows) == [0, 1, 3, 2]
+    assert by_id(columnar.process(records, 'sort', {'descending': True})) == [4, 3, 2, 1, 0]
+
+    assert by_id(columnar.process(records, 'filter', {'condition': {'group': None}})) == [1, 2]
+    assert by_id(columnar.process(records, 'filter', {'condition': {'group': 'x', 'name': 'b'}})) == [3]
+    assert by_id(columnar.process(records, 'filter', {'condition': {'flag': 1}})) == [0, 4]
+
+    rows = columnar.process(records, 'transform', {'transformation': {'name': 'uppercase', 'flag': 'lowercase'}})
+    assert [(row['name'], row['flag']) for row in rows] == \
+        [('B', ''), ('A', ''), ('B', ''), ('A', 'true'), ('1', '1')]
+    assert records[3] == {'id': 0, 'name': 'A', 'group': 'x', 'flag': True}  # input untouched
+
+    columns = {'id': np.array([2, 0, 1]), 'name': ['c', 'a', 'b']}
+    result = columnar.process(columns, 'sort', {'key': 'name'})
+    assert result['id'].tolist() == [0, 1, 2] and result['name'] == ['a', 'b', 'c']
+    result = columnar.process(columns, 'filter', {'condition': {'id': 1}})
+    assert result['id'].tolist() == [1] and result['name'] == ['b']
+    assert columnar.process(columns, 'transform', {'transformation': {'name': 'uppercase'}})['name'] == ['C', 'A', 'B']
+
+def test_columnar_keeps_python_semantics_for_mixed_ints_and_floats():
+    rows = columnar.process([{'v': 1}, {'v': 2.5}], 'transform', {'transformation': {'v': 'uppercase'}})
+    assert [row['v'] for row in rows] == ['1', '2.5']
+    big = [{'v': 2 ** 53 + 1}, {'v': 2 ** 53}, {'v': 0.5}]
+    assert columnar.process(big, 'filter', {'condition': {'v': 2 ** 53}}) == [big[1]]
+    assert columnar.process(big, 'sort', {'key': 'v'}) == [big[2], big[1], big[0]]
+    ints = [{'v': 2 ** 53 + 1}, {'v': 2 ** 53}]
+    assert columnar.process(ints, 'filter', {'condition': {'v': float(2 ** 53)}}) == [ints[1]]
+    assert columnar.process([{'v': 1.0}, {'v': 2.0}], 'filter', {'condition': {'v': 2 ** 53 + 1}}) == []
+
+def test_columnar_handles_unhashable_cells():
+    records = [{'id': [2], 'tags': ['a', 'b']}, {'id': [1], 'tags': {'k': 'v'}}]
+    assert columnar.process(records, 'sort', {'key': 'id'}) == [records[1], records[0]]
+    rows = columnar.process(records, 'transform', {'transformation': {'tags': 'uppercase'}})
+    assert [row['tags'] for row in rows] == ["['A', 'B']", "{'K': 'V'}"]
+
+def test_external_sort_spills_runs_and_merges_them_in_passes(tmp_path, monkeypatch):
+    monkeypatch.setattr(external_sort, 'MIN_CHUNK_BYTES', 1024)
+    records = [{'id': i, 'group': 'abc'[i * 7 % 3], 'score': i * 31 % 50} for i in range(5_000)]
+    source = tmp_path / 'in.jsonl'
+    source.write_text(''.join(json.dumps(record) + '\n' for record in records))
+
+    executor = TaskExecutor()
+    result = executor.execute_task({'id': 't1', 'type': 'data_processing', 'data': {
+        'operation': 'sort', 'data': {'path': str(source)}, 'output': {'path': str(tmp_path / 'out.jsonl')},
+        'key': ['group', 'score'], 'descending': [False, True], 'memory': 8 * 8 * 1024
+    }})['result']
+    assert result['records'] == 5_000 and result['runs'] > 1
+    with open(result['path']) as f:
+        assert [json.loads(line) for line in f] == \
+            columnar.process(records, 'sort', {'key': ['group', 'score'], 'descending': [False, True]})
+
+    progress = list(external_sort.sort_file(str(source), str(tmp_path / 'out2.jsonl'), 'score',
+                                            memory=8 * 8 * 1024, fan_in=2))
+    assert progress == sorted(progress) and progress[-1] == 1.0
+    with pytest.raises(Exception, match='output file reference'):
+        executor.execute_task({'type': 'data_processing', 'data': {'operation': 'sort', 'data': {'path': str(source)}}})
+
+def test_external_sort_orders_large_ints_across_runs_like_python(tmp_path, monkeypatch):
+    monkeypatch.setattr(external_sort, 'MIN_CHUNK_BYTES', 1024)
+    # Values float64 cannot tell apart, mixed with floats, in every run
+    values = [2 ** 53 + i for i in range(400)] + [float(2 ** 53)] * 50 + [0.5] * 50
+    values = values[::-1]  # descending: a run sort that rounded would leave ties backwards
+    records = [{'id': i, 'v': v} for i, v in enumerate(values)]
+    source = tmp_path / 'in.jsonl'
+    source.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    output = str(tmp_path / 'out.jsonl')
+    sort = external_sort.sort_file(str(source), output, 'v', memory=4 * 8 * 1024)
+    with pytest.raises(StopIteration) as done:
+        while True:
+            next(sort)
+    assert done.value.value['runs'] > 1
+    with open(output) as f:
+        assert [json.loads(line) for line in f] == sorted(records, key=lambda record: record['v'])
+
+def test_io_reads_ranges_and_streams_chunks_and_writes_at_offsets(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.txt')
+    assert file_io.write(path, b'-' * 6, offset=7, binary=True) == 6  # chunks in any order
+    file_io.write(path, 'h\u00e9llo ', offset=0)  # 'é' is two bytes
+    file_io.write(path, 'end', append=True)
+    assert open(path, 'rb').read() == 'h\u00e9llo ------end'.encode()
+
+    assert file_io.read(path, offset=7, length=3, binary=True) == b'---'
+    assert file_io.read(path, offset=1, length=2, use_mmap=True) == '\u00e9'
+    assert file_io.read(path, offset=13) == 'end'
+    # Text ranges never split a character: it goes to the range it starts in
+    assert file_io.read(path, offset=0, length=2) + file_io.read(path, offset=2, length=2) == 'h\u00e9l'
+    assert list(file_io.read_chunks(path, offset=2, length=3)) == [(3, 'll')]
+    monkeypatch.setattr(file_io, 'MAX_INLINE_READ', 8)
+    executor = TaskExecutor()
+    with pytest.raises(Exception, match='stream the file'):
+        executor.execute_task({'type': 'io_operation', 'data': {'operation': 'read', 'filename': path}})
+
+    chunks = []
+    executor.chunk_callback = lambda *chunk: chunks.append(chunk)
+    for use_mmap in (False, True):
+        chunks.clear()
+        result = executor.execute_task({'id': 't1', 'type': 'io_operation', 'data': {
+            'operation': 'read', 'filename': path, 'stream': True, 'chunk_size': 2, 'mmap': use_mmap
+        }})
+        assert result == {'offset': 0, 'length': 16, 'chunks': 8}
+        assert chunks[:2] == [('t1', 0, 'h'), ('t1', 2, '\u00e9l')]  # split character comes out whole
+        assert ''.join(text for _, _, text in chunks) == 'h\u00e9llo ------end'